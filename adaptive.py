@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+
+
+class AdaptiveInterval:
+    """一个组件的自适应采样间隔
+
+    读数在变化（任一传感器与上一次采样相差 change_threshold °C 以上，或出现了新的传感器）
+    或接近阈值（最高读数不低于 hot_threshold）时回到 min_interval；
+    否则每次采样后把间隔乘以 backoff，最长 max_interval。
+    """
+
+    def __init__(self, min_interval, max_interval, backoff=2.0, change_threshold=0.5, hot_threshold=None):
+        if min_interval <= 0 or max_interval < min_interval:
+            raise ValueError(f"自适应采样间隔范围无效: {min_interval} ~ {max_interval}")
+        if backoff < 1:
+            raise ValueError(f"backoff 必须不小于1: {backoff}")
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.change_threshold = change_threshold
+        self.hot_threshold = hot_threshold
+        self.interval = min_interval
+        self._last = {}
+
+    def is_active(self, readings):
+        """本次读数是否需要密集采样"""
+        if self.hot_threshold is not None and max(readings.values()) >= self.hot_threshold:
+            return True
+        for sensor_id, value in readings.items():
+            last = self._last.get(sensor_id)
+            if last is None or abs(value - last) >= self.change_threshold:
+                return True
+        return False
+
+    def update(self, readings):
+        """根据一次采样的读数 {传感器id: 温度} 返回下一次的采样间隔；没有读数时保持当前间隔"""
+        if not readings:
+            return self.interval
+        if self.is_active(readings):
+            self.interval = self.min_interval
+        else:
+            self.interval = min(self.interval * self.backoff, self.max_interval)
+        self._last.update(readings)
+        return self.interval
+
+
+class DeadbandFilter:
+    """死区压缩：记录中某个读数与它上一次被保存的值相差超过 delta °C，
+    或者距离上一次保存已经超过 max_seconds 秒时才保存这条记录
+
+    按传感器比较，只有部分组件的记录（各组件采样间隔不同时）只比较其中的读数。
+    """
+
+    def __init__(self, delta=0.5, max_seconds=300):
+        self.delta = delta
+        self.max_seconds = max_seconds
+        self._stored = {}  # (temperatures/sensors, id) -> (保存的值, 保存时间)
+        self.accepted = 0
+        self.suppressed = 0
+
+    def _readings(self, record):
+        for group in ("temperatures", "sensors"):
+            for key, value in (record.get(group) or {}).items():
+                if value is not None:
+                    yield (group, key), value
+
+    def accept(self, record, now):
+        """判断是否保存这条记录（now 为采样时间，秒）；保存时更新记录中各读数的参考值"""
+        readings = dict(self._readings(record))
+        keep = False
+        for key, value in readings.items():
+            stored = self._stored.get(key)
+            if stored is None or abs(value - stored[0]) > self.delta or now - stored[1] >= self.max_seconds:
+                keep = True
+                break
+        if not keep:
+            self.suppressed += 1
+            return False
+        for key, value in readings.items():
+            self._stored[key] = (value, now)
+        self.accepted += 1
+        return True
+
+    def stats(self):
+        return {"accepted": self.accepted, "suppressed": self.suppressed}
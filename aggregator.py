@@ -0,0 +1,609 @@
+# -*- coding: utf-8 -*-
+
+import re
+import json
+import hashlib
+import time
+import socket
+import select
+import signal
+import asyncio
+import argparse
+import threading
+from pathlib import Path
+from collections import deque, OrderedDict
+
+from metrics import MetricsRegistry
+from storage import SegmentedStorage, encode_record, record_epoch
+from archive import ArchiveReader, list_archives
+from rollups import RollupWriter, rollup_dir_for
+from writer import BackgroundWriter
+
+# 行协议（TCP）：
+#   采集端 -> 汇总端   B <序号> <记录数> <字节数>\n 之后紧跟 <字节数> 字节的 JSON Lines（每行一条记录）
+#   汇总端 -> 采集端   A <序号>\n         这一批已经写入汇总端的存储（写入线程提交之后才确认）
+#                      E <序号> <原因>\n  这一批无法解析，已丢弃
+#                      E - <原因>\n       批次头无法解析：之前的批次都已确认，被丢弃的是最早的未确认批次，随后断开连接
+# 采集端最多有 max_inflight 批没有确认；汇总端写入队列积压时暂停读取连接，
+# TCP 窗口填满后采集端的发送随之变慢（背压）。
+DEFAULT_PORT = 8766
+# 同时打开的主机存储数上限（每个存储占用一个分段文件和三个聚合文件），超过时关闭最久没有写入的
+MAX_OPEN_HOSTS = 256
+
+
+def parse_address(address, default_port=DEFAULT_PORT):
+    """"host:port" 或 "host" -> (host, port)"""
+    host, _, port = str(address).rpartition(":")
+    if not host:
+        return port, default_port
+    return host, int(port)
+
+
+def encode_batch(seq, records):
+    payload = b"".join(encode_record(record) for record in records)
+    return b"B %d %d %d\n" % (seq, len(records), len(payload)) + payload
+
+
+class AgentClient:
+    """采集端：把本机的采样记录按批推送到汇总端，接口与 BackgroundWriter 相同（start/put/close/stats）
+
+    发送在后台线程中进行，采样线程只把记录放进有界队列；队列满时丢弃最旧的记录。
+    连接断开时没有确认的批次放回队列开头，重连（指数退避）后按原顺序重发，
+    所以每条记录至少送达一次（断线前已写入但没来得及确认的批次会重复）。
+    放回后超出队列容量时同样丢弃最旧的记录（计入 dropped 和 agent_records_dropped_total）。
+    """
+
+    def __init__(self, address, host=None, batch_size=50, batch_seconds=1.0, queue_size=10000, max_inflight=4,
+                 timeout=5.0, retry_max_seconds=30.0, metrics=None):
+        self.address = parse_address(address)
+        self.host = host or socket.gethostname()
+        self.batch_size = max(int(batch_size), 1)
+        self.batch_seconds = batch_seconds
+        self.max_inflight = max(int(max_inflight), 1)
+        self.timeout = timeout
+        self.retry_max_seconds = retry_max_seconds
+
+        self._queue = deque(maxlen=max(int(queue_size), 1))
+        self._cond = threading.Condition()
+        self._closing = False
+        self._thread = None
+        self._sock = None
+        self._reader = None
+        self._seq = 0
+        self._inflight = {}  # 序号 -> 记录列表
+
+        self.sent = 0
+        self.acked = 0
+        self.dropped = 0
+        self.rejected = 0
+        self.reconnects = 0
+        self.metrics = metrics if metrics is not None else MetricsRegistry()
+        self._ack_seconds = self.metrics.histogram("agent_ack_seconds", "一批记录从发送到汇总端确认的耗时")
+        self._dropped = {reason: self.metrics.counter("agent_records_dropped_total", "队列满时丢弃的最旧记录数",
+                                                      reason=reason)
+                         for reason in ("queue_full", "requeue")}
+        self._sent_times = {}
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="agent-sender", daemon=True)
+        self._thread.start()
+
+    def put(self, record):
+        record = dict(record)
+        record.setdefault("host", self.host)
+        with self._cond:
+            if len(self._queue) == self._queue.maxlen:
+                self.dropped += 1
+                self._dropped["queue_full"].inc()
+            self._queue.append(record)
+            self._cond.notify_all()
+
+    def _next_batch(self):
+        """攒够一批或第一条记录等待了 batch_seconds 秒；关闭且没有剩余记录时返回 None"""
+        with self._cond:
+            while not self._queue and not self._closing:
+                self._cond.wait()
+            deadline = time.monotonic() + self.batch_seconds
+            while len(self._queue) < self.batch_size and not self._closing:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            if not self._queue:
+                return None
+            return [self._queue.popleft() for _ in range(min(self.batch_size, len(self._queue)))]
+
+    def _connect(self):
+        self._sock = socket.create_connection(self.address, timeout=self.timeout)
+        self._sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._reader = self._sock.makefile('rb')
+
+    def _disconnect(self):
+        """断开连接，没有确认的批次按顺序放回队列开头"""
+        for sock in (self._reader, self._sock):
+            if sock is not None:
+                try:
+                    sock.close()
+                except OSError:
+                    pass
+        self._sock = self._reader = None
+        with self._cond:
+            requeued = [record for seq in sorted(self._inflight) for record in self._inflight[seq]]
+            # 队列有界：放回的批次加上断线期间新采的记录超出容量时，与 put 一样丢弃最旧的
+            # （直接 extendleft 会从右端挤掉最新的记录，而且不计数）
+            overflow = len(requeued) + len(self._queue) - self._queue.maxlen
+            if overflow > 0:
+                requeued = requeued[overflow:]
+                self.dropped += overflow
+                self._dropped["requeue"].inc(overflow)
+                print(f"采集端队列已满，丢弃了 {overflow} 条最旧的未确认记录")
+            self._queue.extendleft(reversed(requeued))
+            self._inflight.clear()
+            self._sent_times.clear()
+
+    def _read_ack(self):
+        line = self._reader.readline()
+        if not line:
+            raise ConnectionError("汇总端关闭了连接")
+        kind, seq, *reason = line.decode('utf-8').split(" ", 2)
+        if seq == "-":
+            # 汇总端无法解析批次头，之前的批次都已确认：被拒绝的是最早的未确认批次
+            seq = min(self._inflight, default=None)
+        else:
+            seq = int(seq)
+        records = self._inflight.pop(seq, None)
+        sent_at = self._sent_times.pop(seq, None)
+        if records is None:
+            return
+        if kind == "A":
+            self.acked += len(records)
+            if sent_at is not None:
+                self._ack_seconds.observe(time.monotonic() - sent_at)
+        else:
+            self.rejected += len(records)
+            print(f"汇总端拒绝了 {len(records)} 条记录: {' '.join(reason).strip()}")
+
+    def _poll_acks(self):
+        while self._inflight and select.select([self._sock], [], [], 0)[0]:
+            self._read_ack()
+
+    def _send(self, batch):
+        self._seq += 1
+        self._inflight[self._seq] = batch
+        self._sent_times[self._seq] = time.monotonic()
+        self._sock.sendall(encode_batch(self._seq, batch))
+        self.sent += len(batch)
+        # 没有确认的批次达到上限时等待确认（背压）
+        while len(self._inflight) >= self.max_inflight:
+            self._read_ack()
+        self._poll_acks()
+
+    def _run(self):
+        delay = 0.5
+        while True:
+            if self._sock is None:
+                try:
+                    self._connect()
+                    delay = 0.5
+                except OSError as e:
+                    if self._closing:
+                        print(f"无法连接汇总端 {self.address[0]}:{self.address[1]}，{len(self._queue)} 条记录未发送: {e}")
+                        return
+                    print(f"无法连接汇总端 {self.address[0]}:{self.address[1]}: {e}，{delay:.0f}秒后重试")
+                    time.sleep(delay)
+                    delay = min(delay * 2, self.retry_max_seconds)
+                    continue
+            try:
+                batch = self._next_batch()
+                if batch is None:
+                    # 关闭：等待最后几批的确认
+                    while self._inflight:
+                        self._read_ack()
+                    self._disconnect()
+                    return
+                self._send(batch)
+            except (OSError, ValueError) as e:
+                print(f"与汇总端的连接中断: {e}")
+                self.reconnects += 1
+                self._disconnect()
+
+    def close(self):
+        """发送完队列中的记录并等待确认（连接不上时最多等待 timeout 秒）"""
+        with self._cond:
+            self._closing = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(self.timeout * 2 + self.batch_seconds)
+
+    def backlog(self):
+        return len(self._queue)
+
+    def stats(self):
+        return {
+            "sent": self.sent,
+            "acked": self.acked,
+            "queued": len(self._queue),
+            "dropped": self.dropped,
+            "rejected": self.rejected,
+            "reconnects": self.reconnects,
+        }
+
+
+def host_dir_name(host):
+    """主机名 -> 目录名：只保留字母、数字和 ._-
+
+    主机名中有其他字符时替换为 _ 并加上原主机名的哈希后缀，不同的主机不会映射到同一个目录
+    （例如 a/b -> a_b-<哈希>，与主机 a_b 的目录不同）。
+    """
+    host = str(host or "unknown")
+    name = re.sub(r'[^A-Za-z0-9._-]', '_', host)
+    if name == host and name.strip('.'):
+        return name
+    digest = hashlib.blake2b(host.encode('utf-8'), digest_size=4).hexdigest()
+    return f"{name.strip('.') or '_'}-{digest}"
+
+
+def last_epoch(directory):
+    """存储中最后一条记录的时间（秒），没有记录时返回 None；只读最后一个非空分段的结尾"""
+    for _, _, path in reversed(SegmentedStorage.list_segments(directory)):
+        with open(path, 'rb') as f:
+            f.seek(0, 2)
+            size = f.tell()
+            f.seek(max(0, size - 65536))
+            lines = f.read().split(b'\n')[:-1]
+        for line in reversed(lines):
+            try:
+                epoch = record_epoch(json.loads(line))
+            except ValueError:
+                continue
+            if epoch is not None:
+                return epoch
+    for _, _, path in reversed(list_archives(directory)):
+        header = ArchiveReader(path).header
+        if header["count"]:
+            return header["last_ms"] / 1000.0
+    return None
+
+
+class HostStores:
+    """按主机分开的存储：每台主机一个分段目录 <directory>/<主机>/，带自己的多分辨率聚合
+
+    接口与存储后端相同（append_many/close/location），交给 BackgroundWriter 在写入线程中调用。
+    每台主机的存储保持时间顺序：不晚于该主机最后一条已写入记录的记录被丢弃
+    （采集端重连后重发的已写入批次），所以范围查询、归档和图表都可以按单台主机的数据使用。
+    """
+
+    def __init__(self, directory, fsync="interval", rollups=True, max_open=MAX_OPEN_HOSTS, metrics=None):
+        self.location = Path(directory)
+        self.location.mkdir(parents=True, exist_ok=True)
+        self.fsync = fsync
+        self.rollups = rollups
+        self.max_open = max(int(max_open), 1)
+        self.metrics = metrics if metrics is not None else MetricsRegistry()
+        self._open = OrderedDict()  # 主机 -> (存储, 聚合)
+        self._last = {}  # 主机 -> 最后一条已写入记录的时间
+        self.duplicates = 0
+        self._duplicates = self.metrics.counter("collector_duplicates_total",
+                                                "不晚于该主机最后一条已写入记录而被丢弃的记录数（重发的批次）")
+
+    def _store(self, host):
+        entry = self._open.get(host)
+        if entry is not None:
+            self._open.move_to_end(host)
+            return entry
+        if len(self._open) >= self.max_open:
+            _, (storage, rollups) = self._open.popitem(last=False)
+            storage.close()
+            if rollups is not None:
+                rollups.close()
+        directory = self.location / host_dir_name(host)
+        storage = SegmentedStorage(directory, fsync=self.fsync)
+        rollups = RollupWriter(rollup_dir_for(directory)) if self.rollups else None
+        if host not in self._last:
+            self._last[host] = last_epoch(directory)
+        entry = self._open[host] = (storage, rollups)
+        return entry
+
+    def append_many(self, records):
+        """按主机分组写入（保持每台主机内的顺序），返回写入的字节数"""
+        by_host = {}
+        for record in records:
+            by_host.setdefault(record.get("host") or "unknown", []).append(record)
+        written = 0
+        for host, host_records in by_host.items():
+            storage, rollups = self._store(host)
+            last = self._last.get(host)
+            accepted = []
+            for record in host_records:
+                epoch = record_epoch(record)
+                if epoch is None or (last is not None and epoch <= last):
+                    self.duplicates += 1
+                    self._duplicates.inc()
+                    continue
+                last = epoch
+                accepted.append(record)
+            if not accepted:
+                continue
+            written += storage.append_many(accepted) or 0
+            self._last[host] = last
+            if rollups is not None:
+                for record in accepted:
+                    rollups.add(record["timestamp"], {**record["temperatures"], **record.get("sensors", {})})
+        return written
+
+    @property
+    def hosts(self):
+        return len(self._last)
+
+    def close(self):
+        for storage, rollups in self._open.values():
+            storage.close()
+            if rollups is not None:
+                rollups.close()
+        self._open.clear()
+
+
+class Collector:
+    """汇总端：用 asyncio 同时接收大量采集端的连接，把每台主机的记录写入 <directory>/<主机>/ 下的分段存储
+
+    每个连接一个协程，每批只解析一次并整体放入后台写入线程的队列（group commit 由 BackgroundWriter 完成）。
+    写入线程把这一批写入存储后才回复确认，汇总端进程崩溃不会丢失已确认的批次
+    （fsync 为 always 时断电也不会丢失）。写入队列积压超过 high_watermark 时暂停读取，背压经TCP传回采集端。
+    """
+
+    def __init__(self, directory, host="0.0.0.0", port=DEFAULT_PORT, queue_size=200_000, batch_size=2000,
+                 batch_seconds=0.5, fsync="interval", rollups=True, metrics=None):
+        self.host = host
+        self.port = port
+        self.metrics = metrics if metrics is not None else MetricsRegistry()
+        self.stores = HostStores(directory, fsync=fsync, rollups=rollups, metrics=self.metrics)
+        self.writer = BackgroundWriter(self.stores, None, queue_size=queue_size, batch_size=batch_size,
+                                       batch_seconds=batch_seconds, overflow="block", metrics=self.metrics)
+        self.writer.on_commit = self._on_commit
+        self._waiting = deque()  # (写入序号, future)，按序号排列
+        self.high_watermark = int(queue_size * 0.8)
+        self.samples = 0
+        self.batches = 0
+        self.connections = 0
+        self._samples = self.metrics.counter("collector_samples_total", "汇总端收到的记录数")
+        self._connections = self.metrics.gauge("collector_connections", "当前连接的采集端数")
+        self._server = None
+        self._loop = None
+        self._ready = threading.Event()
+
+    def _on_commit(self, committed):
+        """写入线程每写完一批调用一次：回到事件循环中确认已经写入的批次"""
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+        try:
+            loop.call_soon_threadsafe(self._release, committed)
+        except RuntimeError:
+            # 事件循环已经关闭
+            pass
+
+    def _release(self, committed):
+        stopped = self.writer.error is not None
+        while self._waiting and (stopped or self._waiting[0][0] <= committed):
+            _, future = self._waiting.popleft()
+            if not future.done():
+                future.set_result(None)
+
+    async def _ack(self, writer, seq, position):
+        """这一批写入存储后再回复 A；写入线程停止时不确认并断开，采集端重连后重发"""
+        if self.writer.committed < position and self.writer.error is None:
+            future = self._loop.create_future()
+            self._waiting.append((position, future))
+            await future
+        if self.writer.committed < position:
+            writer.close()
+            return
+        writer.write(b"A %d\n" % seq)
+
+    @staticmethod
+    async def _flush_acks(acks):
+        pending = [ack for ack in acks if not ack.done()]
+        if pending:
+            await asyncio.wait(pending)
+
+    async def _handle(self, reader, writer):
+        self.connections += 1
+        self._connections.set(self.connections)
+        acks = deque()  # 这个连接上等待写入完成的确认
+        try:
+            while True:
+                header = await reader.readline()
+                if not header:
+                    break
+                try:
+                    kind, seq, count, size = header.split()
+                    seq, count, size = int(seq), int(count), int(size)
+                    if kind != b"B":
+                        raise ValueError(kind)
+                except ValueError:
+                    # 无法分帧，后面的数据都不能再解析：先发出之前各批的确认，再拒绝这一批并断开
+                    parts = header.split()
+                    rejected = parts[1] if len(parts) > 1 and parts[1].isdigit() else b"-"
+                    await self._flush_acks(acks)
+                    writer.write(b"E %s bad header\n" % rejected)
+                    await writer.drain()
+                    break
+                payload = await reader.readexactly(size)
+                try:
+                    records = [json.loads(line) for line in payload.splitlines() if line]
+                    if len(records) != count:
+                        raise ValueError(f"expected {count} records, got {len(records)}")
+                except ValueError as e:
+                    writer.write(f"E {seq} {e}\n".encode('utf-8'))
+                    continue
+
+                while self.writer.backlog() >= self.high_watermark:
+                    await asyncio.sleep(0.01)
+                try:
+                    position = self.writer.put_many(records)
+                except RuntimeError as e:
+                    # 写入线程已停止：不确认这一批并断开，采集端重连后重发
+                    print(f"汇总端无法写入: {e}")
+                    break
+                self.samples += count
+                self.batches += 1
+                self._samples.inc(count)
+                acks.append(asyncio.ensure_future(self._ack(writer, seq, position)))
+                while acks and acks[0].done():
+                    acks.popleft()
+                await writer.drain()
+            # 连接结束前发出还在等待写入的确认
+            await self._flush_acks(acks)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self.connections -= 1
+            self._connections.set(self.connections)
+            writer.close()
+
+    async def serve(self):
+        self._loop = asyncio.get_running_loop()
+        self._server = await asyncio.start_server(self._handle, self.host, self.port, limit=1 << 20, backlog=4096)
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._ready.set()
+        async with self._server:
+            try:
+                await self._server.serve_forever()
+            except asyncio.CancelledError:
+                pass
+
+    def start(self):
+        """在后台线程中运行事件循环，监听端口后返回"""
+        self.writer.start()
+        thread = threading.Thread(target=lambda: asyncio.run(self.serve()), name="collector", daemon=True)
+        thread.start()
+        self._ready.wait()
+        return thread
+
+    def stop(self):
+        """停止接收新数据，写完队列中的记录后关闭所有主机的存储"""
+        if self._server is not None and self._loop is not None and self._loop.is_running():
+            self._loop.call_soon_threadsafe(self._server.close)
+        self.writer.close()
+        self.stores.close()
+
+    def stats(self):
+        return {"samples": self.samples, "batches": self.batches, "connections": self.connections,
+                "hosts": self.stores.hosts, "duplicates": self.stores.duplicates, "writer": self.writer.stats()}
+
+
+def _handle_sigterm(signum, frame):
+    # 和 Ctrl+C 走同一条退出路径，写完队列中的记录后再退出
+    raise KeyboardInterrupt
+
+
+def run_collector(directory, host="0.0.0.0", port=DEFAULT_PORT, fsync="interval"):
+    collector = Collector(directory, host, port, fsync=fsync)
+    signal.signal(signal.SIGTERM, _handle_sigterm)
+    thread = collector.start()
+    print(f"汇总端已启动: {host}:{collector.port}，数据写入 {directory}")
+    print("按 Ctrl+C 停止")
+    try:
+        while thread.is_alive():
+            thread.join(1.0)
+    except KeyboardInterrupt:
+        print("\n汇总端已停止")
+    finally:
+        collector.stop()
+        print(f"统计: {collector.stats()}")
+
+
+async def _push(host, port, batches, max_inflight, latencies):
+    """基准测试用的异步采集端：保持最多 max_inflight 批没有确认"""
+    reader, writer = await asyncio.open_connection(host, port)
+    window = asyncio.Semaphore(max_inflight)
+    sent_at = {}
+
+    async def read_acks():
+        for _ in range(len(batches)):
+            line = await reader.readline()
+            seq = int(line.split()[1])
+            latencies.append(time.perf_counter() - sent_at.pop(seq))
+            window.release()
+
+    acks = asyncio.ensure_future(read_acks())
+    for seq, payload in batches:
+        await window.acquire()
+        sent_at[seq] = time.perf_counter()
+        writer.write(payload)
+        await writer.drain()
+    await acks
+    writer.close()
+
+
+def bench_ingest(agents=200, samples_per_agent=500, batch_size=50, max_inflight=4, directory=None):
+    """在本机启动汇总端和 agents 个并发的采集端连接，测量写入共享存储的吞吐量（条/秒）"""
+    import tempfile
+    import numpy as np
+
+    with tempfile.TemporaryDirectory() as tmp:
+        collector = Collector(directory or tmp, "127.0.0.1", 0, fsync="never")
+        collector.start()
+
+        # 批次预先编码，只测量传输、解析和写入
+        payloads = []
+        for agent in range(agents):
+            records = [{"timestamp": f"2026-01-01T00:{i // 60 % 60:02d}:{i % 60:02d}", "host": f"host-{agent:05d}",
+                        "temperatures": {"cpu": 45.0 + (i % 10) / 10, "gpu": 50.5}, "sensors": {}, "sampled_at": {}}
+                       for i in range(samples_per_agent)]
+            payloads.append([(seq + 1, encode_batch(seq + 1, records[start:start + batch_size]))
+                             for seq, start in enumerate(range(0, samples_per_agent, batch_size))])
+
+        async def run_all():
+            latencies = []
+            await asyncio.gather(*(_push("127.0.0.1", collector.port, batches, max_inflight, latencies)
+                                   for batches in payloads))
+            return latencies
+
+        total = agents * samples_per_agent
+        started = time.perf_counter()
+        latencies = asyncio.run(run_all())
+        acked = time.perf_counter() - started
+        collector.stop()
+        elapsed = time.perf_counter() - started
+
+        written = collector.writer.written
+        latencies_ms = np.array(latencies) * 1000
+        return {
+            "agents": agents,
+            "samples": total,
+            "batch_size": batch_size,
+            "written": written,
+            "ack_seconds": round(acked, 3),
+            "seconds": round(elapsed, 3),
+            "ingest_samples_per_second": round(total / acked, 1),
+            "written_samples_per_second": round(written / elapsed, 1),
+            "ack_latency_ms": {"p50": round(float(np.percentile(latencies_ms, 50)), 2),
+                               "p99": round(float(np.percentile(latencies_ms, 99)), 2)},
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="温度数据汇总端：接收多台机器的采集端推送的记录")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    collect_parser = subparsers.add_parser("collect", help="启动汇总端")
+    collect_parser.add_argument("--dir", default="collected_segments", help="共享分段存储目录")
+    collect_parser.add_argument("--host", default="0.0.0.0")
+    collect_parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    collect_parser.add_argument("--fsync", choices=("always", "interval", "never"), default="interval")
+
+    bench_parser = subparsers.add_parser("bench", help="本机接收吞吐量基准测试")
+    bench_parser.add_argument("--agents", type=int, default=200)
+    bench_parser.add_argument("--samples", type=int, default=500, help="每个采集端发送的记录数")
+    bench_parser.add_argument("--batch-size", type=int, default=50)
+
+    args = parser.parse_args()
+    if args.command == "collect":
+        run_collector(args.dir, args.host, args.port, args.fsync)
+    else:
+        print(json.dumps(bench_ingest(args.agents, args.samples, args.batch_size), ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,338 @@
+# -*- coding: utf-8 -*-
+
+import json
+import math
+import queue
+import fnmatch
+import threading
+import urllib.request
+from collections import deque
+from pathlib import Path
+
+from rollups import to_epoch, from_epoch
+
+
+SOURCES = ("temperatures", "sensors")
+
+
+class Rule:
+    """告警规则的基类：按传感器保存固定大小的状态，每个样本的开销是常数
+
+    source 选择检查记录中的哪一组读数："temperatures"（每个组件的最高温度，id 为 cpu/gpu）
+    或 "sensors"（每个传感器的读数，id 例如 cpu.coretemp.temp1）。同一个温度不会被一条规则检查两次。
+    sensors 为 id 的通配符（例如 "cpu"、"gpu.*"、"*"），匹配结果按 id 缓存。
+    evaluate() 只在状态变化时（开始告警 firing / 恢复 resolved）返回事件，持续超限不会重复告警。
+    """
+
+    kind = None
+
+    def __init__(self, name=None, sensors="*", source="temperatures"):
+        self.name = name or self.kind
+        if source not in SOURCES:
+            raise ValueError(f"告警规则 {self.name} 的 source 无效: {source} (可选: {', '.join(SOURCES)})")
+        self.sensors = sensors
+        self.source = source
+        self._matches = {}
+        self._state = {}
+
+    def matches(self, sensor_id):
+        matched = self._matches.get(sensor_id)
+        if matched is None:
+            matched = self._matches[sensor_id] = fnmatch.fnmatchcase(sensor_id, self.sensors)
+        return matched
+
+    def evaluate(self, sensor_id, t, value):
+        raise NotImplementedError
+
+    def _event(self, sensor_id, t, value, state, message, **details):
+        return {"time": from_epoch(t).isoformat(timespec='seconds'), "rule": self.name, "kind": self.kind,
+                "sensor": sensor_id, "value": value, "state": state, "message": message, **details}
+
+
+class ThresholdRule(Rule):
+    """静态阈值：高于 high（或低于 low）时告警，回到阈值内 hysteresis °C 以上才恢复，避免在阈值附近反复告警"""
+
+    kind = "threshold"
+
+    def __init__(self, name=None, sensors="*", source="temperatures", high=None, low=None, hysteresis=2.0):
+        super().__init__(name, sensors, source)
+        if high is None and low is None:
+            raise ValueError(f"阈值规则 {self.name} 至少需要 high 或 low")
+        self.high = high
+        self.low = low
+        self.hysteresis = hysteresis
+
+    def evaluate(self, sensor_id, t, value):
+        active = self._state.get(sensor_id)
+        if active is None:
+            if self.high is not None and value >= self.high:
+                self._state[sensor_id] = "high"
+                return self._event(sensor_id, t, value, "firing", f"{sensor_id} 温度 {value}°C 超过 {self.high}°C",
+                                   threshold=self.high)
+            if self.low is not None and value <= self.low:
+                self._state[sensor_id] = "low"
+                return self._event(sensor_id, t, value, "firing", f"{sensor_id} 温度 {value}°C 低于 {self.low}°C",
+                                   threshold=self.low)
+            return None
+        if ((active == "high" and value <= self.high - self.hysteresis)
+                or (active == "low" and value >= self.low + self.hysteresis)):
+            del self._state[sensor_id]
+            threshold = self.high if active == "high" else self.low
+            return self._event(sensor_id, t, value, "resolved", f"{sensor_id} 温度 {value}°C 已恢复",
+                               threshold=threshold)
+        return None
+
+
+class RateOfChangeRule(Rule):
+    """温度变化率：每隔 window_seconds 秒用窗口两端的读数计算 °C/s，绝对值超过 max_rate 时告警，
+    降到 max_rate 的一半以下时恢复。每个传感器只保存窗口起点和告警状态"""
+
+    kind = "rate"
+
+    def __init__(self, name=None, sensors="*", source="temperatures", max_rate=1.0, window_seconds=10.0):
+        super().__init__(name, sensors, source)
+        self.max_rate = max_rate
+        self.window_seconds = window_seconds
+
+    def evaluate(self, sensor_id, t, value):
+        state = self._state.get(sensor_id)
+        if state is None:
+            self._state[sensor_id] = [t, value, False]
+            return None
+        elapsed = t - state[0]
+        if elapsed < self.window_seconds:
+            if elapsed < 0:
+                # 时间倒退（例如导入了旧数据）时重新开始
+                state[0], state[1] = t, value
+            return None
+
+        rate = (value - state[1]) / elapsed
+        state[0], state[1] = t, value
+        if not state[2] and abs(rate) > self.max_rate:
+            state[2] = True
+            return self._event(sensor_id, t, value, "firing",
+                               f"{sensor_id} 温度变化 {rate:+.2f}°C/s 超过 {self.max_rate}°C/s", rate=round(rate, 3))
+        if state[2] and abs(rate) < self.max_rate / 2:
+            state[2] = False
+            return self._event(sensor_id, t, value, "resolved", f"{sensor_id} 温度变化已恢复 ({rate:+.2f}°C/s)",
+                               rate=round(rate, 3))
+        return None
+
+
+class ZScoreRule(Rule):
+    """异常检测：读数偏离近期均值超过 threshold 个标准差时告警，回到 threshold/2 以内时恢复
+
+    mode="ewma" 用指数加权的均值和方差（每个传感器3个数），
+    mode="rolling" 用最近 window 个读数的环形缓冲和累计和（每个传感器 window 个数）。
+    前 warmup 个读数只用于学习，不告警。
+    """
+
+    kind = "zscore"
+
+    def __init__(self, name=None, sensors="*", source="temperatures", threshold=4.0, mode="ewma", alpha=0.05,
+                 window=300, warmup=30, min_std=0.1):
+        super().__init__(name, sensors, source)
+        if mode not in ("ewma", "rolling"):
+            raise ValueError(f"未知的z-score模式: {mode} (可选: ewma, rolling)")
+        self.threshold = threshold
+        self.mode = mode
+        self.alpha = alpha
+        self.window = window
+        self.warmup = warmup
+        # 温度长时间不变时标准差接近0，设置下限避免0.1°C的跳动就告警
+        self.min_std = min_std
+
+    def _score(self, state, value):
+        """用更新前的统计量计算 z，然后把 value 加入统计量"""
+        if self.mode == "ewma":
+            count, mean, variance = state["count"], state["mean"], state["var"]
+            if count == 0:
+                state["mean"] = value
+                z = 0.0
+            else:
+                z = (value - mean) / max(math.sqrt(variance), self.min_std)
+                delta = value - mean
+                state["mean"] = mean + self.alpha * delta
+                state["var"] = (1 - self.alpha) * (variance + self.alpha * delta * delta)
+            state["count"] = count + 1
+            return z
+
+        values = state["values"]
+        count = len(values)
+        z = 0.0
+        if count:
+            mean = state["sum"] / count
+            variance = max(state["sumsq"] / count - mean * mean, 0.0)
+            z = (value - mean) / max(math.sqrt(variance), self.min_std)
+        if count == self.window:
+            old = values.popleft()
+            state["sum"] -= old
+            state["sumsq"] -= old * old
+        values.append(value)
+        state["sum"] += value
+        state["sumsq"] += value * value
+        state["count"] += 1
+        return z
+
+    def evaluate(self, sensor_id, t, value):
+        state = self._state.get(sensor_id)
+        if state is None:
+            if self.mode == "ewma":
+                state = {"count": 0, "mean": 0.0, "var": 0.0, "active": False}
+            else:
+                state = {"count": 0, "values": deque(maxlen=self.window), "sum": 0.0, "sumsq": 0.0, "active": False}
+            self._state[sensor_id] = state
+
+        z = self._score(state, value)
+        if state["count"] <= self.warmup:
+            return None
+        if not state["active"] and abs(z) > self.threshold:
+            state["active"] = True
+            return self._event(sensor_id, t, value, "firing",
+                               f"{sensor_id} 温度 {value}°C 异常 (z={z:+.1f})", z=round(z, 2))
+        if state["active"] and abs(z) < self.threshold / 2:
+            state["active"] = False
+            return self._event(sensor_id, t, value, "resolved", f"{sensor_id} 温度已恢复正常 (z={z:+.1f})",
+                               z=round(z, 2))
+        return None
+
+
+RULE_TYPES = {rule.kind: rule for rule in (ThresholdRule, RateOfChangeRule, ZScoreRule)}
+
+
+class StdoutSink:
+    def send(self, event):
+        prefix = "[告警]" if event["state"] == "firing" else "[恢复]"
+        print(f"{prefix} {event['time']} {event['rule']}: {event['message']}")
+
+    def close(self):
+        pass
+
+
+class FileSink:
+    """把告警事件追加到 JSON Lines 文件"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._file = open(self.path, 'a', encoding='utf-8')
+
+    def send(self, event):
+        self._file.write(json.dumps(event, ensure_ascii=False) + '\n')
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class WebhookSink:
+    """把告警事件以JSON POST到本地webhook；在后台线程发送，接收端慢或不可用时不影响采样"""
+
+    def __init__(self, url, timeout=5.0, max_pending=1000):
+        self.url = url
+        self.timeout = timeout
+        self._queue = queue.Queue(maxsize=max_pending)
+        self.dropped = 0
+        self._thread = threading.Thread(target=self._run, name="alert-webhook", daemon=True)
+        self._thread.start()
+
+    def send(self, event):
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        while True:
+            event = self._queue.get()
+            if event is None:
+                return
+            body = json.dumps(event, ensure_ascii=False).encode('utf-8')
+            request = urllib.request.Request(self.url, data=body, method="POST",
+                                             headers={"Content-Type": "application/json; charset=utf-8"})
+            try:
+                with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                    response.read()
+            except OSError as e:
+                print(f"发送告警到 {self.url} 失败: {e}")
+
+    def close(self):
+        """发送完已经排队的告警后停止"""
+        self._queue.put(None)
+        self._thread.join(self.timeout * 2)
+
+
+SINK_TYPES = {"stdout": StdoutSink, "file": FileSink, "webhook": WebhookSink}
+
+
+class AlertEngine:
+    """流式告警：每条记录的每个读数交给 source 和 sensors 都匹配的规则，状态变化的事件发送到所有输出
+
+    不读取历史数据，每个样本的开销与 规则数 × 传感器数 成正比。
+    """
+
+    def __init__(self, rules, sinks):
+        self.rules = list(rules)
+        self.sinks = list(sinks)
+        self._rules_for = {}  # (读数组, 传感器id) -> 匹配的规则
+        self.events = 0
+
+    def _rules(self, source, sensor_id):
+        rules = self._rules_for.get((source, sensor_id))
+        if rules is None:
+            rules = self._rules_for[source, sensor_id] = [rule for rule in self.rules
+                                                          if rule.source == source and rule.matches(sensor_id)]
+        return rules
+
+    def process(self, record):
+        """处理一条采样记录，返回产生的告警事件"""
+        try:
+            t = to_epoch(record["timestamp"])
+        except (KeyError, TypeError, ValueError):
+            return []
+        events = []
+        for source in SOURCES:
+            for sensor_id, value in (record.get(source) or {}).items():
+                if value is None:
+                    continue
+                for rule in self._rules(source, sensor_id):
+                    event = rule.evaluate(sensor_id, t, value)
+                    if event is not None:
+                        events.append(event)
+        for event in events:
+            self.events += 1
+            for sink in self.sinks:
+                try:
+                    sink.send(event)
+                except Exception as e:
+                    print(f"告警输出失败 ({type(sink).__name__}): {e}")
+        return events
+
+    def close(self):
+        for sink in self.sinks:
+            sink.close()
+
+
+def create_rule(config):
+    config = dict(config)
+    rule_type = config.pop("type", None)
+    if rule_type not in RULE_TYPES:
+        raise ValueError(f"未知的告警规则类型: {rule_type} (可选: {', '.join(RULE_TYPES)})")
+    return RULE_TYPES[rule_type](**config)
+
+
+def create_sink(config):
+    config = dict(config)
+    sink_type = config.pop("type", None)
+    if sink_type not in SINK_TYPES:
+        raise ValueError(f"未知的告警输出类型: {sink_type} (可选: {', '.join(SINK_TYPES)})")
+    return SINK_TYPES[sink_type](**config)
+
+
+def create_alert_engine(config):
+    """根据 config["alerts"] 创建告警引擎，没有启用时返回 None"""
+    alerts_config = config.get("alerts", {})
+    if not alerts_config.get("enabled", False):
+        return None
+    rules = [create_rule(rule) for rule in alerts_config.get("rules", [])]
+    sinks = [create_sink(sink) for sink in alerts_config.get("sinks", [{"type": "stdout"}])]
+    return AlertEngine(rules, sinks)
@@ -0,0 +1,515 @@
+# -*- coding: utf-8 -*-
+
+import os
+import re
+import json
+import time
+import zlib
+import struct
+import argparse
+from pathlib import Path
+
+import numpy as np
+
+from storage import SegmentedStorage, index_path_for
+
+# 归档文件与被压缩的分段同名，扩展名为 .tca（temperature columnar archive），按序号与分段一起排序
+ARCHIVE_PATTERN = re.compile(r'^segment-(\d{8})-(\d+)\.tca$')
+ARCHIVE_SUFFIX = ".tca"
+# 归档分段时无法写入归档的行（损坏或时间戳无效）保存在同名的 .rejected 文件中
+REJECTED_SUFFIX = ".rejected"
+MAGIC = b"TCA1"
+# 按列保存的字段，记录中的其他顶层字段（例如汇总端记录的 host）按行保存在 extras 块中
+RECORD_FIELDS = ("timestamp", "temperatures", "sensors", "sampled_at")
+# 温度量化为 0.01°C，采样时间偏移量化为 1 毫秒
+TEMPERATURE_SCALE = 100
+OFFSET_SCALE = 1
+
+
+def list_archives(directory):
+    """按序号返回目录中的所有归档文件 [(序号, 创建时间, 路径)]"""
+    archives = []
+    directory = Path(directory)
+    if not directory.is_dir():
+        return archives
+    for path in directory.iterdir():
+        match = ARCHIVE_PATTERN.match(path.name)
+        if match:
+            archives.append((int(match.group(1)), int(match.group(2)), path))
+    archives.sort()
+    return archives
+
+
+def _smallest_int_dtype(values):
+    for dtype in (np.int8, np.int16, np.int32):
+        info = np.iinfo(dtype)
+        if values.size == 0 or (values.min() >= info.min and values.max() <= info.max):
+            return dtype
+    return np.int64
+
+
+def encode_timestamps(ms):
+    """delta-of-delta 编码：固定采样间隔时二阶差分几乎全为0，再用zlib压缩"""
+    ms = np.asarray(ms, dtype=np.int64)
+    meta = {"first": int(ms[0]) if ms.size else 0, "first_delta": int(ms[1] - ms[0]) if ms.size > 1 else 0}
+    dod = np.diff(ms, n=2)
+    dtype = _smallest_int_dtype(dod)
+    meta["dtype"] = np.dtype(dtype).name
+    return meta, zlib.compress(dod.astype(dtype).tobytes(), 6)
+
+
+def decode_timestamps(meta, payload, count):
+    if count == 0:
+        return np.empty(0, dtype=np.int64)
+    dod = np.frombuffer(zlib.decompress(payload), dtype=meta["dtype"]).astype(np.int64)
+    deltas = np.empty(count - 1, dtype=np.int64)
+    if count > 1:
+        deltas[0] = meta["first_delta"]
+        np.cumsum(dod, out=deltas[1:])
+        deltas[1:] += meta["first_delta"]
+    ms = np.empty(count, dtype=np.int64)
+    ms[0] = meta["first"]
+    np.cumsum(deltas, out=ms[1:])
+    ms[1:] += meta["first"]
+    return ms
+
+
+def encode_values(values, scale):
+    """量化为整数后与前一个值异或，再按字节拆分（同一字节位置放在一起）后用zlib压缩
+
+    缺失值（NaN）记录在有效位图中，并用前一个有效值填充，使异或结果为0。
+    """
+    values = np.asarray(values, dtype=np.float64)
+    valid = ~np.isnan(values)
+    quantized = np.zeros(values.size, dtype=np.int64)
+    quantized[valid] = np.rint(values[valid] * scale)
+    if not valid.all():
+        # 前向填充：缺失位置使用前一个有效值
+        last_valid = np.maximum.accumulate(np.where(valid, np.arange(values.size), 0))
+        quantized = quantized[last_valid]
+    quantized = quantized.astype('<i4')
+
+    xored = quantized.copy()
+    xored[1:] ^= quantized[:-1]
+    shuffled = xored.view(np.uint8).reshape(-1, 4).T.tobytes()
+
+    meta = {"scale": scale}
+    blocks = [zlib.compress(shuffled, 6)]
+    if not valid.all():
+        meta["has_valid"] = True
+        blocks.append(zlib.compress(np.packbits(valid).tobytes(), 6))
+    return meta, blocks
+
+
+def decode_values(meta, blocks, count):
+    """解码一列，返回 float32 数组（缺失值为NaN），全部为NumPy向量运算"""
+    shuffled = np.frombuffer(zlib.decompress(blocks[0]), dtype=np.uint8)
+    xored = shuffled.reshape(4, count).T.copy().view('<i4').ravel()
+    values = np.bitwise_xor.accumulate(xored).astype(np.float32) / meta["scale"]
+    if meta.get("has_valid"):
+        valid = np.unpackbits(np.frombuffer(zlib.decompress(blocks[1]), dtype=np.uint8), count=count).astype(bool)
+        values[~valid] = np.nan
+    return values
+
+
+def encode_extras(extras):
+    """每行的其他字段 {字段: 值}（没有时为 None）：相同的值只保存一次，行按游程编码 [值序号, 行数]，再用zlib压缩
+
+    同一个分段中 host 等字段通常每行都相同，整个块只有几十字节。
+    """
+    values = []
+    index = {}
+    runs = []
+    for extra in extras:
+        if extra:
+            key = json.dumps(extra, sort_keys=True, ensure_ascii=False)
+            if key not in index:
+                index[key] = len(values)
+                values.append(extra)
+            i = index[key]
+        else:
+            i = -1
+        if runs and runs[-1][0] == i:
+            runs[-1][1] += 1
+        else:
+            runs.append([i, 1])
+    payload = json.dumps({"values": values, "runs": runs}, ensure_ascii=False, separators=(',', ':'))
+    return zlib.compress(payload.encode('utf-8'), 6)
+
+
+def decode_extras(payload, count):
+    """encode_extras 的逆运算，返回每行的 {字段: 值} 或 None"""
+    data = json.loads(zlib.decompress(payload))
+    values = data["values"]
+    extras = []
+    for i, length in data["runs"]:
+        extras.extend([values[i] if i >= 0 else None] * length)
+    if len(extras) != count:
+        raise ValueError(f"extras 行数 {len(extras)} 与记录数 {count} 不符")
+    return extras
+
+
+def _parse_ms(values):
+    """把时间字符串转换为毫秒（datetime64[ms]），无法解析的值为 NaT"""
+    try:
+        return np.array(values, dtype='datetime64[ms]')
+    except (ValueError, TypeError):
+        pass
+    # 有无法解析的值时逐个转换
+    parsed = np.empty(len(values), dtype='datetime64[ms]')
+    for i, value in enumerate(values):
+        try:
+            parsed[i] = np.datetime64(value, 'ms')
+        except (ValueError, TypeError):
+            parsed[i] = np.datetime64('NaT')
+    return parsed
+
+
+def records_to_columns(records, rejected=None, extras=None):
+    """把记录转换为列：时间戳（毫秒）和 {列名: float64数组}
+
+    列名为 "temperatures.<组件>"、"sensors.<传感器id>" 和 "sampled_at.<组件>"（相对时间戳的毫秒偏移）。
+    时间戳缺失或无法解析的记录被丢弃，给出 rejected 列表时把这些记录追加到其中；
+    无法解析的 sampled_at 和非数值的读数按缺失值处理。
+    给出 extras 列表时为每一行追加其他顶层字段（例如 host）组成的字典，没有时追加 None。
+    """
+    kept = []
+    timestamps = []
+    for record in records:
+        try:
+            timestamp = record["timestamp"]
+        except (TypeError, KeyError):
+            timestamp = None
+        if isinstance(timestamp, str):
+            kept.append(record)
+            timestamps.append(timestamp)
+        elif rejected is not None:
+            rejected.append(record)
+
+    parsed = _parse_ms(timestamps)
+    valid = ~np.isnat(parsed)
+    if not valid.all():
+        if rejected is not None:
+            rejected.extend(record for record, ok in zip(kept, valid.tolist()) if not ok)
+        kept = [record for record, ok in zip(kept, valid.tolist()) if ok]
+        parsed = parsed[valid]
+    ms = parsed.astype(np.int64)
+
+    columns = {}
+    for row, record in enumerate(kept):
+        if extras is not None:
+            extras.append({key: value for key, value in record.items() if key not in RECORD_FIELDS} or None)
+        for group in ("temperatures", "sensors"):
+            for key, value in (record.get(group) or {}).items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    columns.setdefault(f"{group}.{key}", {})[row] = value
+        for key, value in (record.get("sampled_at") or {}).items():
+            if value is not None:
+                columns.setdefault(f"sampled_at.{key}", {})[row] = value
+
+    arrays = {}
+    for name, values in columns.items():
+        column = np.full(len(ms), np.nan)
+        rows = np.fromiter(values.keys(), dtype=np.int64, count=len(values))
+        if name.startswith("sampled_at."):
+            sampled = _parse_ms(list(values.values()))
+            ok = ~np.isnat(sampled)
+            column[rows[ok]] = sampled[ok].astype(np.int64) - ms[rows[ok]]
+        else:
+            column[rows] = np.fromiter(values.values(), dtype=np.float64, count=len(values))
+        arrays[name] = column
+    return ms, arrays
+
+
+def write_archive(path, ms, columns, extras=None):
+    """写入一个归档文件：MAGIC、头部长度、JSON头部，然后是各个压缩块
+
+    头部记录每个块的偏移和长度，读取时只解压需要的列。extras 为每行的其他字段（见 records_to_columns），
+    有值时写入一个 extras 块。先写临时文件再改名。
+    """
+    blocks = []
+    offset = 0
+
+    def add_block(data):
+        nonlocal offset
+        blocks.append(data)
+        entry = [offset, len(data)]
+        offset += len(data)
+        return entry
+
+    ts_meta, ts_payload = encode_timestamps(ms)
+    ts_meta["block"] = add_block(ts_payload)
+    header = {
+        "version": 1,
+        "count": int(len(ms)),
+        "first_ms": int(ms[0]) if len(ms) else None,
+        "last_ms": int(ms[-1]) if len(ms) else None,
+        "timestamps": ts_meta,
+        "columns": {},
+    }
+    for name, values in columns.items():
+        scale = OFFSET_SCALE if name.startswith("sampled_at.") else TEMPERATURE_SCALE
+        meta, column_blocks = encode_values(values, scale)
+        meta["blocks"] = [add_block(block) for block in column_blocks]
+        header["columns"][name] = meta
+    if extras is not None and any(extras):
+        header["extras"] = {"block": add_block(encode_extras(extras))}
+
+    header_bytes = json.dumps(header, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    temp_path = Path(str(path) + ".tmp")
+    with open(temp_path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(struct.pack('<I', len(header_bytes)))
+        f.write(header_bytes)
+        for block in blocks:
+            f.write(block)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+
+
+class ArchiveReader:
+    """读取归档文件：只读取头部，按需解压某些列"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        with open(self.path, 'rb') as f:
+            if f.read(4) != MAGIC:
+                raise ValueError(f"不是归档文件: {path}")
+            header_size, = struct.unpack('<I', f.read(4))
+            self.header = json.loads(f.read(header_size))
+        self._data_offset = 8 + header_size
+        self.count = self.header["count"]
+
+    @property
+    def column_names(self):
+        return list(self.header["columns"])
+
+    def _read_block(self, f, block):
+        f.seek(self._data_offset + block[0])
+        return f.read(block[1])
+
+    def timestamps(self):
+        """时间戳，datetime64[ms]"""
+        meta = self.header["timestamps"]
+        with open(self.path, 'rb') as f:
+            payload = self._read_block(f, meta["block"])
+        return decode_timestamps(meta, payload, self.count).astype('datetime64[ms]')
+
+    def column(self, name):
+        """某一列的 float32 数组，归档中没有该列时返回全NaN"""
+        meta = self.header["columns"].get(name)
+        if meta is None:
+            return np.full(self.count, np.nan, dtype=np.float32)
+        with open(self.path, 'rb') as f:
+            blocks = [self._read_block(f, block) for block in meta["blocks"]]
+        return decode_values(meta, blocks, self.count)
+
+    def extras(self):
+        """每行的其他顶层字段 {字段: 值}（没有时为 None）；归档中没有 extras 块时返回 None"""
+        meta = self.header.get("extras")
+        if meta is None:
+            return None
+        with open(self.path, 'rb') as f:
+            payload = self._read_block(f, meta["block"])
+        return decode_extras(payload, self.count)
+
+    def iter_records(self):
+        """还原为记录（时间精确到毫秒，温度精确到0.01°C），供需要逐条处理的代码使用"""
+        ms = self.timestamps()
+        iso = np.datetime_as_string(ms, unit='ms').tolist()
+        columns = []
+        for name in self.column_names:
+            group, key = name.split('.', 1)
+            values = self.column(name)
+            valid = (~np.isnan(values)).tolist()
+            if group == "sampled_at":
+                offsets = np.nan_to_num(values).astype(np.int64).astype('timedelta64[ms]')
+                values = np.datetime_as_string(ms + offsets, unit='ms').tolist()
+            else:
+                values = np.round(values.astype(np.float64), 2).tolist()
+            columns.append((group, key, values, valid))
+        extras = self.extras()
+
+        for i, timestamp in enumerate(iso):
+            record = {"timestamp": timestamp, "temperatures": {}, "sensors": {}, "sampled_at": {}}
+            for group, key, values, valid in columns:
+                if valid[i]:
+                    record[group][key] = values[i]
+            if not record["sensors"]:
+                del record["sensors"]
+            if not record["sampled_at"]:
+                del record["sampled_at"]
+            if extras is not None and extras[i]:
+                record.update(extras[i])
+            yield record
+
+
+def read_archive_arrays(path, components=("cpu", "gpu"), start=None, end=None):
+    """读取归档的时间戳和温度列（datetime64[ms]、float32），可按 [start, end]（datetime64）过滤"""
+    reader = ArchiveReader(path)
+    timestamps = reader.timestamps()
+    columns = {name: reader.column(f"temperatures.{name}") for name in components}
+    if start is not None or end is not None:
+        mask = np.ones(len(timestamps), dtype=bool)
+        if start is not None:
+            mask &= timestamps >= start
+        if end is not None:
+            mask &= timestamps <= end
+        timestamps = timestamps[mask]
+        columns = {name: column[mask] for name, column in columns.items()}
+    return timestamps, columns
+
+
+def archive_overlaps(path, start=None, end=None):
+    """只读头部判断归档是否与 [start, end]（datetime64[ms]）有交集"""
+    header = ArchiveReader(path).header
+    if header["count"] == 0:
+        return False
+    first = np.datetime64(header["first_ms"], 'ms')
+    last = np.datetime64(header["last_ms"], 'ms')
+    return (start is None or last >= start) and (end is None or first <= end)
+
+
+def archive_segment(segment_path):
+    """把一个已经写完的分段压缩为归档文件，校验记录数后删除原分段和索引，返回 (原大小, 归档大小, 记录数)"""
+    segment_path = Path(segment_path)
+    records = []
+    # 损坏的行和时间戳无效的记录不能写入归档，原样保存在 <分段>.rejected 中
+    rejected = []
+    with open(segment_path, 'rb') as f:
+        for line in f:
+            if line.endswith(b'\n') and line.strip():
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    rejected.append(line)
+
+    invalid = []
+    extras = []
+    ms, columns = records_to_columns(records, rejected=invalid, extras=extras)
+    rejected.extend(json.dumps(record, ensure_ascii=False).encode('utf-8') + b'\n' for record in invalid)
+    archive_path = segment_path.with_suffix(ARCHIVE_SUFFIX)
+    write_archive(archive_path, ms, columns, extras)
+
+    reader = ArchiveReader(archive_path)
+    if reader.count != len(ms):
+        raise ValueError(f"归档校验失败: {archive_path}")
+    if rejected:
+        rejected_path = segment_path.with_suffix(REJECTED_SUFFIX)
+        with open(rejected_path, 'ab') as f:
+            f.writelines(rejected)
+            f.flush()
+            os.fsync(f.fileno())
+        print(f"{segment_path.name}: {len(rejected)} 条记录无法归档，已保存到 {rejected_path.name}")
+    source_size = segment_path.stat().st_size
+    # 归档和原分段同时存在会导致记录被读取两次，校验通过后删除原分段
+    segment_path.unlink()
+    index_path_for(segment_path).unlink(missing_ok=True)
+    return source_size, archive_path.stat().st_size, len(ms)
+
+
+def compact(directory, older_than_days=7):
+    """把分段目录中创建时间早于 older_than_days 天的分段转换为归档，当前正在写入的最后一个分段不处理"""
+    segments = SegmentedStorage.list_segments(directory)
+    cutoff = time.time() - older_than_days * 86400
+    total_source = total_archive = total_records = 0
+    for _, created, path in segments[:-1]:
+        if created > cutoff:
+            continue
+        source_size, archive_size, count = archive_segment(path)
+        total_source += source_size
+        total_archive += archive_size
+        total_records += count
+        print(f"{path.name}: {count} 条记录, {source_size} -> {archive_size} 字节")
+    if total_records:
+        print(f"共归档 {total_records} 条记录，{total_source / total_records:.1f} -> "
+              f"{total_archive / total_records:.2f} 字节/条")
+    else:
+        print("没有需要归档的分段")
+
+
+def convert_file(data_file, archive_path):
+    """把一个 data.json（JSON数组或JSON Lines）转换为单个归档文件"""
+    from data_loader import iter_records
+
+    rejected = []
+    extras = []
+    ms, columns = records_to_columns(iter_records(data_file), rejected=rejected, extras=extras)
+    if rejected:
+        print(f"跳过 {len(rejected)} 条时间戳无效的记录")
+    write_archive(archive_path, ms, columns, extras)
+    print(f"{data_file}: {len(ms)} 条记录, {Path(data_file).stat().st_size} -> {Path(archive_path).stat().st_size} 字节")
+
+
+def benchmark(samples=1_000_000, seed=0):
+    """生成每秒一条的模拟数据，比较各种格式的每条记录字节数和解码速度"""
+    import tempfile
+
+    rng = np.random.default_rng(seed)
+    start = np.datetime64('2025-01-01T00:00:00', 'ms')
+    # 每秒采样，带少量毫秒级抖动
+    ms = start.astype(np.int64) + np.arange(samples, dtype=np.int64) * 1000 + rng.integers(0, 3, samples)
+    cpu = np.round(45 + np.cumsum(rng.normal(0, 0.05, samples)).clip(-15, 30) + rng.normal(0, 0.3, samples), 2)
+    gpu = np.round(50 + np.cumsum(rng.normal(0, 0.05, samples)).clip(-15, 30), 1)
+    gpu[rng.random(samples) < 0.01] = np.nan
+    columns = {"temperatures.cpu": cpu, "temperatures.gpu": gpu,
+               "sensors.cpu.coretemp.core_0": cpu, "sensors.gpu.nvidia.0": gpu}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        iso = np.datetime_as_string(ms.astype('datetime64[ms]'), unit='us').tolist()
+        sample_count = min(samples, 10000)
+        sample_records = [{"timestamp": iso[i],
+                           "temperatures": {"cpu": float(cpu[i]), "gpu": None if np.isnan(gpu[i]) else float(gpu[i])}}
+                          for i in range(sample_count)]
+        pretty_size = len(json.dumps(sample_records, indent=2).encode('utf-8')) / sample_count
+        lines_size = sum(len(json.dumps(r, separators=(',', ':'))) + 1 for r in sample_records) / sample_count
+
+        archive_path = Path(tmp) / "bench.tca"
+        started = time.perf_counter()
+        write_archive(archive_path, ms, columns)
+        encode_seconds = time.perf_counter() - started
+        archive_size = archive_path.stat().st_size
+
+        started = time.perf_counter()
+        timestamps, decoded = read_archive_arrays(archive_path)
+        decode_seconds = time.perf_counter() - started
+
+        assert np.array_equal(timestamps.astype(np.int64), ms)
+        assert np.allclose(decoded["cpu"], cpu, atol=0.006, equal_nan=True)
+
+    print(f"样本数: {samples}")
+    print(f"data.json (indent=2):  {pretty_size:7.1f} 字节/条")
+    print(f"JSON Lines 分段:       {lines_size:7.1f} 字节/条")
+    print(f"列式归档 (4列):        {archive_size / samples:7.2f} 字节/条  "
+          f"(压缩比 {pretty_size * samples / archive_size:.0f}x)")
+    print(f"编码: {samples / encode_seconds / 1e6:.1f} 百万条/秒")
+    print(f"解码时间戳+CPU+GPU: {samples / decode_seconds / 1e6:.1f} 百万条/秒 ({decode_seconds * 1000:.0f}ms)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="温度数据列式归档")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    compact_parser = subparsers.add_parser("compact", help="把分段目录中较旧的分段转换为归档")
+    compact_parser.add_argument("directory")
+    compact_parser.add_argument("--older-than-days", type=float, default=7)
+
+    convert_parser = subparsers.add_parser("convert", help="把 data.json 转换为一个归档文件")
+    convert_parser.add_argument("data_file")
+    convert_parser.add_argument("archive_file")
+
+    bench_parser = subparsers.add_parser("bench", help="每条记录字节数和解码速度")
+    bench_parser.add_argument("--samples", type=int, default=1_000_000)
+
+    args = parser.parse_args()
+    if args.command == "compact":
+        compact(args.directory, args.older_than_days)
+    elif args.command == "convert":
+        convert_file(args.data_file, args.archive_file)
+    else:
+        benchmark(args.samples)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+# -*- coding: utf-8 -*-
+
+import io
+import os
+import sys
+import glob
+import json
+import time
+import hashlib
+import argparse
+import contextlib
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# 批量模式没有界面，必须在导入 pyplot 之前选择 Agg 后端（工作进程导入本模块时同样生效）
+import matplotlib
+matplotlib.use("Agg")
+
+from storage import SegmentedStorage
+from archive import ARCHIVE_SUFFIX, list_archives
+from column_cache import is_cache_dir
+
+DATA_SUFFIXES = (".json", ".jsonl", ARCHIVE_SUFFIX)
+MANIFEST_NAME = "batch_manifest.json"
+# 与数据文件扩展名相同、但不是数据集的文件：后台写入的溢出文件
+SIDECAR_SUFFIXES = (".spill.jsonl",)
+# 判断文件内容时读取的字节数（远大于一条记录）
+SNIFF_BYTES = 64 * 1024
+OUTPUT_FILES = ("temperature_chart.png", "temperature_stats.png", "summary.txt")
+
+
+def _is_rollup_dir(path):
+    return path.name == "rollups" or path.name.endswith(".rollups")
+
+
+def _is_sidecar_dir(path):
+    """聚合目录和列缓存目录不是数据集"""
+    return _is_rollup_dir(path) or is_cache_dir(path)
+
+
+def looks_like_data_file(path):
+    """只读文件开头判断是不是温度数据：JSON数组或JSON Lines，第一条记录有 timestamp 和 temperatures
+
+    排除配置文件、告警记录、批量报告清单和后台写入的溢出文件等同样以 .json/.jsonl 结尾的文件。
+    """
+    path = Path(path)
+    if path.suffix == ARCHIVE_SUFFIX:
+        return True
+    if path.suffix not in DATA_SUFFIXES or path.name == MANIFEST_NAME or path.name.endswith(SIDECAR_SUFFIXES):
+        return False
+    try:
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            head = f.read(SNIFF_BYTES).lstrip()
+    except OSError:
+        return False
+    if head.startswith("["):
+        head = head[1:].lstrip()
+        if head.startswith("]"):
+            # 空的 data.json
+            return True
+    try:
+        record, _ = json.JSONDecoder().raw_decode(head)
+    except ValueError:
+        return False
+    return isinstance(record, dict) and "timestamp" in record and "temperatures" in record
+
+
+def _scan_directory(directory, found):
+    """递归查找数据文件；分段目录整体作为一个数据集，聚合目录和列缓存目录跳过"""
+    if SegmentedStorage.list_segments(directory) or list_archives(directory):
+        found.add(directory)
+        return
+    for child in sorted(directory.iterdir()):
+        if child.is_dir():
+            if not _is_sidecar_dir(child):
+                _scan_directory(child, found)
+        elif looks_like_data_file(child):
+            found.add(child)
+
+
+def find_data_files(sources):
+    """展开目录和通配符，返回所有数据文件和分段目录（按路径排序，去重）"""
+    found = set()
+    for source in sources:
+        paths = [Path(p) for p in glob.glob(source, recursive=True)] or [Path(source)]
+        for path in paths:
+            if path.is_dir():
+                if not _is_sidecar_dir(path):
+                    _scan_directory(path, found)
+            elif path.is_file() and looks_like_data_file(path) and not _is_sidecar_dir(path.parent):
+                found.add(path)
+    return sorted(found)
+
+
+def content_hash(path, chunk_size=1 << 20):
+    """计算数据文件（或分段目录中所有归档和分段）的内容哈希"""
+    digest = hashlib.blake2b(digest_size=16)
+    path = Path(path)
+    if path.is_dir():
+        files = [file for _, _, file in list_archives(path) + SegmentedStorage.list_segments(path)]
+    else:
+        files = [path]
+    for file in files:
+        digest.update(file.name.encode("utf-8"))
+        with open(file, "rb") as f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    break
+                digest.update(chunk)
+    return digest.hexdigest()
+
+
+def output_name(path, root):
+    """不同主机的数据文件常常同名，用相对路径生成输出目录名，例如 host1/data.json -> host1__data"""
+    relative = Path(os.path.relpath(path, root)) if root else Path(path.name)
+    parts = list(relative.parent.parts) + [relative.stem if relative.suffix in DATA_SUFFIXES else relative.name]
+    return "__".join(part for part in parts if part not in ("", ".", ".."))
+
+
+def render_report(data_path, output_dir, previous_hash=None):
+    """在工作进程中为一个数据文件生成趋势图、统计图和摘要
+
+    内容哈希与上次相同且输出文件都存在时跳过。返回 (状态, 哈希, 耗时, 错误信息)，状态为 rendered/skipped/failed。
+    """
+    started = time.perf_counter()
+    output_dir = Path(output_dir)
+    try:
+        digest = content_hash(data_path)
+        if digest == previous_hash and all((output_dir / name).exists() for name in OUTPUT_FILES):
+            return "skipped", digest, time.perf_counter() - started, None
+
+        from chart_generator import TemperatureChartGenerator
+
+        output_dir.mkdir(parents=True, exist_ok=True)
+        log = io.StringIO()
+        with contextlib.redirect_stdout(log):
+            generator = TemperatureChartGenerator(str(data_path))
+            generator.create_temperature_chart(str(output_dir / OUTPUT_FILES[0]), show_chart=False)
+            generator.create_statistics_chart(str(output_dir / OUTPUT_FILES[1]), show_chart=False)
+
+        summary = io.StringIO()
+        with contextlib.redirect_stdout(summary):
+            generator.print_summary(use_rollups=False)
+        (output_dir / OUTPUT_FILES[2]).write_text(summary.getvalue().lstrip("\n"), encoding="utf-8")
+
+        missing = [name for name in OUTPUT_FILES if not (output_dir / name).exists()]
+        if missing:
+            # 没有有效数据时图表不会生成，错误信息在生成器的输出中
+            return "failed", digest, time.perf_counter() - started, log.getvalue().strip() or f"缺少 {missing}"
+        return "rendered", digest, time.perf_counter() - started, None
+    except Exception as e:
+        return "failed", None, time.perf_counter() - started, f"{type(e).__name__}: {e}"
+
+
+def load_manifest(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(path, manifest):
+    """先写临时文件再替换，中断时不会留下损坏的清单"""
+    temp_path = Path(str(path) + ".tmp")
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(temp_path, path)
+
+
+def run_batch(sources, output_root, workers=None, force=False):
+    """用进程池并行生成所有数据文件的报告，返回 {状态: 数量} 和吞吐量"""
+    output_root = Path(output_root)
+    output_root.mkdir(parents=True, exist_ok=True)
+    manifest_path = output_root / MANIFEST_NAME
+    manifest = {} if force else load_manifest(manifest_path)
+
+    files = find_data_files(sources)
+    if not files:
+        print("没有找到数据文件")
+        return {}, 0.0
+    root = os.path.commonpath([str(path.parent) for path in files]) if len(files) > 1 else None
+    print(f"找到 {len(files)} 个数据文件，使用 {workers or os.cpu_count()} 个进程")
+
+    counts = {"rendered": 0, "skipped": 0, "failed": 0}
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {}
+        for path in files:
+            key = str(path.resolve())
+            previous = manifest.get(key, {}).get("hash")
+            output_dir = output_root / output_name(path, root)
+            futures[executor.submit(render_report, path, output_dir, previous)] = (key, path, output_dir)
+
+        for future in as_completed(futures):
+            key, path, output_dir = futures[future]
+            status, digest, seconds, error = future.result()
+            counts[status] += 1
+            if status == "failed":
+                print(f"[失败] {path}: {error}")
+                manifest.pop(key, None)
+            else:
+                if status == "rendered":
+                    print(f"[完成] {path} -> {output_dir} ({seconds:.2f}s)")
+                manifest[key] = {"hash": digest, "output": str(output_dir)}
+
+    elapsed = time.perf_counter() - started
+    save_manifest(manifest_path, manifest)
+    throughput = len(files) / elapsed if elapsed > 0 else 0.0
+    print(f"\n生成 {counts['rendered']} 个，跳过 {counts['skipped']} 个（内容未变化），失败 {counts['failed']} 个")
+    print(f"总耗时 {elapsed:.2f}s，吞吐量 {throughput:.2f} 文件/秒")
+    return counts, throughput
+
+
+def main():
+    parser = argparse.ArgumentParser(description="批量生成多台机器数据文件的温度报告")
+    parser.add_argument("sources", nargs="+", help="数据文件、目录或通配符（例如 'collected/*/data.json'）")
+    parser.add_argument("-o", "--output", default="reports", help="报告输出目录（默认 reports）")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="进程数（默认为CPU核心数）")
+    parser.add_argument("--force", action="store_true", help="忽略内容哈希，重新生成所有报告")
+    args = parser.parse_args()
+
+    counts, _ = run_batch(args.sources, args.output, args.workers, args.force)
+    sys.exit(1 if counts.get("failed") else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,690 @@
+# -*- coding: utf-8 -*-
+
+import io
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import platform
+import datetime
+import tempfile
+import threading
+import contextlib
+import subprocess
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+
+# 基准测试没有界面，必须在导入 pyplot 之前选择 Agg 后端（子进程导入本模块时同样生效）
+import matplotlib
+matplotlib.use("Agg")
+
+import numpy as np
+
+from storage import JsonArrayStorage, SegmentedStorage, encode_record
+from writer import BackgroundWriter
+
+START = datetime.datetime(2020, 1, 1)
+# 与 json.dump(indent=2) 写出的 data.json 中一条记录的格式完全相同
+JSON_RECORD = '  {\n    "timestamp": "%s",\n    "temperatures": {\n      "cpu": %s,\n      "gpu": %s\n    }\n  }'
+LINE_RECORD = '{"timestamp":"%s","temperatures":{"cpu":%s,"gpu":%s}}\n'
+HISTORY_FORMATS = ("json", "jsonl", "segments")
+SEGMENT_RECORDS = 1_000_000
+CHUNK = 100_000
+# compare 时这些后缀的指标越小越好
+LOWER_IS_BETTER = ("seconds", "_ms", "_mb", "bytes", "bytes_per_record", "missed", "late", "failures", "dropped")
+
+
+def log(message):
+    # 进度信息输出到 stderr，stdout 只输出JSON结果
+    print(message, file=sys.stderr)
+
+
+def parse_count(text):
+    """支持 1e6、1_000_000 这样的写法"""
+    return int(float(text.replace("_", "")))
+
+
+def peak_rss_mb():
+    """进程的峰值常驻内存（MB）；没有 resource 模块的平台（Windows）返回 None"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 上单位是KB，macOS 上是字节
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def distribution(values):
+    values = np.asarray(values, dtype=np.float64)
+    if values.size == 0:
+        return None
+    return {
+        "mean": round(float(values.mean()), 4),
+        "std": round(float(values.std()), 4),
+        "p50": round(float(np.percentile(values, 50)), 4),
+        "p99": round(float(np.percentile(values, 99)), 4),
+        "max": round(float(values.max()), 4),
+    }
+
+
+# ---------------------------------------------------------------- 模拟数据
+
+def synthetic_chunks(samples, interval=1.0, seed=0, start=START):
+    """按块生成模拟历史：(ISO时间列表, CPU温度列表, GPU温度列表)，GPU约1%缺失（None）
+
+    温度是有界随机游走加噪声，每块最多 CHUNK 条，内存占用与总条数无关。
+    """
+    rng = np.random.default_rng(seed)
+    base = np.datetime64(start, 'us')
+    step = np.timedelta64(int(interval * 1_000_000), 'us')
+    cpu_level = 0.0
+    gpu_level = 0.0
+    for offset in range(0, samples, CHUNK):
+        count = min(CHUNK, samples - offset)
+        timestamps = base + (np.arange(offset, offset + count) * step)
+        cpu_walk = cpu_level + np.cumsum(rng.normal(0, 0.05, count))
+        gpu_walk = gpu_level + np.cumsum(rng.normal(0, 0.05, count))
+        cpu_level = float(np.clip(cpu_walk[-1], -15, 30))
+        gpu_level = float(np.clip(gpu_walk[-1], -15, 30))
+        cpu = np.round(45 + cpu_walk.clip(-15, 30) + rng.normal(0, 0.3, count), 2)
+        gpu = np.round(50 + gpu_walk.clip(-15, 30), 1).tolist()
+        for i in np.flatnonzero(rng.random(count) < 0.01):
+            gpu[i] = None
+        yield np.datetime_as_string(timestamps, unit='us').tolist(), cpu.tolist(), gpu
+
+
+def synthetic_records(samples, interval=1.0, seed=0):
+    """逐条生成与采样程序相同结构的模拟记录"""
+    for timestamps, cpu, gpu in synthetic_chunks(samples, interval, seed):
+        for t, c, g in zip(timestamps, cpu, gpu):
+            temperatures = {"cpu": c} if g is None else {"cpu": c, "gpu": g}
+            yield {"timestamp": t, "temperatures": temperatures, "sensors": {}, "sampled_at": {}}
+
+
+def _format_chunk(template, timestamps, cpu, gpu):
+    return [template % (t, repr(c), "null" if g is None else repr(g)) for t, c, g in zip(timestamps, cpu, gpu)]
+
+
+def generate_history(path, samples, fmt="json", interval=1.0, seed=0):
+    """生成 samples 条（10³~10⁸）模拟历史，返回写入的字节数
+
+    - json      data.json 旧格式（indent=2 的JSON数组）
+    - jsonl     JSON Lines 文件
+    - segments  分段目录，每个分段 SEGMENT_RECORDS 条
+    """
+    if fmt not in HISTORY_FORMATS:
+        raise ValueError(f"未知的数据格式: {fmt} (可选: {', '.join(HISTORY_FORMATS)})")
+    path = Path(path)
+    chunks = synthetic_chunks(samples, interval, seed)
+
+    if fmt == "segments":
+        path.mkdir(parents=True, exist_ok=True)
+        created = int(START.timestamp())
+        written = 0
+        f = None
+        for index, (timestamps, cpu, gpu) in enumerate(chunks):
+            if index * CHUNK % SEGMENT_RECORDS == 0:
+                if f:
+                    f.close()
+                seq = index * CHUNK // SEGMENT_RECORDS + 1
+                f = open(path / f"segment-{seq:08d}-{created + seq}.jsonl", 'wb')
+            written += f.write("".join(_format_chunk(LINE_RECORD, timestamps, cpu, gpu)).encode('utf-8'))
+        if f:
+            f.close()
+        return written
+
+    with open(path, 'wb') as f:
+        if fmt == "jsonl":
+            for timestamps, cpu, gpu in chunks:
+                f.write("".join(_format_chunk(LINE_RECORD, timestamps, cpu, gpu)).encode('utf-8'))
+        else:
+            f.write(b'[\n' if samples else b'[')
+            separator = ""
+            for timestamps, cpu, gpu in chunks:
+                f.write((separator + ",\n".join(_format_chunk(JSON_RECORD, timestamps, cpu, gpu))).encode('utf-8'))
+                separator = ",\n"
+            f.write(b'\n]' if samples else b']')
+        return f.tell()
+
+
+# ---------------------------------------------------------------- 模拟探测
+
+class FakeProbe:
+    """模拟的温度探测方法：固定延迟加均匀抖动，按概率失败
+
+    failure_rate 的概率返回 None（没有数据），error_rate 的概率抛出异常，其余返回随机游走的温度。
+    """
+
+    def __init__(self, base=45.0, latency=0.0, jitter=0.0, failure_rate=0.0, error_rate=0.0, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.error_rate = error_rate
+        self.value = base
+        self._rng = random.Random(seed)
+
+    def __call__(self):
+        delay = self.latency + self._rng.uniform(0, self.jitter)
+        if delay > 0:
+            time.sleep(delay)
+        r = self._rng.random()
+        if r < self.error_rate:
+            raise RuntimeError("模拟探测失败")
+        if r < self.error_rate + self.failure_rate:
+            return None
+        self.value = min(max(self.value + self._rng.gauss(0, 0.2), 20.0), 100.0)
+        return round(self.value, 2)
+
+
+class ScriptedProbe:
+    """按时间变化的模拟温度：空闲（基本不变）-> 负载（快速升温）-> 空闲，用于测量自适应采样"""
+
+    def __init__(self, phases, noise=0.05, seed=None):
+        self.phases = phases  # [(持续秒数, 开始温度, 结束温度)]
+        self.noise = noise
+        self.calls = 0
+        self._rng = random.Random(seed)
+        self._start = None
+
+    def phase(self, elapsed):
+        for i, (duration, _, _) in enumerate(self.phases):
+            if elapsed < duration:
+                return i, elapsed / duration
+            elapsed -= duration
+        return len(self.phases) - 1, 1.0
+
+    def __call__(self):
+        now = time.monotonic()
+        if self._start is None:
+            self._start = now
+        self.calls += 1
+        index, progress = self.phase(now - self._start)
+        _, begin, end = self.phases[index]
+        return round(begin + (end - begin) * progress + self._rng.gauss(0, self.noise), 2)
+
+
+def _fake_monitor_class():
+    from main import TemperatureMonitor
+
+    class FakeProbeMonitor(TemperatureMonitor):
+        """用模拟探测方法代替 WMI/nvidia-smi/sysfs 的温度监控，不需要GPU或Windows"""
+
+        def __init__(self, config_file, cpu_probe, gpu_probes):
+            self.cpu_probe = cpu_probe
+            self.gpu_probes = gpu_probes
+            super().__init__(config_file)
+
+        def get_cpu_temperature(self):
+            return self.cpu_probe()
+
+        def get_gpu_methods(self):
+            return list(self.gpu_probes)
+
+    return FakeProbeMonitor
+
+
+def bench_sampling(interval=0.05, ticks=200, backend="segments", latency=0.002, jitter=0.002,
+                   failure_rate=0.0, error_rate=0.0, seed=0):
+    """用模拟探测运行 TemperatureMonitor.run，测量采样时间的抖动、调度延迟和探测结果"""
+    FakeProbeMonitor = _fake_monitor_class()
+    with tempfile.TemporaryDirectory() as tmp:
+        config = {
+            "interval_seconds": interval,
+            "data_file": str(Path(tmp) / "data.json"),
+            "sensor_backend": "windows",
+            "storage": {"backend": backend, "segment_dir": str(Path(tmp) / "segments"), "fsync": "never"},
+            "logging": {"file": os.devnull},
+        }
+        config_file = Path(tmp) / "config.json"
+        config_file.write_text(json.dumps(config), encoding="utf-8")
+
+        probe = dict(latency=latency, jitter=jitter, failure_rate=failure_rate, error_rate=error_rate)
+        with contextlib.redirect_stdout(io.StringIO()):
+            monitor = FakeProbeMonitor(config_file, FakeProbe(45.0, seed=seed, **probe),
+                                       [("FAKE-GPU", FakeProbe(50.0, seed=seed + 1, **probe))])
+            started = time.perf_counter()
+            monitor.run(max_ticks=ticks)
+            elapsed = time.perf_counter() - started
+            records = list(monitor.storage.iter_records())
+
+        timestamps = np.array([record["timestamp"] for record in records], dtype='datetime64[us]')
+        periods = np.diff(timestamps).astype(np.int64) / 1000.0
+        metrics = monitor.metrics.snapshot()
+        probes = {}
+        for entry in metrics.get("probe_total", []):
+            labels = entry["labels"]
+            probes[f'{labels["component"]}.{labels["method"]}.{labels["result"]}'] = entry["value"]
+        return {
+            "interval_seconds": interval,
+            "ticks": ticks,
+            "records": len(records),
+            "elapsed_seconds": round(elapsed, 3),
+            # 相邻两条记录的时间间隔与设定间隔之差（毫秒）
+            "period_error_ms": distribution(np.abs(periods - interval * 1000)),
+            "scheduler": monitor.scheduler.stats(),
+            "writer": monitor.writer.stats(),
+            "probes": probes,
+        }
+
+
+def bench_adaptive(min_interval=0.02, max_interval=0.64, phase_seconds=2.0, seed=0):
+    """同一段 空闲-负载-空闲 的温度变化，分别用固定间隔和自适应采样（加死区压缩）运行，比较探测次数和保存的记录数"""
+    FakeProbeMonitor = _fake_monitor_class()
+    phases = [(phase_seconds, 45.0, 45.0), (phase_seconds, 45.0, 85.0), (phase_seconds, 60.0, 60.0)]
+    results = {}
+    for mode in ("fixed", "adaptive"):
+        with tempfile.TemporaryDirectory() as tmp:
+            config = {
+                "interval_seconds": min_interval,
+                "monitor_components": {"cpu": True, "gpu": False},
+                "data_file": str(Path(tmp) / "data.json"),
+                "sensor_backend": "windows",
+                "storage": {"backend": "segments", "segment_dir": str(Path(tmp) / "segments"), "fsync": "never"},
+                "logging": {"file": os.devnull},
+            }
+            if mode == "adaptive":
+                config["adaptive_sampling"] = {"enabled": True, "min_interval_seconds": min_interval,
+                                               "max_interval_seconds": max_interval, "change_threshold": 0.5,
+                                               "hot_threshold": 80}
+                config["deadband"] = {"enabled": True, "delta_celsius": 0.5, "max_seconds": max_interval * 4}
+            config_file = Path(tmp) / "config.json"
+            config_file.write_text(json.dumps(config), encoding="utf-8")
+
+            probe = ScriptedProbe(phases, seed=seed)
+            with contextlib.redirect_stdout(io.StringIO()):
+                monitor = FakeProbeMonitor(config_file, probe, [])
+                timer = threading.Timer(phase_seconds * len(phases), monitor.stop)
+                timer.start()
+                started = time.perf_counter()
+                cpu_started = time.process_time()
+                monitor.run()
+                cpu_seconds = time.process_time() - cpu_started
+                elapsed = time.perf_counter() - started
+                records = list(monitor.storage.iter_records())
+
+            # 每个阶段保存的记录数
+            first = np.datetime64(records[0]["timestamp"], 'ms') if records else None
+            per_phase = [0] * len(phases)
+            for record in records:
+                offset = (np.datetime64(record["timestamp"], 'ms') - first).astype(np.int64) / 1000.0
+                per_phase[probe.phase(offset)[0]] += 1
+            results[mode] = {
+                "elapsed_seconds": round(elapsed, 3),
+                "probe_calls": probe.calls,
+                "records": len(records),
+                "records_per_phase": dict(zip(("idle", "load", "cooldown"), per_phase)),
+                "cpu_seconds": round(cpu_seconds, 3),
+            }
+    return results
+
+
+# ---------------------------------------------------------------- 写入吞吐量
+
+def bench_save(samples=10_000, backends=("json", "segments"), json_limit=1_000):
+    """每种存储后端逐条 append（旧的写入方式）和经过后台写入线程批量写入的吞吐量"""
+    records = list(synthetic_records(samples))
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for backend in backends:
+            result = {}
+            # json 后端每次写入都重写整个文件（O(n²)），只测前 json_limit 条
+            count = min(samples, json_limit) if backend == "json" else samples
+            for mode in ("append", "writer"):
+                location = Path(tmp) / f"{backend}-{mode}"
+                if backend == "json":
+                    storage = JsonArrayStorage(location.with_suffix(".json"))
+                else:
+                    storage = SegmentedStorage(location, fsync="interval")
+                subset = records[:count]
+                started = time.perf_counter()
+                if mode == "append":
+                    for record in subset:
+                        storage.append(record)
+                else:
+                    writer = BackgroundWriter(storage, queue_size=len(subset) + 1)
+                    writer.start()
+                    for record in subset:
+                        writer.put(record)
+                    writer.close()
+                storage.close()
+                elapsed = time.perf_counter() - started
+                result[mode] = {
+                    "records": len(subset),
+                    "seconds": round(elapsed, 4),
+                    "records_per_second": round(len(subset) / elapsed, 1) if elapsed > 0 else None,
+                }
+            result["bytes_per_record"] = round(sum(len(encode_record(r)) for r in records[:1000]) / min(samples, 1000), 1)
+            results[backend] = result
+    return results
+
+
+# ---------------------------------------------------------------- 告警
+
+def bench_alerts(sensors=500, ticks=1_000, seed=0):
+    """每次采样用阈值、变化率和两种 z-score 规则检查 sensors 个传感器的耗时"""
+    from alerts import AlertEngine, ThresholdRule, RateOfChangeRule, ZScoreRule
+
+    rng = np.random.default_rng(seed)
+    values = 45 + np.cumsum(rng.normal(0, 0.1, (ticks, sensors)), axis=0)
+    ids = [f"cpu.bench.core_{i}" for i in range(sensors)]
+    start = np.datetime64(START, 's')
+    records = [{"timestamp": str(start + np.timedelta64(i, 's')), "temperatures": {},
+                "sensors": dict(zip(ids, row.tolist()))} for i, row in enumerate(values)]
+
+    engine = AlertEngine([ThresholdRule(source="sensors", high=90), RateOfChangeRule(source="sensors"),
+                          ZScoreRule(source="sensors"),
+                          ZScoreRule(name="zscore_rolling", source="sensors", mode="rolling")], [])
+    durations = []
+    for record in records:
+        started = time.perf_counter()
+        engine.process(record)
+        durations.append((time.perf_counter() - started) * 1000)
+    return {"sensors": sensors, "rules": len(engine.rules), "ticks": ticks, "events": engine.events,
+            "tick_ms": distribution(durations)}
+
+
+# ---------------------------------------------------------------- 图表生成
+
+def _phase(results, name, func):
+    started = time.perf_counter()
+    value = func()
+    results[name + "_seconds"] = round(time.perf_counter() - started, 4)
+    results[name + "_peak_rss_mb"] = peak_rss_mb()
+    return value
+
+
+def chart_worker(data_path, output_dir):
+    """在单独的进程中测量 TemperatureChartGenerator 各阶段的耗时和峰值内存"""
+    from chart_generator import TemperatureChartGenerator
+    from data_loader import load_arrays
+    from column_cache import cache_dir_for
+
+    results = {"baseline_peak_rss_mb": peak_rss_mb()}
+    with contextlib.redirect_stdout(io.StringIO()):
+        path = Path(data_path)
+        if path.is_file():
+            # 只读取文件，作为解析耗时的参照
+            _phase(results, "read", lambda: len(path.read_bytes()))
+        # 从没有列缓存开始：parse 包含第一次生成缓存，reopen 为之后再次打开的耗时
+        shutil.rmtree(cache_dir_for(data_path), ignore_errors=True)
+        generator = TemperatureChartGenerator(str(data_path))
+        data = _phase(results, "parse", lambda: generator.data)
+        _phase(results, "reopen", lambda: len(TemperatureChartGenerator(str(data_path)).data))
+        _phase(results, "stats", generator.statistics)
+        _phase(results, "render_trend", lambda: generator.create_temperature_chart(
+            str(Path(output_dir) / "temperature_chart.png"), show_chart=False, use_rollups=False))
+        _phase(results, "render_stats", lambda: generator.create_statistics_chart(
+            str(Path(output_dir) / "temperature_stats.png"), show_chart=False))
+        _phase(results, "summary", lambda: generator.print_summary(use_rollups=False))
+        _phase(results, "range_query", lambda: len(load_arrays(data_path, data.timestamps[len(data) // 2].item(),
+                                                                data.timestamps[len(data) // 2].item()
+                                                                + datetime.timedelta(hours=1))))
+    results["records"] = len(data)
+    return results
+
+
+def bench_chart(sizes=(1_000, 10_000, 100_000), fmt="json", keep_dir=None):
+    """为每个规模生成模拟历史，在子进程中测量加载、解析、统计和绘图"""
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(keep_dir) if keep_dir else Path(tmp)
+        root.mkdir(parents=True, exist_ok=True)
+        for samples in sizes:
+            data_path = root / (f"history-{samples}" + ("" if fmt == "segments" else f".{fmt}"))
+            started = time.perf_counter()
+            if not data_path.exists():
+                log(f"生成 {samples} 条模拟记录: {data_path}")
+                generate_history(data_path, samples, fmt)
+            generate_seconds = time.perf_counter() - started
+
+            output_dir = Path(tmp) / f"charts-{samples}"
+            output_dir.mkdir()
+            log(f"测量图表生成: {samples} 条")
+            # 每个规模一个新进程，峰值内存不受之前规模的影响
+            with ProcessPoolExecutor(max_workers=1) as executor:
+                result = executor.submit(chart_worker, str(data_path), str(output_dir)).result()
+            result["generate_seconds"] = round(generate_seconds, 3)
+            if data_path.is_file():
+                result["file_bytes"] = data_path.stat().st_size
+            results[str(samples)] = result
+    return results
+
+
+# ---------------------------------------------------------------- 启动时间
+
+# 只打印摘要时不应该加载的模块
+HEAVY_MODULES = ("matplotlib", "matplotlib.pyplot")
+_SUMMARY_PROBE = """
+import sys, json, contextlib, io
+import chart_generator
+with contextlib.redirect_stdout(io.StringIO()):
+    chart_generator.main(["summary", sys.argv[1], "--json"])
+print(json.dumps([name for name in {heavy!r} if name in sys.modules]))
+"""
+
+
+def _run_seconds(command, repeats):
+    """运行命令 repeats 次，返回最短耗时（受其他进程干扰最小）"""
+    cwd = Path(__file__).parent
+    best = None
+    for _ in range(repeats):
+        started = time.perf_counter()
+        subprocess.run(command, cwd=cwd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return round(best, 4)
+
+
+def bench_startup(samples=1_000, repeats=5):
+    """chart_generator 的导入时间和 summary 子命令的总耗时（新进程），并检查摘要是否加载了绘图库"""
+    with tempfile.TemporaryDirectory() as tmp:
+        data_path = Path(tmp) / "history.json"
+        generate_history(data_path, samples)
+        python = sys.executable
+        interpreter = _run_seconds([python, "-c", "pass"], repeats)
+        import_seconds = _run_seconds([python, "-c", "import chart_generator"], repeats)
+        summary_seconds = _run_seconds([python, "chart_generator.py", "summary", str(data_path), "--json"], repeats)
+        probe = subprocess.run([python, "-c", _SUMMARY_PROBE.format(heavy=HEAVY_MODULES), str(data_path)],
+                               cwd=Path(__file__).parent, capture_output=True, text=True, check=True)
+        heavy = json.loads(probe.stdout.strip().splitlines()[-1])
+    return {
+        "samples": samples,
+        "interpreter_seconds": interpreter,
+        # 减去启动解释器本身的时间
+        "import_seconds": round(max(import_seconds - interpreter, 0.0), 4),
+        "summary_seconds": round(max(summary_seconds - interpreter, 0.0), 4),
+        "heavy_modules_loaded": heavy,
+    }
+
+
+# ---------------------------------------------------------------- 结果
+
+def environment():
+    """结果中附带的运行环境，便于比较不同提交"""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=Path(__file__).parent, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        "commit": commit,
+        "time": datetime.datetime.now().isoformat(timespec='seconds'),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "matplotlib": matplotlib.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def _flatten(value, prefix=""):
+    if isinstance(value, dict):
+        items = {}
+        for key, child in value.items():
+            items.update(_flatten(child, f"{prefix}.{key}" if prefix else str(key)))
+        return items
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return {prefix: value}
+    return {}
+
+
+def _lower_is_better(key):
+    """True: 越小越好（耗时、内存、字节数、错过次数），False: 越大越好（吞吐量），None: 不比较"""
+    parts = key.split(".")
+    if parts[-1].endswith("per_second"):
+        return False
+    if any(part.endswith(LOWER_IS_BETTER) for part in parts[-2:]):
+        return True
+    return None
+
+
+def compare(baseline, current, threshold=0.2):
+    """比较两次结果中所有数值指标，返回变差超过 threshold 的指标 [(名称, 基准, 当前, 变化比例)]"""
+    old = _flatten(baseline.get("results", baseline))
+    new = _flatten(current.get("results", current))
+    regressions = []
+    for key in sorted(old.keys() & new.keys()):
+        direction = _lower_is_better(key)
+        if direction is None or not old[key]:
+            continue
+        change = (new[key] - old[key]) / abs(old[key])
+        worse = change > threshold if direction else change < -threshold
+        print(f"{'!!' if worse else '  '} {key}: {old[key]} -> {new[key]} ({change:+.1%})")
+        if worse:
+            regressions.append((key, old[key], new[key], change))
+    return regressions
+
+
+def write_results(results, output):
+    text = json.dumps({"environment": environment(), "results": results}, ensure_ascii=False, indent=2)
+    if output:
+        Path(output).write_text(text + "\n", encoding="utf-8")
+        log(f"结果已保存到 {output}")
+    print(text)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="温度监控性能基准测试（使用模拟探测和模拟数据，不需要GPU或Windows）")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    generate_parser = subparsers.add_parser("generate", help="生成模拟历史数据")
+    generate_parser.add_argument("path")
+    generate_parser.add_argument("--samples", type=parse_count, default=1_000_000, help="记录数，例如 1e6（10³~10⁸）")
+    generate_parser.add_argument("--format", choices=HISTORY_FORMATS, default="json")
+    generate_parser.add_argument("--interval", type=float, default=1.0, help="记录间隔（秒）")
+    generate_parser.add_argument("--seed", type=int, default=0)
+
+    sampling_parser = subparsers.add_parser("sampling", help="用模拟探测运行采样循环，测量抖动")
+    sampling_parser.add_argument("--interval", type=float, default=0.05)
+    sampling_parser.add_argument("--ticks", type=int, default=200)
+    sampling_parser.add_argument("--backend", choices=("json", "segments"), default="segments")
+    sampling_parser.add_argument("--latency", type=float, default=0.002, help="模拟探测的延迟（秒）")
+    sampling_parser.add_argument("--jitter", type=float, default=0.002, help="模拟探测延迟的随机抖动（秒）")
+    sampling_parser.add_argument("--failure-rate", type=float, default=0.0, help="返回无数据的概率")
+    sampling_parser.add_argument("--error-rate", type=float, default=0.0, help="抛出异常的概率")
+
+    adaptive_parser = subparsers.add_parser("adaptive", help="固定间隔与自适应采样（加死区压缩）的探测次数和记录数")
+    adaptive_parser.add_argument("--min-interval", type=float, default=0.02)
+    adaptive_parser.add_argument("--max-interval", type=float, default=0.64)
+    adaptive_parser.add_argument("--phase-seconds", type=float, default=2.0, help="空闲/负载/空闲每个阶段的秒数")
+
+    save_parser = subparsers.add_parser("save", help="存储后端的写入吞吐量")
+    save_parser.add_argument("--samples", type=parse_count, default=10_000)
+
+    alerts_parser = subparsers.add_parser("alerts", help="每次采样检查告警规则的耗时")
+    alerts_parser.add_argument("--sensors", type=int, default=500)
+    alerts_parser.add_argument("--ticks", type=int, default=1_000)
+
+    ingest_parser = subparsers.add_parser("ingest", help="汇总端接收多个采集端数据的吞吐量")
+    ingest_parser.add_argument("--agents", type=int, default=200)
+    ingest_parser.add_argument("--samples", type=parse_count, default=500, help="每个采集端发送的记录数")
+    ingest_parser.add_argument("--batch-size", type=int, default=50)
+
+    chart_parser = subparsers.add_parser("chart", help="图表生成的加载/解析/绘图耗时和峰值内存")
+    chart_parser.add_argument("--sizes", type=parse_count, nargs="+", default=[1_000, 10_000, 100_000])
+    chart_parser.add_argument("--format", choices=HISTORY_FORMATS, default="json")
+    chart_parser.add_argument("--data-dir", help="保留生成的模拟数据，下次直接使用（大规模数据生成较慢）")
+
+    all_parser = subparsers.add_parser("all", help="运行全部基准测试（默认规模）")
+    all_parser.add_argument("--sizes", type=parse_count, nargs="+", default=[1_000, 10_000, 100_000])
+
+    startup_parser = subparsers.add_parser("startup", help="chart_generator 的导入时间和 summary 子命令的耗时")
+    startup_parser.add_argument("--repeats", type=int, default=5)
+    startup_parser.add_argument("--check", action="store_true",
+                                help="summary 加载了绘图库或导入超过 --max-import-seconds 时退出码为1")
+    startup_parser.add_argument("--max-import-seconds", type=float, default=0.3)
+
+    compare_parser = subparsers.add_parser("compare", help="比较两次基准测试的结果")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=0.2, help="变差超过该比例时视为退化（默认0.2）")
+
+    for sub in (sampling_parser, adaptive_parser, save_parser, alerts_parser, ingest_parser, chart_parser, startup_parser,
+                all_parser):
+        sub.add_argument("-o", "--output", help="同时把JSON结果写入文件")
+
+    args = parser.parse_args()
+    if args.command == "generate":
+        started = time.perf_counter()
+        size = generate_history(args.path, args.samples, args.format, args.interval, args.seed)
+        elapsed = time.perf_counter() - started
+        print(f"已生成 {args.samples} 条记录 ({size / 1024 / 1024:.1f} MB)，耗时 {elapsed:.1f}s")
+    elif args.command == "sampling":
+        write_results({"sampling": bench_sampling(args.interval, args.ticks, args.backend, args.latency,
+                                                  args.jitter, args.failure_rate, args.error_rate)}, args.output)
+    elif args.command == "adaptive":
+        write_results({"adaptive": bench_adaptive(args.min_interval, args.max_interval, args.phase_seconds)},
+                      args.output)
+    elif args.command == "save":
+        write_results({"save": bench_save(args.samples)}, args.output)
+    elif args.command == "alerts":
+        write_results({"alerts": bench_alerts(args.sensors, args.ticks)}, args.output)
+    elif args.command == "ingest":
+        from aggregator import bench_ingest
+        write_results({"ingest": bench_ingest(args.agents, args.samples, args.batch_size)}, args.output)
+    elif args.command == "chart":
+        write_results({"chart": bench_chart(args.sizes, args.format, args.data_dir)}, args.output)
+    elif args.command == "startup":
+        result = bench_startup(repeats=args.repeats)
+        write_results({"startup": result}, args.output)
+        if args.check:
+            failures = []
+            if result["heavy_modules_loaded"]:
+                failures.append(f"summary 加载了 {', '.join(result['heavy_modules_loaded'])}")
+            if result["import_seconds"] > args.max_import_seconds:
+                failures.append(f"导入耗时 {result['import_seconds']}s 超过 {args.max_import_seconds}s")
+            for failure in failures:
+                log(failure)
+            sys.exit(1 if failures else 0)
+    elif args.command == "all":
+        log("测量采样抖动")
+        results = {"sampling": bench_sampling()}
+        log("测量自适应采样")
+        results["adaptive"] = bench_adaptive()
+        log("测量写入吞吐量")
+        results["save"] = bench_save()
+        log("测量告警检查耗时")
+        results["alerts"] = bench_alerts()
+        log("测量汇总端吞吐量")
+        from aggregator import bench_ingest
+        results["ingest"] = bench_ingest()
+        results["chart"] = bench_chart(args.sizes)
+        log("测量启动时间")
+        results["startup"] = bench_startup()
+        write_results(results, args.output)
+    elif args.command == "compare":
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        with open(args.current, "r", encoding="utf-8") as f:
+            current = json.load(f)
+        regressions = compare(baseline, current, args.threshold)
+        print(f"\n{len(regressions)} 项指标变差超过 {args.threshold:.0%}")
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
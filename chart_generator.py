@@ -1,13 +1,23 @@
 #!python
 # -*- coding: utf-8 -*-
-import os  
 import json
-import matplotlib.pyplot as plt
-import matplotlib.dates as mdates
+import argparse
+import contextlib
 from datetime import datetime
-import numpy as np
 from pathlib import Path
 import sys
+import time
+
+# 只导入不依赖 NumPy 的模块：由聚合数据回答的摘要和 --help 不需要加载 NumPy，
+# 读取原始数据（data_loader、column_cache）、降采样和统计在第一次使用时才导入
+from storage import default_data_path
+from rollups import (RECORDS_KEY, rollup_dir_for, rollup_extent, collect_buckets, series_buckets,
+                     summarize, to_epoch, from_epoch)
+
+# 降采样后数据点不超过该数量时才绘制数据点标记
+MARKER_LIMIT = 200
+EXPORT_FORMATS = ("csv", "json")
+EXPORT_CHUNK = 65536
 
 # 只在直接从命令行运行时应用编码设置
 if sys.platform == "win32":
@@ -15,81 +25,199 @@ if sys.platform == "win32":
     sys.stdout = codecs.getwriter("utf-8")(sys.stdout.detach())
     sys.stderr = codecs.getwriter("utf-8")(sys.stderr.detach())
 
+def _pyplot(headless=False):
+    """第一次绘图时才导入 matplotlib（约0.5秒），只打印摘要或导出数据时不加载"""
+    import matplotlib
+    if headless and "matplotlib.pyplot" not in sys.modules:
+        # 不显示窗口时使用非交互后端，没有图形界面的机器上也能运行
+        matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    # 设置中文字体支持
+    plt.rcParams['font.sans-serif'] = ['SimHei', 'Microsoft YaHei', 'Arial']
+    plt.rcParams['axes.unicode_minus'] = False
+    return plt
+
 class TemperatureChartGenerator:
-    def __init__(self, data_file="data.json"):
+    def __init__(self, data_file="data.json", start=None, end=None, use_cache=True):
         self.data_file = data_file
-        self.data = self.load_data()
-        
-        # 设置中文字体支持
-        plt.rcParams['font.sans-serif'] = ['SimHei', 'Microsoft YaHei', 'Arial']
-        plt.rcParams['axes.unicode_minus'] = False
+        # 可选的时间范围（datetime或ISO字符串），在读取时即过滤
+        self.start = start
+        self.end = end
+        # 原始数据在第一次使用时才加载，能由聚合文件回答的查询不需要扫描原始数据
+        self._data = None
+        self._data_version = None
+        # 解析结果保存在数据文件旁的列缓存中（见 column_cache），再次打开时只解析新增的记录
+        self.use_cache = use_cache
+        self.rollup_dir = rollup_dir_for(data_file)
+    
+    @property
+    def data(self):
+        from data_loader import dataset_version
+        # 数据文件变化后重新加载
+        version = dataset_version(self.data_file)
+        if self._data is None or version != self._data_version:
+            self._data = self.load_data()
+            self._data_version = version
+        return self._data
+    
+    def statistics(self):
+        """返回当前数据集的统计结果，按数据集版本缓存，趋势图、统计图和摘要共用同一份结果"""
+        from stats_engine import default_cache, dataset_stats
+        data = self.data
+        key = (str(Path(self.data_file).resolve()), self._data_version, str(self.start), str(self.end))
+        return default_cache.get(key, lambda: dataset_stats(data))
     
     def load_data(self):
-        """加载温度数据"""
+        """加载温度数据（流式解析为NumPy数组）"""
+        from data_loader import TemperatureArrays
         try:
             if not Path(self.data_file).exists():
                 print(f"数据文件 {self.data_file} 不存在")
-                return []
+                return TemperatureArrays.empty()
             
-            with open(self.data_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
+            # 支持旧的 data.json 文件、JSON Lines 文件和分段目录
+            data = self._load(self.start, self.end)
             print(f"成功加载 {len(data)} 条温度记录")
             return data
         except Exception as e:
             print(f"加载数据失败: {e}")
-            return []
+            return TemperatureArrays.empty()
     
-    def parse_data(self):
-        """解析数据为时间序列"""
-        timestamps = []
-        cpu_temps = []
-        gpu_temps = []
-        
-        for entry in self.data:
-            try:
-                # 解析时间戳
-                timestamp = datetime.fromisoformat(entry['timestamp'])
-                timestamps.append(timestamp)
-                
-                # 提取温度数据
-                temperatures = entry.get('temperatures', {})
-                
-                # CPU温度
-                cpu_temp = temperatures.get('cpu')
-                cpu_temps.append(cpu_temp if cpu_temp is not None else np.nan)
-                
-                # GPU温度
-                gpu_temp = temperatures.get('gpu')
-                gpu_temps.append(gpu_temp if gpu_temp is not None else np.nan)
-                
-            except Exception as e:
-                print(f"解析数据条目失败: {e}")
+    def _load(self, start, end, build=True):
+        if self.use_cache:
+            from column_cache import load_cached_arrays
+            return load_cached_arrays(self.data_file, start, end, build=build)
+        from data_loader import load_arrays
+        return load_arrays(self.data_file, start, end)
+    
+    def query(self, start, end):
+        """读取 [start, end] 内的数据：已有列缓存时在缓存上二分查找，否则用稀疏时间索引直接定位，
+        耗时只与结果大小有关"""
+        return self._load(start, end, build=False)
+    
+    def print_range_summary(self, start, end):
+        """打印某个时间范围内的温度统计，例如 ("2025-06-24 02:00", "2025-06-24 03:00")"""
+        from stats_engine import series_stats
+        started = time.perf_counter()
+        data = self.query(start, end)
+        elapsed = (time.perf_counter() - started) * 1000
+        
+        print(f"\n=== {start} 到 {end} ===")
+        print(f"记录数: {len(data)}（查询耗时 {elapsed:.1f}ms）")
+        for name, title in (('cpu', 'CPU'), ('gpu', 'GPU')):
+            stats = series_stats(data.column(name))
+            if stats is None:
                 continue
-        
-        return timestamps, cpu_temps, gpu_temps
+            print(f"{title}温度: 平均 {stats['mean']:.2f}°C, 最小 {stats['min']:.2f}°C, "
+                  f"最大 {stats['max']:.2f}°C, P95 {stats['percentiles'][95]:.1f}°C")
+        return data
     
-    def create_temperature_chart(self, save_path="temperature_chart.png", show_chart=True):
-        """创建温度趋势图"""
-        if not self.data:
-            print("没有数据可以绘制图表")
-            return
-        
-        timestamps, cpu_temps, gpu_temps = self.parse_data()
+    def parse_data(self):
+        """解析数据为时间序列 (datetime64时间戳, CPU温度, GPU温度)，缺失值为NaN"""
+        return self.data.timestamps, self.data.column('cpu'), self.data.column('gpu')
+    
+    def rollup_range(self):
+        """返回所选时间范围的 (开始, 结束) 秒数；没有聚合文件或聚合文件不完整时返回 None"""
+        extent = rollup_extent(self.rollup_dir, self.data_file)
+        if extent is None:
+            return None
+        start = to_epoch(self.start) if self.start is not None else extent[0]
+        end = to_epoch(self.end) if self.end is not None else extent[1]
+        return start, end
+    
+    def rollup_series(self, min_buckets):
+        """时间跨度足够长时由聚合数据生成趋势曲线
+        
+        选择至少能提供 min_buckets 个桶的最粗一级，返回 (datetime64时间戳, {组件: (平均, 最小, 最大)})；
+        时间跨度太短或没有聚合数据时返回 None，由调用者使用原始数据。
+        """
+        time_range = self.rollup_range()
+        if time_range is None:
+            return None
+        selected = series_buckets(self.rollup_dir, time_range[0], time_range[1], min_buckets)
+        if selected is None:
+            return None
+        tier, buckets = selected
+        print(f"使用 {tier} 聚合数据绘制趋势图（{len(buckets)} 个桶）")
+        
+        import numpy as np
+        timestamps = np.array([t for t, _ in buckets], dtype=np.int64).astype('datetime64[s]')
+        series = {}
+        for name in ('cpu', 'gpu'):
+            values = np.full((len(buckets), 3), np.nan)
+            for i, (_, sensors) in enumerate(buckets):
+                stats = sensors.get(name)
+                if stats is not None and stats[0]:
+                    values[i] = (stats[1] / stats[0], stats[3], stats[4])
+            series[name] = (values[:, 0], values[:, 1], values[:, 2])
+        return timestamps, series
+    
+    @staticmethod
+    def pixel_width(ax, dpi=300):
+        """坐标轴在保存的图片中的像素宽度"""
+        return max(1, int(ax.get_window_extent().width * dpi / ax.figure.dpi))
+    
+    def plot_series(self, ax, timestamps, temps, fmt, dpi=300, downsample="m4", **kwargs):
+        """按坐标轴的像素宽度降采样后绘制一条温度曲线
+        
+        downsample 为 "m4"（每个像素列保留首/尾/最小/最大值，尖峰不会丢失）、"lttb" 或 None（不降采样）。
+        """
+        if downsample:
+            from downsample import decimate
+            width_px = self.pixel_width(ax, dpi)
+            max_points = 4 * width_px if downsample == "m4" else width_px
+            timestamps, temps = decimate(timestamps, temps, max_points, downsample)
+        
+        if len(temps) > MARKER_LIMIT:
+            kwargs.pop('marker', None)
+            kwargs.pop('markersize', None)
+        ax.plot(timestamps, temps, fmt, **kwargs)
+    
+    def create_temperature_chart(self, save_path="temperature_chart.png", show_chart=True, downsample="m4",
+                                 use_rollups=True):
+        """创建温度趋势图
         
-        if not timestamps:
-            print("没有有效的时间戳数据")
-            return
+        时间跨度较长且有聚合文件时，直接用聚合桶绘制平均值曲线和最小/最大值范围，不读取原始数据。
+        """
+        plt = _pyplot(headless=not show_chart)
+        import matplotlib.dates as mdates
+        import numpy as np
         
         # 创建图表
         fig, ax = plt.subplots(figsize=(12, 8))
         
-        # 绘制CPU温度曲线
-        if any(not np.isnan(temp) for temp in cpu_temps):
-            ax.plot(timestamps, cpu_temps, 'b-', linewidth=2, label='CPU温度', marker='o', markersize=4)
-        
-        # 绘制GPU温度曲线
-        if any(not np.isnan(temp) for temp in gpu_temps):
-            ax.plot(timestamps, gpu_temps, 'r-', linewidth=2, label='GPU温度', marker='s', markersize=4)
+        # 每4个像素至少一个桶时，聚合数据和原始数据降采样后的显示效果相同
+        rollup = self.rollup_series(self.pixel_width(ax) // 4) if use_rollups else None
+        if rollup is not None:
+            timestamps, series = rollup
+            for name, color, label in (('cpu', 'b', 'CPU温度'), ('gpu', 'r', 'GPU温度')):
+                mean, low, high = series[name]
+                if np.isnan(mean).all():
+                    continue
+                ax.fill_between(timestamps, low, high, color=color, alpha=0.2, linewidth=0)
+                ax.plot(timestamps, mean, f'{color}-', linewidth=2, label=f'{label}（平均）')
+        else:
+            if not self.data:
+                print("没有数据可以绘制图表")
+                plt.close(fig)
+                return
+            
+            timestamps, cpu_temps, gpu_temps = self.parse_data()
+            
+            if len(timestamps) == 0:
+                print("没有有效的时间戳数据")
+                plt.close(fig)
+                return
+            
+            # 绘制CPU温度曲线
+            if not np.isnan(cpu_temps).all():
+                self.plot_series(ax, timestamps, cpu_temps, 'b-', downsample=downsample,
+                                 linewidth=2, label='CPU温度', marker='o', markersize=4)
+            
+            # 绘制GPU温度曲线
+            if not np.isnan(gpu_temps).all():
+                self.plot_series(ax, timestamps, gpu_temps, 'r-', downsample=downsample,
+                                 linewidth=2, label='GPU温度', marker='s', markersize=4)
         
         # 设置图表标题和标签
         ax.set_title('温度监控趋势图', fontsize=16, fontweight='bold')
@@ -103,8 +231,14 @@ class TemperatureChartGenerator:
         ax.legend(fontsize=12)
         
         # 格式化x轴时间显示
-        ax.xaxis.set_major_formatter(mdates.DateFormatter('%H:%M:%S'))
-        ax.xaxis.set_major_locator(mdates.MinuteLocator(interval=1))
+        # 超过一小时的数据每分钟一个刻度会产生过多刻度，改用自动刻度
+        if timestamps[-1] - timestamps[0] <= np.timedelta64(1, 'h'):
+            ax.xaxis.set_major_formatter(mdates.DateFormatter('%H:%M:%S'))
+            ax.xaxis.set_major_locator(mdates.MinuteLocator(interval=1))
+        else:
+            locator = mdates.AutoDateLocator()
+            ax.xaxis.set_major_locator(locator)
+            ax.xaxis.set_major_formatter(mdates.ConciseDateFormatter(locator))
         plt.xticks(rotation=45)
         
         # 调整布局
@@ -120,48 +254,49 @@ class TemperatureChartGenerator:
         
         plt.close()
     
-    def create_statistics_chart(self, save_path="temperature_stats.png", show_chart=True):
+    def create_statistics_chart(self, save_path="temperature_stats.png", show_chart=True,
+                                recent_points=20, downsample="m4"):
         """创建温度统计图表"""
+        import numpy as np
+        from stats_engine import histogram, box_stats
         if not self.data:
             print("没有数据可以绘制统计图表")
             return
         
-        timestamps, cpu_temps, gpu_temps = self.parse_data()
-        
-        # 过滤有效数据
-        valid_cpu_temps = [temp for temp in cpu_temps if not np.isnan(temp)]
-        valid_gpu_temps = [temp for temp in gpu_temps if not np.isnan(temp)]
+        stats = self.statistics()
+        cpu_stats = stats["series"]["cpu"]
+        gpu_stats = stats["series"]["gpu"]
         
-        if not valid_cpu_temps and not valid_gpu_temps:
+        if cpu_stats is None and gpu_stats is None:
             print("没有有效的温度数据")
             return
         
         # 创建子图
+        plt = _pyplot(headless=not show_chart)
         fig, ((ax1, ax2), (ax3, ax4)) = plt.subplots(2, 2, figsize=(15, 10))
         
         # 1. 温度分布直方图
-        if valid_cpu_temps:
-            ax1.hist(valid_cpu_temps, bins=20, alpha=0.7, color='blue', label='CPU')
-        if valid_gpu_temps:
-            ax1.hist(valid_gpu_temps, bins=20, alpha=0.7, color='red', label='GPU')
+        if cpu_stats is not None:
+            counts, edges = histogram(cpu_stats, bins=20)
+            ax1.hist(edges[:-1], edges, weights=counts, alpha=0.7, color='blue', label='CPU')
+        if gpu_stats is not None:
+            counts, edges = histogram(gpu_stats, bins=20)
+            ax1.hist(edges[:-1], edges, weights=counts, alpha=0.7, color='red', label='GPU')
         ax1.set_title('温度分布直方图')
         ax1.set_xlabel('温度 (°C)')
         ax1.set_ylabel('频次')
         ax1.legend()
         ax1.grid(True, alpha=0.3)
         
-        # 2. 箱线图
+        # 2. 箱线图（由预先计算的统计量绘制，不需要传入原始数据）
         box_data = []
-        box_labels = []
-        if valid_cpu_temps:
-            box_data.append(valid_cpu_temps)
-            box_labels.append('CPU')
-        if valid_gpu_temps:
-            box_data.append(valid_gpu_temps)
-            box_labels.append('GPU')
+        if cpu_stats is not None:
+            box_data.append(box_stats(cpu_stats, 'CPU'))
+        if gpu_stats is not None:
+            box_data.append(box_stats(gpu_stats, 'GPU'))
         
         if box_data:
-            ax2.boxplot(box_data, labels=box_labels)
+            ax2.bxp(box_data)
             ax2.set_title('温度箱线图')
             ax2.set_ylabel('温度 (°C)')
             ax2.grid(True, alpha=0.3)
@@ -171,27 +306,17 @@ class TemperatureChartGenerator:
         ax3.axis('off')
         
         stats_data = []
-        if valid_cpu_temps:
-            cpu_stats = [
-                'CPU',
-                f"{np.mean(valid_cpu_temps):.2f}",
-                f"{np.min(valid_cpu_temps):.2f}",
-                f"{np.max(valid_cpu_temps):.2f}",
-                f"{np.std(valid_cpu_temps):.2f}",
-                f"{len(valid_cpu_temps)}"
-            ]
-            stats_data.append(cpu_stats)
-        
-        if valid_gpu_temps:
-            gpu_stats = [
-                'GPU',
-                f"{np.mean(valid_gpu_temps):.2f}",
-                f"{np.min(valid_gpu_temps):.2f}",
-                f"{np.max(valid_gpu_temps):.2f}",
-                f"{np.std(valid_gpu_temps):.2f}",
-                f"{len(valid_gpu_temps)}"
-            ]
-            stats_data.append(gpu_stats)
+        for name, series in (('CPU', cpu_stats), ('GPU', gpu_stats)):
+            if series is None:
+                continue
+            stats_data.append([
+                name,
+                f"{series['mean']:.2f}",
+                f"{series['min']:.2f}",
+                f"{series['max']:.2f}",
+                f"{series['std']:.2f}",
+                f"{series['count']}"
+            ])
         
         if stats_data:
             columns = ['组件', '平均值(°C)', '最小值(°C)', '最大值(°C)', '标准差', '数据点数']
@@ -205,27 +330,17 @@ class TemperatureChartGenerator:
             ax3.set_title('温度统计信息')
         
         # 4. 最近温度趋势
-        recent_data = self.data[-20:] if len(self.data) > 20 else self.data
-        recent_timestamps = []
-        recent_cpu = []
-        recent_gpu = []
-        
-        for entry in recent_data:
-            try:
-                timestamp = datetime.fromisoformat(entry['timestamp'])
-                recent_timestamps.append(timestamp)
-                
-                temperatures = entry.get('temperatures', {})
-                recent_cpu.append(temperatures.get('cpu', np.nan))
-                recent_gpu.append(temperatures.get('gpu', np.nan))
-            except:
-                continue
-        
-        if recent_timestamps:
-            if any(not np.isnan(temp) for temp in recent_cpu):
-                ax4.plot(recent_timestamps, recent_cpu, 'b-', marker='o', label='CPU')
-            if any(not np.isnan(temp) for temp in recent_gpu):
-                ax4.plot(recent_timestamps, recent_gpu, 'r-', marker='s', label='GPU')
+        recent = self.data[-recent_points:]
+        
+        if len(recent):
+            recent_cpu = recent.column('cpu')
+            recent_gpu = recent.column('gpu')
+            if not np.isnan(recent_cpu).all():
+                self.plot_series(ax4, recent.timestamps, recent_cpu, 'b-', downsample=downsample,
+                                 marker='o', label='CPU')
+            if not np.isnan(recent_gpu).all():
+                self.plot_series(ax4, recent.timestamps, recent_gpu, 'r-', downsample=downsample,
+                                 marker='s', label='GPU')
             
             ax4.set_title('最近温度趋势')
             ax4.set_xlabel('时间')
@@ -247,34 +362,138 @@ class TemperatureChartGenerator:
         
         plt.close()
     
-    def print_summary(self):
-        """打印数据摘要"""
+    def rollup_summary(self):
+        """由聚合数据计算摘要，读取量与数据总量无关；没有可用的聚合数据时返回 None"""
+        time_range = self.rollup_range()
+        if time_range is None:
+            return None
+        buckets = collect_buckets(self.rollup_dir, time_range[0], time_range[1])
+        if not buckets:
+            return None
+        
+        records = summarize(buckets, RECORDS_KEY)
+        summary = {
+            "source": "rollups",
+            "records": records['count'] if records else 0,
+            "first": from_epoch(max(time_range[0], buckets[0][0])).isoformat(timespec='minutes'),
+            "last": from_epoch(time_range[1]).isoformat(timespec='minutes'),
+            "series": {}
+        }
+        for name in ('cpu', 'gpu'):
+            stats = summarize(buckets, name)
+            if stats is not None:
+                summary["series"][name] = {"mean": round(stats['mean'], 3), "min": stats['min'], "max": stats['max'],
+                                           "count": stats['count']}
+        return summary
+    
+    def summary(self, use_rollups=True):
+        """数据摘要（可以直接保存为JSON）：有聚合数据时由聚合数据计算，否则由原始数据计算；没有数据时返回 None"""
+        if use_rollups:
+            summary = self.rollup_summary()
+            if summary is not None:
+                return summary
+        
         if not self.data:
+            return None
+        
+        stats = self.statistics()
+        summary = {
+            "source": "raw",
+            "records": stats['records'],
+            "first": stats['first'].astype(datetime).isoformat(timespec='seconds'),
+            "last": stats['last'].astype(datetime).isoformat(timespec='seconds'),
+            "series": {}
+        }
+        for name in ('cpu', 'gpu'):
+            series = stats['series'][name]
+            if series is None:
+                continue
+            # 温度按 float32 保存，保留3位小数去掉转换产生的尾数
+            summary["series"][name] = {
+                "mean": round(float(series['mean']), 3),
+                "min": round(float(series['min']), 3),
+                "max": round(float(series['max']), 3),
+                "std": round(float(series['std']), 3),
+                "p50": round(float(series['percentiles'][50]), 3),
+                "p95": round(float(series['percentiles'][95]), 3),
+                "count": int(series['count'])
+            }
+        return summary
+    
+    def print_rollup_summary(self):
+        """由聚合数据打印摘要；没有可用的聚合数据时返回 False"""
+        summary = self.rollup_summary()
+        if summary is None:
+            return False
+        self._print_summary(summary)
+        return True
+    
+    def print_summary(self, use_rollups=True):
+        """打印数据摘要"""
+        summary = self.summary(use_rollups)
+        if summary is None:
             print("没有数据")
             return
-        
-        timestamps, cpu_temps, gpu_temps = self.parse_data()
-        
-        valid_cpu_temps = [temp for temp in cpu_temps if not np.isnan(temp)]
-        valid_gpu_temps = [temp for temp in gpu_temps if not np.isnan(temp)]
-        
-        print(f"\n=== 温度数据摘要 ===")
-        print(f"数据记录总数: {len(self.data)}")
-        print(f"时间范围: {timestamps[0].strftime('%Y-%m-%d %H:%M:%S')} 到 {timestamps[-1].strftime('%Y-%m-%d %H:%M:%S')}")
-        
-        if valid_cpu_temps:
-            print(f"\nCPU温度:")
-            print(f"  平均: {np.mean(valid_cpu_temps):.2f}°C")
-            print(f"  最小: {np.min(valid_cpu_temps):.2f}°C")
-            print(f"  最大: {np.max(valid_cpu_temps):.2f}°C")
-            print(f"  数据点: {len(valid_cpu_temps)}")
-        
-        if valid_gpu_temps:
-            print(f"\nGPU温度:")
-            print(f"  平均: {np.mean(valid_gpu_temps):.2f}°C")
-            print(f"  最小: {np.min(valid_gpu_temps):.2f}°C")
-            print(f"  最大: {np.max(valid_gpu_temps):.2f}°C")
-            print(f"  数据点: {len(valid_gpu_temps)}")
+        self._print_summary(summary)
+    
+    @staticmethod
+    def _print_summary(summary):
+        if summary["source"] == "rollups":
+            print(f"\n=== 温度数据摘要（由聚合数据计算，时间精确到分钟） ===")
+        else:
+            print(f"\n=== 温度数据摘要 ===")
+        print(f"数据记录总数: {summary['records']}")
+        print(f"时间范围: {summary['first'].replace('T', ' ')} 到 {summary['last'].replace('T', ' ')}")
+        
+        for name, title in (('cpu', 'CPU'), ('gpu', 'GPU')):
+            series = summary["series"].get(name)
+            if series is None:
+                continue
+            print(f"\n{title}温度:")
+            print(f"  平均: {series['mean']:.2f}°C")
+            print(f"  最小: {series['min']:.2f}°C")
+            print(f"  最大: {series['max']:.2f}°C")
+            if "p50" in series:
+                print(f"  中位数: {series['p50']:.1f}°C  P95: {series['p95']:.1f}°C")
+            print(f"  数据点: {series['count']}")
+    
+    def export(self, output, fmt="csv"):
+        """把（所选时间范围内的）原始数据导出为 CSV 或 JSON 数组，output 为 "-" 时写到标准输出
+        
+        按块转换和写出，不会为每条记录创建Python对象，缺失值在 CSV 中为空、在 JSON 中为 null。
+        """
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(f"未知的导出格式: {fmt} (可选: {', '.join(EXPORT_FORMATS)})")
+        import numpy as np
+        data = self.data
+        names = list(data.columns)
+        f = sys.stdout if output == "-" else open(output, 'w', encoding='utf-8', newline='')
+        try:
+            f.write(",".join(["timestamp"] + names) + "\n" if fmt == "csv" else "[")
+            for begin in range(0, len(data), EXPORT_CHUNK):
+                chunk = data[begin:begin + EXPORT_CHUNK]
+                # 没有毫秒部分时输出到秒，与原始数据的格式相同
+                unit = 'ms' if (chunk.timestamps.astype(np.int64) % 1000).any() else 's'
+                timestamps = np.datetime_as_string(chunk.timestamps, unit=unit)
+                columns = []
+                for name in names:
+                    values = np.round(chunk.column(name).astype(np.float64), 2).astype(str)
+                    values[np.isnan(chunk.column(name))] = "" if fmt == "csv" else "null"
+                    columns.append(values)
+                if fmt == "csv":
+                    rows = (",".join(row) for row in zip(timestamps, *columns))
+                    f.write("\n".join(rows) + "\n")
+                else:
+                    rows = ('{"timestamp": "' + row[0] + '", '
+                            + ", ".join(f'"{name}": {value}' for name, value in zip(names, row[1:])) + "}"
+                            for row in zip(timestamps, *columns))
+                    f.write(("," if begin else "") + "\n" + ",\n".join(rows))
+            if fmt == "json":
+                f.write("\n]\n")
+        finally:
+            if f is not sys.stdout:
+                f.close()
+        return len(data)
     
     def generate_all_charts(self):
         """生成所有图表"""
@@ -284,11 +503,22 @@ class TemperatureChartGenerator:
         print("正在生成统计图表...")
         self.create_statistics_chart(show_chart=False)
         
-        self.print_summary()
+        # 统计图已经计算并缓存了统计结果，摘要直接复用
+        self.print_summary(use_rollups=False)
         print("\n所有图表生成完成!")
 
-def main():
-    generator = TemperatureChartGenerator()
+COMMANDS = ("summary", "trend", "stats", "all", "export")
+
+
+def interactive_menu(argv):
+    """旧的用法：python chart_generator.py [data.json] 进入菜单，
+    python chart_generator.py data.json <开始时间> <结束时间> 只查询该时间范围"""
+    data_file = argv[0] if argv else default_data_path()
+    generator = TemperatureChartGenerator(data_file)
+    
+    if len(argv) >= 3:
+        generator.print_range_summary(argv[1], argv[2])
+        return
     
     print("温度数据图表生成器")
     print("1. 生成趋势图")
@@ -309,5 +539,74 @@ def main():
     else:
         print("无效选择")
 
+def build_parser():
+    parser = argparse.ArgumentParser(description="温度数据图表生成器（不带子命令时进入交互菜单）")
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("data_file", nargs="?", default=default_data_path(),
+                        help="data.json、JSON Lines 文件或分段目录（默认按 config.json 的存储配置）")
+    common.add_argument("--start", help="只使用该时间之后的数据（ISO格式）")
+    common.add_argument("--end", help="只使用该时间之前的数据（ISO格式）")
+    common.add_argument("--no-cache", action="store_true", help="不使用列缓存")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    
+    summary_parser = subparsers.add_parser("summary", parents=[common], help="显示数据摘要（不导入 matplotlib）")
+    summary_parser.add_argument("--json", action="store_true", help="以JSON输出到标准输出")
+    summary_parser.add_argument("--no-rollups", action="store_true", help="由原始数据计算（包含中位数和P95）")
+    
+    trend_parser = subparsers.add_parser("trend", parents=[common], help="生成温度趋势图")
+    trend_parser.add_argument("-o", "--output", default="temperature_chart.png")
+    trend_parser.add_argument("--downsample", choices=("m4", "lttb", "none"), default="m4")
+    trend_parser.add_argument("--no-rollups", action="store_true", help="不使用聚合数据，总是绘制原始数据")
+    trend_parser.add_argument("--show", action="store_true", help="保存后显示图表窗口")
+    
+    stats_parser = subparsers.add_parser("stats", parents=[common], help="生成统计图表")
+    stats_parser.add_argument("-o", "--output", default="temperature_stats.png")
+    stats_parser.add_argument("--show", action="store_true", help="保存后显示图表窗口")
+    
+    subparsers.add_parser("all", parents=[common], help="生成所有图表并显示摘要")
+    
+    export_parser = subparsers.add_parser("export", parents=[common], help="把原始数据导出为 CSV 或 JSON")
+    export_parser.add_argument("-o", "--output", default="-", help="输出文件，默认为标准输出")
+    export_parser.add_argument("--format", choices=EXPORT_FORMATS, default="csv")
+    return parser
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or (argv[0] not in COMMANDS and argv[0] not in ("-h", "--help")):
+        interactive_menu(argv)
+        return
+    
+    args = build_parser().parse_args(argv)
+    generator = TemperatureChartGenerator(args.data_file, args.start, args.end, use_cache=not args.no_cache)
+    # 输出JSON或把数据写到标准输出时，加载过程中的提示信息改为输出到 stderr
+    quiet = (args.command == "summary" and args.json) or (args.command == "export" and args.output == "-")
+    with contextlib.redirect_stdout(sys.stderr) if quiet else contextlib.nullcontext():
+        if args.command == "summary":
+            summary = generator.summary(use_rollups=not args.no_rollups)
+        elif args.command == "trend":
+            generator.create_temperature_chart(args.output, show_chart=args.show,
+                                               downsample=None if args.downsample == "none" else args.downsample,
+                                               use_rollups=not args.no_rollups)
+        elif args.command == "stats":
+            generator.create_statistics_chart(args.output, show_chart=args.show)
+        elif args.command == "all":
+            generator.generate_all_charts()
+        elif args.command == "export":
+            data = generator.data
+    
+    if args.command == "summary":
+        if args.json:
+            print(json.dumps(summary, ensure_ascii=False, indent=2))
+        elif summary is None:
+            print("没有数据")
+        else:
+            generator._print_summary(summary)
+        if summary is None:
+            sys.exit(1)
+    elif args.command == "export":
+        generator.export(args.output, args.format)
+        if args.output != "-":
+            print(f"已导出 {len(data)} 条记录到 {args.output}")
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,375 @@
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import json
+import time
+from pathlib import Path
+
+import numpy as np
+
+from archive import ARCHIVE_SUFFIX, read_archive_arrays
+from data_loader import (COMPONENTS, TemperatureArrays, archive_files, iter_json_array, load_arrays, parse_chunk,
+                         to_datetime64)
+from storage import SegmentedStorage
+from time_index import file_format
+
+CACHE_VERSION = 1
+# 校验水位线之前的这么多字节，判断已缓存的部分有没有被改写
+FINGERPRINT_BYTES = 64
+CHUNK_RECORDS = 65536
+# 锁文件存在超过该时间时认为持有它的进程已经退出
+STALE_LOCK_SECONDS = 600
+
+
+def cache_dir_for(data_path):
+    """列缓存保存在原始数据旁边：data.json -> data.json.cache/，分段目录 -> 分段目录/cache/"""
+    data_path = Path(data_path)
+    if data_path.is_dir():
+        return data_path / "cache"
+    return Path(str(data_path) + ".cache")
+
+
+def is_cache_dir(path):
+    """列缓存目录（data.json.cache/ 或 分段目录/cache/），扫描数据文件时应该跳过
+
+    只认数据集真正的缓存目录：cache_dir_for() 对应的数据集存在，或者目录中有列缓存的 meta.json。
+    ~/.cache/ 下或名为 cache 的主机目录中的数据不是缓存。
+    """
+    path = Path(path)
+    if path.name == "cache":
+        owner = path.parent
+        if SegmentedStorage.list_segments(owner) or archive_files(owner):
+            return True
+    elif path.name.endswith(".cache"):
+        if path.name != ".cache" and path.with_name(path.name[:-len(".cache")]).is_file():
+            return True
+    else:
+        return False
+    return _has_cache_meta(path)
+
+
+def _has_cache_meta(directory):
+    try:
+        with open(Path(directory) / "meta.json", 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return False
+    return isinstance(meta, dict) and "generation" in meta and "parts" in meta and "components" in meta
+
+
+def _inside_cache_dir(path):
+    return any(is_cache_dir(parent) for parent in Path(path).resolve().parents)
+
+
+def _dataset_parts(path):
+    """按读取顺序列出数据集的组成文件 [(路径, 格式)]，格式为 archive / array / lines"""
+    path = Path(path)
+    if path.is_dir():
+        parts = [(archive, "archive") for archive in archive_files(path)]
+        parts.extend((segment, "lines") for _, _, segment in SegmentedStorage.list_segments(path))
+        return parts
+    return [(path, file_format(path))]
+
+
+def _fingerprint(path, offset):
+    if offset <= 0:
+        return ""
+    with open(path, 'rb') as f:
+        f.seek(max(0, offset - FINGERPRINT_BYTES))
+        return f.read(min(offset, FINGERPRINT_BYTES)).hex()
+
+
+def _iter_lines(path, offset):
+    """从 offset 开始读取完整的行，产出 (记录或None, 该行结束处的偏移)，不完整的尾行留到下次读取"""
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        for line in f:
+            if not line.endswith(b'\n'):
+                return
+            offset += len(line)
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line), offset
+            except ValueError:
+                yield None, offset
+
+
+def _iter_array(path, offset):
+    """从 offset（上次缓存的最后一条记录的开头）开始解析JSON数组，产出 (记录, 记录开头的偏移)
+
+    JsonArrayStorage 每次按相同格式重写整个文件，已缓存的记录的字节偏移不会变化。
+    """
+    # latin-1 把每个字节映射为一个字符，字符偏移就是字节偏移
+    with open(path, 'r', encoding='latin-1', newline='') as f:
+        f.seek(offset)
+        records = iter_json_array(f, in_array=offset > 0, with_offsets=True)
+        try:
+            for i, (position, record) in enumerate(records):
+                if offset and i == 0:
+                    # 水位线处的记录已经在缓存中
+                    continue
+                yield record, offset + position
+        except json.JSONDecodeError:
+            # 文件正在被重写，尾部不完整，下次再读
+            return
+
+
+class ColumnCache:
+    """解析后的温度数据的二进制缓存：每列一个定长数组文件，用 numpy.memmap 打开
+
+    meta.json 记录数据集每个组成文件的大小、修改时间和已经解析到的位置（水位线）。
+    数据文件只在尾部追加时，刷新只解析水位线之后的新记录并追加到列文件；
+    已缓存的部分被改写（水位线前的字节变化、文件变短、分段被归档）时重新生成。
+    """
+
+    def __init__(self, data_path, components=COMPONENTS):
+        self.data_path = Path(data_path)
+        self.directory = cache_dir_for(data_path)
+        self.components = tuple(components)
+        self.meta_path = self.directory / "meta.json"
+        self.lock_path = self.directory / "lock"
+
+    def _column_path(self, generation, name):
+        return self.directory / f"{name}.{generation}.bin"
+
+    def _read_meta(self):
+        try:
+            with open(self.meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if meta.get("version") != CACHE_VERSION or meta.get("components") != list(self.components):
+            return None
+        return meta
+
+    def _write_meta(self, meta):
+        temp_path = self.meta_path.with_suffix(".tmp")
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.replace(temp_path, self.meta_path)
+
+    @staticmethod
+    def _status(meta, parts):
+        """比较缓存和数据集：返回 "fresh"（无变化）、"append"（只有尾部新增）或 "rebuild" """
+        cached = meta["parts"]
+        if len(cached) > len(parts):
+            return "rebuild"
+        status = "fresh" if len(cached) == len(parts) else "append"
+        for i, entry in enumerate(cached):
+            path, fmt = parts[i]
+            if entry["name"] != path.name or entry["format"] != fmt:
+                return "rebuild"
+            stat = path.stat()
+            if entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+                continue
+            # 只有最后一个已缓存的文件可以继续增长，否则新记录会插在已缓存的后续文件之前
+            if i < len(cached) - 1 or fmt == "archive" or stat.st_size < entry["offset"]:
+                return "rebuild"
+            if _fingerprint(path, entry["offset"]) != entry["fingerprint"]:
+                return "rebuild"
+            status = "append"
+        return status
+
+    def _acquire(self):
+        try:
+            fd = os.open(self.lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            try:
+                if time.time() - self.lock_path.stat().st_mtime < STALE_LOCK_SECONDS:
+                    return False
+                os.remove(self.lock_path)
+            except OSError:
+                return False
+            return self._acquire()
+        os.close(fd)
+        return True
+
+    def _release(self):
+        try:
+            os.remove(self.lock_path)
+        except OSError:
+            pass
+
+    def load(self, build=True):
+        """刷新缓存并返回 (TemperatureArrays, 是否按时间排序)
+
+        其他进程正在刷新，或者 build 为 False 且还没有缓存时返回 None。
+        """
+        meta = self._read_meta()
+        if meta is None and not build:
+            return None
+        parts = _dataset_parts(self.data_path)
+        if meta is not None and self._status(meta, parts) == "fresh":
+            return self._open(meta), meta["sorted"]
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        if not self._acquire():
+            return None
+        try:
+            # 检查和加锁之间其他进程可能已经刷新过
+            meta = self._read_meta()
+            status = "rebuild" if meta is None else self._status(meta, parts)
+            if status != "fresh":
+                meta = self._refresh(meta, parts, status == "rebuild")
+        finally:
+            self._release()
+        return self._open(meta), meta["sorted"]
+
+    def _refresh(self, meta, parts, rebuild):
+        old_generation = None
+        if rebuild:
+            old_generation = meta["generation"] if meta else None
+            meta = {"version": CACHE_VERSION, "components": list(self.components),
+                    "generation": (old_generation or 0) + 1, "count": 0, "sorted": True, "last_ms": None, "parts": []}
+
+        names = ("timestamps",) + self.components
+        files = {}
+        try:
+            for name in names:
+                files[name] = open(self._column_path(meta["generation"], name), 'ab')
+                # 丢掉上次刷新中断时写了一半的数据
+                files[name].truncate(meta["count"] * 8 if name == "timestamps" else meta["count"] * 4)
+            self._read_parts(meta, parts, files)
+        finally:
+            for f in files.values():
+                f.close()
+        self._write_meta(meta)
+
+        # 重新生成时写入新一代的列文件，正在读取旧文件的其他进程不受影响
+        if old_generation is not None and old_generation != meta["generation"]:
+            for name in names:
+                try:
+                    os.remove(self._column_path(old_generation, name))
+                except OSError:
+                    pass
+        return meta
+
+    def _read_parts(self, meta, parts, files):
+        first = max(len(meta["parts"]) - 1, 0)
+        for i in range(first, len(parts)):
+            path, fmt = parts[i]
+            stat = path.stat()
+            if i < len(meta["parts"]):
+                entry = meta["parts"][i]
+                if entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+                    continue
+            else:
+                entry = {"name": path.name, "format": fmt, "offset": 0}
+                meta["parts"].append(entry)
+
+            offset = entry["offset"]
+            if fmt == "archive":
+                self._append(meta, files, *read_archive_arrays(path, self.components))
+                offset = stat.st_size
+            else:
+                offset = self._read_records(meta, files, _iter_lines(path, offset) if fmt == "lines"
+                                            else _iter_array(path, offset), offset)
+            entry.update(size=stat.st_size, mtime_ns=stat.st_mtime_ns, offset=offset,
+                         fingerprint=_fingerprint(path, offset))
+
+    def _read_records(self, meta, files, records, offset):
+        """按块把记录转换为列并追加到缓存，返回新的水位线"""
+        chunk_ts = []
+        chunk_values = {name: [] for name in self.components}
+        skipped = 0
+        nan = float('nan')
+        for entry, offset in records:
+            try:
+                timestamp = entry['timestamp']
+                temperatures = entry.get('temperatures') or {}
+            except (TypeError, KeyError, AttributeError):
+                skipped += 1
+                continue
+            chunk_ts.append(timestamp)
+            for name in self.components:
+                value = temperatures.get(name)
+                chunk_values[name].append(nan if value is None else value)
+            if len(chunk_ts) >= CHUNK_RECORDS:
+                self._append(meta, files, *parse_chunk(chunk_ts, chunk_values))
+                chunk_ts.clear()
+                for values in chunk_values.values():
+                    values.clear()
+        if chunk_ts:
+            self._append(meta, files, *parse_chunk(chunk_ts, chunk_values))
+        if skipped:
+            print(f"跳过 {skipped} 条无法解析的记录")
+        return offset
+
+    def _append(self, meta, files, timestamps, columns):
+        if len(timestamps) == 0:
+            return
+        ms = timestamps.astype('datetime64[ms]').astype('<i8')
+        if meta["sorted"] and ((meta["last_ms"] is not None and ms[0] < meta["last_ms"])
+                               or bool(np.any(ms[1:] < ms[:-1]))):
+            meta["sorted"] = False
+        meta["last_ms"] = int(ms[-1])
+        files["timestamps"].write(ms.tobytes())
+        for name in self.components:
+            files[name].write(np.asarray(columns[name], dtype='<f4').tobytes())
+        meta["count"] += len(ms)
+
+    def _open(self, meta):
+        count = meta["count"]
+        if count == 0:
+            return TemperatureArrays.empty(self.components)
+        generation = meta["generation"]
+        timestamps = np.memmap(self._column_path(generation, "timestamps"), dtype='<M8[ms]', mode='r',
+                               shape=(count,))
+        columns = {name: np.memmap(self._column_path(generation, name), dtype='<f4', mode='r', shape=(count,))
+                   for name in self.components}
+        return TemperatureArrays(timestamps, columns)
+
+
+def select_range(data, start=None, end=None, is_sorted=False):
+    """选取 [start, end] 内的数据；按时间排序时用二分查找，结果是原数组的视图"""
+    start = to_datetime64(start)
+    end = to_datetime64(end)
+    if start is None and end is None:
+        return data
+    if is_sorted:
+        lo = int(np.searchsorted(data.timestamps, start, 'left')) if start is not None else 0
+        hi = int(np.searchsorted(data.timestamps, end, 'right')) if end is not None else len(data)
+        return data[lo:max(lo, hi)]
+    mask = np.ones(len(data), dtype=bool)
+    if start is not None:
+        mask &= data.timestamps >= start
+    if end is not None:
+        mask &= data.timestamps <= end
+    return data[mask]
+
+
+def load_cached_arrays(path, start=None, end=None, components=COMPONENTS, build=True):
+    """与 load_arrays 相同，但通过列缓存读取：只解析上次之后新增的记录，列数组以 memmap 方式打开
+
+    单个归档文件本身就是列式的，直接读取；缓存无法写入或正被其他进程刷新时退回到 load_arrays。
+    build 为 False 时不创建新的缓存（只查询一个时间范围时，稀疏时间索引比第一次生成缓存快得多）。
+    """
+    path = Path(path)
+    # 缓存目录中的文件不是数据文件，不能再为它们生成缓存（否则每次都会多嵌套一层）
+    if path.suffix == ARCHIVE_SUFFIX or _inside_cache_dir(path):
+        return load_arrays(path, start, end, components)
+    try:
+        loaded = ColumnCache(path, components).load(build)
+    except (OSError, ValueError) as e:
+        print(f"无法使用列缓存 {cache_dir_for(path)}: {e}")
+        loaded = None
+    if loaded is None:
+        return load_arrays(path, start, end, components)
+    return select_range(loaded[0], start, end, loaded[1])
+
+
+def main():
+    if len(sys.argv) < 2:
+        print("用法: python column_cache.py <data.json 或分段目录>")
+        sys.exit(1)
+    started = time.perf_counter()
+    data = load_cached_arrays(sys.argv[1])
+    elapsed = (time.perf_counter() - started) * 1000
+    print(f"{len(data)} 条记录，耗时 {elapsed:.1f}ms，缓存目录 {cache_dir_for(sys.argv[1])}")
+
+
+if __name__ == "__main__":
+    main()
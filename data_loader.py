@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+
+from pathlib import Path
+
+import numpy as np
+
+from storage import SegmentedStorage, iter_json_array, iter_file_records
+from archive import ARCHIVE_SUFFIX, ArchiveReader, list_archives, archive_overlaps, read_archive_arrays
+
+COMPONENTS = ("cpu", "gpu")
+
+
+def archive_files(path):
+    """数据集中的归档文件：分段目录中已归档的旧分段，或者单个 .tca 文件"""
+    path = Path(path)
+    if path.is_dir():
+        return [archive for _, _, archive in list_archives(path)]
+    if path.suffix == ARCHIVE_SUFFIX:
+        return [path]
+    return []
+
+
+def iter_records(path, include_archives=True):
+    """遍历 data.json（JSON数组或JSON Lines）、分段目录或归档文件中的所有记录"""
+    path = Path(path)
+    if include_archives:
+        for archive in archive_files(path):
+            yield from ArchiveReader(archive).iter_records()
+    if path.suffix == ARCHIVE_SUFFIX:
+        return
+    yield from iter_file_records(path)
+
+
+def dataset_version(path):
+    """返回数据集的版本标识（文件的修改时间和大小），数据变化后版本随之变化；文件不存在时返回 None"""
+    path = Path(path)
+    try:
+        if path.is_dir():
+            files = list_archives(path) + SegmentedStorage.list_segments(path)
+            return tuple((file.name, file.stat().st_mtime_ns, file.stat().st_size) for _, _, file in files)
+        stat = path.stat()
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+class TemperatureArrays:
+    """按列存放的温度数据：datetime64[ms] 时间戳和每个组件一列 float32 温度（缺失为NaN）"""
+
+    def __init__(self, timestamps, columns):
+        self.timestamps = timestamps
+        self.columns = columns
+
+    @classmethod
+    def empty(cls, components=COMPONENTS):
+        return cls(np.empty(0, dtype='datetime64[ms]'),
+                   {name: np.empty(0, dtype=np.float32) for name in components})
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def __getitem__(self, key):
+        """按切片或布尔掩码选取数据"""
+        return TemperatureArrays(self.timestamps[key],
+                                 {name: column[key] for name, column in self.columns.items()})
+
+    def column(self, name):
+        return self.columns[name]
+
+
+class _ArrayBuilder:
+    """预分配、按需倍增的列式数组"""
+
+    def __init__(self, components, capacity=4096):
+        self.components = components
+        self.size = 0
+        self.timestamps = np.empty(capacity, dtype='datetime64[ms]')
+        self.columns = {name: np.empty(capacity, dtype=np.float32) for name in components}
+
+    def _reserve(self, extra):
+        needed = self.size + extra
+        capacity = len(self.timestamps)
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        self.timestamps = np.resize(self.timestamps, capacity)
+        for name in self.components:
+            self.columns[name] = np.resize(self.columns[name], capacity)
+
+    def extend(self, timestamps, columns):
+        count = len(timestamps)
+        if count == 0:
+            return
+        self._reserve(count)
+        end = self.size + count
+        self.timestamps[self.size:end] = timestamps
+        for name in self.components:
+            self.columns[name][self.size:end] = columns[name]
+        self.size = end
+
+    def build(self):
+        return TemperatureArrays(self.timestamps[:self.size].copy(),
+                                 {name: column[:self.size].copy() for name, column in self.columns.items()})
+
+
+def to_datetime64(value):
+    """把 datetime / ISO字符串 / None 转换为 datetime64[ms]"""
+    if value is None:
+        return None
+    return np.datetime64(value, 'ms')
+
+
+def _parse_timestamp(value):
+    try:
+        return np.datetime64(value, 'ms')
+    except (ValueError, TypeError):
+        return np.datetime64('NaT')
+
+
+def parse_chunk(chunk_ts, chunk_values):
+    """把一块记录的时间戳字符串和温度列表转换为 (datetime64[ms] 时间戳, {组件: float32 列})，丢弃时间戳无效的记录"""
+    columns = {name: np.array(values, dtype=np.float32) for name, values in chunk_values.items()}
+    try:
+        return np.array(chunk_ts, dtype='datetime64[ms]'), columns
+    except ValueError:
+        pass
+    # 块中有无法解析的时间戳时逐条转换
+    timestamps = np.array([_parse_timestamp(ts) for ts in chunk_ts], dtype='datetime64[ms]')
+    mask = ~np.isnat(timestamps)
+    print(f"跳过 {int((~mask).sum())} 条时间戳无效的记录")
+    return timestamps[mask], {name: column[mask] for name, column in columns.items()}
+
+
+def load_arrays(path, start=None, end=None, components=COMPONENTS, chunk_records=65536):
+    """流式加载温度数据到NumPy数组
+
+    记录按块解析：时间戳用NumPy批量转换为 datetime64，温度写入 float32 列，缺失值为NaN。
+    给出 start/end 时用稀疏时间索引（见 time_index）直接定位到范围开始处，读取量和内存占用都只与所选时间窗口有关。
+    """
+    if start is not None or end is not None:
+        from time_index import iter_range
+        records = iter_range(path, start, end, include_archives=False)
+    else:
+        records = iter_records(path, include_archives=False)
+
+    start = to_datetime64(start)
+    end = to_datetime64(end)
+    builder = _ArrayBuilder(components)
+
+    # 归档直接解码为数组，不经过逐条记录的Python对象
+    for archive in archive_files(path):
+        if archive_overlaps(archive, start, end):
+            builder.extend(*read_archive_arrays(archive, components, start, end))
+
+    chunk_ts = []
+    chunk_values = {name: [] for name in components}
+    skipped = 0
+
+    def flush():
+        if not chunk_ts:
+            return
+        timestamps, columns = parse_chunk(chunk_ts, chunk_values)
+        mask = None
+        if start is not None:
+            mask = timestamps >= start
+        if end is not None:
+            mask = timestamps <= end if mask is None else mask & (timestamps <= end)
+        if mask is not None:
+            timestamps = timestamps[mask]
+            columns = {name: column[mask] for name, column in columns.items()}
+        builder.extend(timestamps, columns)
+
+        chunk_ts.clear()
+        for values in chunk_values.values():
+            values.clear()
+
+    nan = float('nan')
+    for entry in records:
+        try:
+            timestamp = entry['timestamp']
+            temperatures = entry.get('temperatures') or {}
+        except (TypeError, KeyError, AttributeError):
+            skipped += 1
+            continue
+
+        chunk_ts.append(timestamp)
+        for name in components:
+            value = temperatures.get(name)
+            chunk_values[name].append(nan if value is None else value)
+
+        if len(chunk_ts) >= chunk_records:
+            flush()
+    flush()
+
+    if skipped:
+        print(f"跳过 {skipped} 条无法解析的记录")
+    return builder.build()
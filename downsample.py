@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+
+import numpy as np
+
+
+def _as_numeric(x):
+    """datetime64 转换为整数以便计算，其他类型转换为浮点数"""
+    x = np.asarray(x)
+    if np.issubdtype(x.dtype, np.datetime64):
+        return x.astype('int64').astype(np.float64)
+    return x.astype(np.float64)
+
+
+def m4_indices(x, y, n_buckets):
+    """M4降采样：按x等宽分桶，每个桶保留首、尾、最小、最大四个点的下标
+
+    每个像素列对应一个桶时，绘制结果与原始数据在像素上一致，尖峰不会丢失。
+    """
+    count = len(y)
+    if count <= 4 * n_buckets:
+        return np.arange(count)
+
+    xn = _as_numeric(x)
+    span = xn[-1] - xn[0]
+    if span <= 0:
+        bucket = np.arange(count) * n_buckets // count
+    else:
+        bucket = np.minimum(((xn - xn[0]) / span * n_buckets).astype(np.int64), n_buckets - 1)
+
+    # 数据按时间排序，每个桶是一段连续的下标
+    starts = np.flatnonzero(np.r_[True, bucket[1:] != bucket[:-1]])
+    ends = np.r_[starts[1:], count] - 1
+
+    mins = np.minimum.reduceat(y, starts)
+    maxs = np.maximum.reduceat(y, starts)
+    bucket_of = np.repeat(np.arange(len(starts)), ends - starts + 1)
+
+    # 每个桶中第一个等于最小值/最大值的点（下标有序，np.unique返回每个桶第一次出现的位置）
+    min_positions = np.flatnonzero(y == mins[bucket_of])
+    max_positions = np.flatnonzero(y == maxs[bucket_of])
+    min_idx = min_positions[np.unique(bucket_of[min_positions], return_index=True)[1]]
+    max_idx = max_positions[np.unique(bucket_of[max_positions], return_index=True)[1]]
+
+    return np.unique(np.concatenate([starts, ends, min_idx, max_idx]))
+
+
+def lttb_indices(x, y, threshold):
+    """LTTB（Largest-Triangle-Three-Buckets）降采样，返回保留点的下标
+
+    每个桶选出与前一个已选点和下一个桶平均点构成三角形面积最大的点，
+    能很好地保留曲线形状。
+    """
+    count = len(y)
+    if threshold >= count or threshold < 3:
+        return np.arange(count)
+
+    xn = _as_numeric(x)
+    y = np.asarray(y, dtype=np.float64)
+    # 中间 count-2 个点分成 threshold-2 个桶
+    edges = np.linspace(1, count - 1, threshold - 1).astype(np.int64)
+
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = count - 1
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        if i + 2 < len(edges):
+            next_start, next_end = edges[i + 1], edges[i + 2]
+        else:
+            next_start, next_end = count - 1, count
+        avg_x = xn[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+
+        areas = np.abs((xn[a] - avg_x) * (y[start:end] - y[a]) - (xn[a] - xn[start:end]) * (avg_y - y[a]))
+        a = start + int(np.argmax(areas))
+        selected[i + 1] = a
+    return selected
+
+
+def decimate(x, y, max_points, method="m4"):
+    """把一条曲线降采样到大约 max_points 个点，NaN（缺失值）处断开
+
+    method 为 "m4"（保留每个桶的最小/最大值，适合按像素宽度绘图）或 "lttb"。
+    缺失值本身不参与降采样；原始数据中被缺失值隔开的两段之间插入一个 NaN 点（x 为缺失段第一个点的 x），
+    绘图时曲线在这里断开，而不是把缺失段两边直接连起来。
+    """
+    x = np.asarray(x)
+    y = np.asarray(y)
+    valid = ~np.isnan(y)
+    positions = None
+    if not valid.all():
+        positions = np.flatnonzero(valid)
+        x_all, x, y = x, x[valid], y[valid]
+
+    if method == "m4":
+        indices = m4_indices(x, y, max(1, max_points // 4))
+    elif method == "lttb":
+        indices = lttb_indices(x, y, max_points)
+    else:
+        raise ValueError(f"未知的降采样方法: {method}")
+    if positions is None or len(indices) == 0:
+        return x[indices], y[indices]
+
+    # 每段连续数据的首尾点（段数不多时）也保留，断开处的曲线端点与原始数据一致
+    breaks = np.flatnonzero(np.diff(positions) > 1)
+    if 0 < len(breaks) <= max(1, max_points // 4):
+        indices = np.union1d(indices, np.concatenate([breaks, breaks + 1]))
+    kept = positions[indices]
+    missing = np.cumsum(~valid)
+    gaps = np.flatnonzero(missing[kept[1:]] != missing[kept[:-1]])
+    if len(gaps) == 0:
+        return x[indices], y[indices]
+    nan_positions = np.flatnonzero(~valid)
+    separators = nan_positions[np.searchsorted(nan_positions, kept[gaps])]
+    out_x = np.insert(x[indices], gaps + 1, x_all[separators])
+    out_y = np.insert(y[indices].astype(np.float64), gaps + 1, np.nan)
+    return out_x, out_y
@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+
+import sys
+import json
+import time
+import queue
+import atexit
+import logging
+import datetime
+import threading
+from logging.handlers import QueueHandler, QueueListener
+
+LOG_FORMATS = ("text", "json")
+
+# 日志名 -> 正在运行的 (QueueListener, 输出handler)；重新配置同名日志时先停止旧的
+_listeners = {}
+_listeners_lock = threading.Lock()
+
+
+class RateLimitFilter(logging.Filter):
+    """按事件限流：每个事件每秒最多 rate 条（允许 burst 条突发），ERROR 以上不限流
+
+    被省略的条数记在下一条放行的同名事件上（suppressed 字段）。
+    """
+
+    def __init__(self, rate=5.0, burst=10):
+        super().__init__()
+        self.rate = rate
+        self.burst = burst
+        self._buckets = {}  # 事件 -> [令牌数, 上次补充时间, 已省略条数]
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno >= logging.ERROR or self.rate <= 0:
+            return True
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(record.msg)
+            if bucket is None:
+                bucket = self._buckets[record.msg] = [float(self.burst), now, 0]
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+            if bucket[0] < 1:
+                bucket[2] += 1
+                return False
+            bucket[0] -= 1
+            if bucket[2]:
+                record.fields = {**getattr(record, "fields", {}), "suppressed": bucket[2]}
+                bucket[2] = 0
+        return True
+
+
+class EventFormatter(logging.Formatter):
+    """text: 时间 级别 事件 key=value ...；json: 每条日志一行JSON"""
+
+    def __init__(self, fmt="text"):
+        super().__init__()
+        self.fmt = fmt
+
+    def format(self, record):
+        fields = getattr(record, "fields", {})
+        timestamp = datetime.datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds')
+        if self.fmt == "json":
+            return json.dumps({"ts": timestamp, "level": record.levelname, "event": record.getMessage(), **fields},
+                              ensure_ascii=False, default=str)
+        parts = [timestamp, record.levelname, record.getMessage()]
+        parts.extend(f"{key}={value}" for key, value in fields.items())
+        return " ".join(parts)
+
+
+class EventLogger:
+    """结构化日志：log.info("事件", key=value, ...)，字段由 EventFormatter 输出"""
+
+    def __init__(self, logger):
+        self.logger = logger
+
+    def _log(self, level, event, fields):
+        if self.logger.isEnabledFor(level):
+            self.logger.log(level, event, extra={"fields": fields})
+
+    def debug(self, event, **fields):
+        self._log(logging.DEBUG, event, fields)
+
+    def info(self, event, **fields):
+        self._log(logging.INFO, event, fields)
+
+    def warning(self, event, **fields):
+        self._log(logging.WARNING, event, fields)
+
+    def error(self, event, **fields):
+        self._log(logging.ERROR, event, fields)
+
+
+def setup_event_log(config, name="temperature_monitor"):
+    """按 config["logging"] 配置采样日志，返回 EventLogger
+
+    日志经过限流后放进队列，由单独的线程写到 stdout（或 file 指定的文件），采样线程不会因为输出慢而阻塞。
+    同名日志再次配置时，旧的写日志线程写完已排队的日志后停止，它的输出文件随之关闭。
+    """
+    fmt = config.get("format", "text")
+    if fmt not in LOG_FORMATS:
+        raise ValueError(f"未知的日志格式: {fmt} (可选: {', '.join(LOG_FORMATS)})")
+
+    if config.get("file"):
+        output = logging.FileHandler(config["file"], encoding='utf-8')
+    else:
+        output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(EventFormatter(fmt))
+
+    records = queue.SimpleQueue()
+    handler = QueueHandler(records)
+    handler.addFilter(RateLimitFilter(config.get("max_per_second", 5), config.get("burst", 10)))
+    listener = QueueListener(records, output)
+
+    logger = logging.getLogger(name)
+    with _listeners_lock:
+        previous = _listeners.pop(name, None)
+        logger.handlers[:] = [handler]
+        if previous is not None:
+            _stop(*previous)
+        listener.start()
+        _listeners[name] = (listener, output)
+    logger.setLevel(config.get("level", "INFO").upper())
+    logger.propagate = False
+    return EventLogger(logger)
+
+
+def _stop(listener, output):
+    listener.stop()
+    output.close()
+
+
+@atexit.register
+def _stop_listeners():
+    """程序退出时写完所有排队的日志"""
+    with _listeners_lock:
+        for listener, output in _listeners.values():
+            _stop(listener, output)
+        _listeners.clear()
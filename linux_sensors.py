@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+
+import os
+from pathlib import Path
+
+from sensors import make_sensor_id
+
+# hwmon 驱动名称 -> 组件
+HWMON_CPU_DRIVERS = ("coretemp", "k10temp", "zenpower", "cpu_thermal", "soc_thermal")
+HWMON_GPU_DRIVERS = ("amdgpu", "radeon", "nouveau")
+# thermal_zone 的类型中包含这些关键字时视为CPU
+THERMAL_CPU_TYPES = ("x86_pkg_temp", "cpu", "soc", "pkg")
+
+
+class SysfsSensor:
+    """一个 sysfs 温度文件，文件描述符在整个运行期间保持打开"""
+
+    def __init__(self, path, component, source, label, sensor_id, labels):
+        self.path = path
+        self.component = component
+        self.source = source
+        self.label = label
+        self.id = sensor_id
+        self.labels = labels
+        self.fd = os.open(path, os.O_RDONLY)
+
+    def read(self):
+        """用 os.pread 从文件开头重新读取，返回摄氏温度（sysfs单位为毫摄氏度）"""
+        raw = os.pread(self.fd, 32, 0)
+        return int(raw) / 1000.0
+
+    def close(self):
+        os.close(self.fd)
+
+
+class SysfsSensorBackend:
+    """Linux 温度后端：直接读取 /sys/class/thermal 和 /sys/class/hwmon，不启动任何子进程
+
+    root 默认为 "/"，可以指向一个模拟的目录树以便测试。
+    """
+
+    def __init__(self, root="/"):
+        self.root = Path(root)
+        self.sensors = []
+        self.discover()
+
+    @staticmethod
+    def _read_text(path):
+        try:
+            return path.read_text(encoding='utf-8').strip()
+        except OSError:
+            return ""
+
+    def _add(self, path, component, source, label, sensor_id, labels):
+        try:
+            self.sensors.append(SysfsSensor(path, component, source, label, sensor_id, labels))
+        except OSError as e:
+            print(f"无法打开温度文件 {path}: {e}")
+
+    def discover(self):
+        """扫描所有温度文件并打开"""
+        self.close()
+
+        thermal_dir = self.root / "sys" / "class" / "thermal"
+        for zone in sorted(thermal_dir.glob("thermal_zone*")):
+            temp_file = zone / "temp"
+            if not temp_file.exists():
+                continue
+            zone_type = self._read_text(zone / "type")
+            component = "cpu" if any(key in zone_type.lower() for key in THERMAL_CPU_TYPES) else "other"
+            self._add(temp_file, component, "thermal", f"{zone.name}:{zone_type}",
+                      make_sensor_id(component, "thermal", zone.name),
+                      {"device": zone.name, "driver": zone_type})
+
+        hwmon_dir = self.root / "sys" / "class" / "hwmon"
+        for hwmon in sorted(hwmon_dir.glob("hwmon*")):
+            driver = self._read_text(hwmon / "name")
+            if driver in HWMON_CPU_DRIVERS:
+                component = "cpu"
+            elif driver in HWMON_GPU_DRIVERS:
+                component = "gpu"
+            else:
+                component = "other"
+            # hwmon编号在重启后可能变化，设备名（例如PCI地址、coretemp.0）是稳定的
+            device_link = hwmon / "device"
+            device = device_link.resolve().name if device_link.exists() else hwmon.name
+            for temp_file in sorted(hwmon.glob("temp*_input")):
+                label_file = hwmon / temp_file.name.replace("_input", "_label")
+                label = self._read_text(label_file) or temp_file.name.replace("_input", "")
+                self._add(temp_file, component, "hwmon", f"{hwmon.name}:{driver}:{label}",
+                          make_sensor_id(component, driver, device, label),
+                          {"device": device, "driver": driver, "sensor": label})
+
+        return self.sensors
+
+    def read_all(self):
+        """读取所有传感器，返回 [(传感器, 摄氏温度)]，读取失败的传感器会被跳过"""
+        readings = []
+        for sensor in self.sensors:
+            try:
+                readings.append((sensor, sensor.read()))
+            except (OSError, ValueError):
+                # 例如显卡休眠时 hwmon 返回 ENODEV
+                continue
+        return readings
+
+    def component_readings(self, component):
+        """返回某个组件的所有读数 {传感器id: 温度}"""
+        readings = [(sensor, temp) for sensor, temp in self.read_all()
+                    if sensor.component == component and 0 < temp < 150]
+
+        # 同时存在 hwmon 和 thermal_zone 时优先使用 hwmon（驱动直接提供的读数）
+        hwmon = [(sensor, temp) for sensor, temp in readings if sensor.source == "hwmon"]
+        return {sensor.id: round(temp, 2) for sensor, temp in hwmon or readings}
+
+    def cpu_readings(self):
+        readings = self.component_readings("cpu")
+        if not readings:
+            # 没有识别出CPU传感器时退回到所有 thermal_zone
+            readings = {sensor.id: round(temp, 2) for sensor, temp in self.read_all()
+                        if sensor.source == "thermal" and 0 < temp < 150}
+        return readings
+
+    def gpu_readings(self):
+        return self.component_readings("gpu")
+
+    def close(self):
+        for sensor in self.sensors:
+            sensor.close()
+        self.sensors = []
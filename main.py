@@ -4,11 +4,35 @@
 import os  
 import json
 import time
+import signal
+import threading
 import subprocess
 import datetime
-from pathlib import Path
-import re
 import sys
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from storage import create_storage
+from probe_cache import ProbeCache
+from sensor_session import ProbeSessions, NVIDIA_SMI_QUERY, parse_nvidia_smi_line
+from linux_sensors import SysfsSensorBackend
+from sensors import SensorRegistry, ColumnBuffer, make_sensor_id, sensors_path_for
+from rollups import RollupWriter, rollup_dir_for, to_epoch
+from scheduler import DeadlineScheduler
+from writer import BackgroundWriter
+from metrics import MetricsRegistry, MetricsServer
+from event_log import setup_event_log
+from alerts import create_alert_engine
+from adaptive import AdaptiveInterval, DeadbandFilter
+
+# 会话模式下通过常驻PowerShell执行的查询
+PS_THERMAL_ZONE_QUERY = "Get-CimInstance -ClassName Win32_PerfRawData_Counters_ThermalZoneInformation | Select-Object -ExpandProperty Temperature"
+PS_ACPI_QUERY = "Get-CimInstance -Namespace root/wmi -ClassName MSAcpi_ThermalZoneTemperature | Select-Object -ExpandProperty CurrentTemperature"
+# OpenHardwareMonitor 的每个GPU温度传感器输出一行 "标识|名称|温度"
+PS_OHM_GPU_QUERY = """
+Get-WmiObject -Namespace "root/OpenHardwareMonitor" -Class Sensor |
+Where-Object {$_.SensorType -eq "Temperature" -and $_.Name -like "*GPU*"} |
+ForEach-Object { "$($_.Identifier)|$($_.Name)|$($_.Value)" }
+"""
 
 # 只在直接从命令行运行时应用编码设置
 # if sys.platform == "win32":
@@ -19,10 +43,131 @@ import sys
 class TemperatureMonitor:
     def __init__(self, config_file="config.json"):
         self.config = self.load_config(config_file)
-        self.data_file = self.config.get("data_file", "data.json")
         self.interval = self.config.get("interval_seconds", 5)
         self.monitor_components = self.config.get("monitor_components", {"cpu": True, "gpu": True})
         
+        # 采集端模式：不写本地文件（不创建存储、不迁移 data.json），按批推送到汇总端（见 aggregator.py）
+        agent_config = self.config.get("agent", {})
+        self.agent_mode = agent_config.get("enabled", False)
+        self.storage = None if self.agent_mode else create_storage(self.config)
+        
+        # 自身的监控指标（探测延迟、成功/失败/超时次数、采样耗时、写入量）和限流的结构化采样日志
+        self.metrics = MetricsRegistry()
+        self.log = setup_event_log(self.config.get("logging", {}))
+        self._metrics_config = self.config.get("metrics", {})
+        self.metrics_server = None
+        if self._metrics_config.get("enabled", False):
+            self.metrics_server = MetricsServer(self.metrics, self._metrics_config.get("host", "127.0.0.1"),
+                                                self._metrics_config.get("port", 9108))
+        
+        # 写入时维护 1分钟/1小时/1天 聚合，保存在原始数据旁边
+        self.rollups = None
+        if self.config.get("auto_save", True) and self.config.get("rollups", True) and not self.agent_mode:
+            self.rollups = RollupWriter(rollup_dir_for(self.storage.location))
+        
+        # 死区压缩：读数变化不超过 delta_celsius 时不保存原始记录（聚合、告警和遥测仍然收到每次采样）
+        self.deadband = None
+        deadband_config = self.config.get("deadband", {})
+        if deadband_config.get("enabled", False):
+            self.deadband = DeadbandFilter(deadband_config.get("delta_celsius", 0.5),
+                                           deadband_config.get("max_seconds", 300))
+        
+        # 后台写入线程：采样线程只把记录放进有界队列，按批写入存储和聚合
+        self.writer = None
+        self._writer_failed = False
+        if self.agent_mode:
+            from aggregator import AgentClient
+            self.writer = AgentClient(agent_config.get("collector", "127.0.0.1:8766"), agent_config.get("host"),
+                                      batch_size=agent_config.get("batch_size", 50),
+                                      batch_seconds=agent_config.get("batch_seconds", 1.0),
+                                      queue_size=agent_config.get("queue_size", 10000),
+                                      max_inflight=agent_config.get("max_inflight", 4),
+                                      metrics=self.metrics)
+        elif self.config.get("auto_save", True):
+            writer_config = self.config.get("writer", {})
+            self.writer = BackgroundWriter(self.storage, self.rollups,
+                                           queue_size=writer_config.get("queue_size", 1000),
+                                           batch_size=writer_config.get("batch_size", 50),
+                                           batch_seconds=writer_config.get("batch_seconds", 1.0),
+                                           overflow=writer_config.get("overflow", "block"),
+                                           spill_path=writer_config.get("spill_file"),
+                                           deadband=self.deadband,
+                                           metrics=self.metrics)
+        
+        # 传感器注册表和最近读数的列式缓冲；写本地存储时传感器的标签和单位保存在数据旁边
+        self.sensor_registry = SensorRegistry(self.config.get("host"))
+        self._sensors_path = None
+        if self.writer is not None and not self.agent_mode:
+            self._sensors_path = sensors_path_for(self.storage.location)
+            self.sensor_registry.load(self._sensors_path)
+        self._saved_sensors = len(self.sensor_registry)
+        telemetry_config = self.config.get("telemetry", {})
+        buffer_rows = self.config.get("buffer_rows", 3600)
+        if telemetry_config.get("enabled", False):
+            buffer_rows = max(buffer_rows, telemetry_config.get("recent_samples", 3600))
+        self.sensor_buffer = ColumnBuffer(self.sensor_registry, buffer_rows)
+        self._sensor_labels = {}
+        
+        # 可选的本地HTTP接口：范围查询（最近的样本从列式缓冲读取）和新样本推送
+        self.telemetry = None
+        if telemetry_config.get("enabled", False):
+            from telemetry_server import TelemetryServer
+            self.telemetry = TelemetryServer(self.storage.location if self.storage is not None else None,
+                                             self.sensor_buffer,
+                                             telemetry_config.get("host", "127.0.0.1"),
+                                             telemetry_config.get("port", 8765),
+                                             telemetry_config.get("allowed_origins", []))
+        
+        # 流式告警：阈值（带回差）、变化率和 z-score 异常检测
+        self.alerts = create_alert_engine(self.config)
+        
+        # 传感器后端: auto(Linux上使用sysfs) / sysfs / windows
+        self.sysfs = None
+        backend = self.config.get("sensor_backend", "auto")
+        if backend == "sysfs" or (backend == "auto" and sys.platform.startswith("linux")):
+            self.sysfs = SysfsSensorBackend(self.config.get("sysfs_root", "/"))
+            print(f"使用sysfs温度后端，发现 {len(self.sysfs.sensors)} 个温度传感器")
+            for sensor in self.sysfs.sensors:
+                self._sensor_labels[sensor.id] = sensor.labels
+        
+        # 探测模式: subprocess(每次采样启动新进程) 或 session(常驻子进程，持续读取)
+        self.sessions = None
+        if self.config.get("probe_mode", "subprocess") == "session":
+            self.sessions = ProbeSessions(self.config.get("probe_sessions", {}))
+        
+        # 每个组件可以有自己的采样间隔（秒，支持小于1秒），未配置的组件使用 interval_seconds
+        self.sample_intervals = {component: self.config.get("sample_intervals", {}).get(component, self.interval)
+                                 for component, enabled in self.monitor_components.items() if enabled}
+        self.late_tolerance = self.config.get("late_tolerance_seconds", 0.02)
+        
+        # 自适应采样：读数稳定时按指数拉长采样间隔，读数变化或接近阈值时回到最短间隔
+        self.adaptive = None
+        adaptive_config = self.config.get("adaptive_sampling", {})
+        if adaptive_config.get("enabled", False):
+            self.adaptive = {
+                component: AdaptiveInterval(adaptive_config.get("min_interval_seconds", interval),
+                                            adaptive_config.get("max_interval_seconds", 60),
+                                            backoff=adaptive_config.get("backoff", 2.0),
+                                            change_threshold=adaptive_config.get("change_threshold", 0.5),
+                                            hot_threshold=self._hot_threshold(component, adaptive_config))
+                for component, interval in self.sample_intervals.items()}
+            # 从最短间隔开始
+            self.sample_intervals = {component: controller.interval for component, controller in self.adaptive.items()}
+        
+        self.scheduler = None
+        self._stop_requested = False
+        
+        # 并行采样：每次采样的截止时间默认等于采样间隔
+        self.tick_deadline = self.config.get("tick_deadline_seconds", self.interval)
+        self.executor = ThreadPoolExecutor(max_workers=self.config.get("sampling_workers", 8),
+                                           thread_name_prefix="probe")
+        self._inflight = {}
+        
+        # GPU方法选择缓存：记住可用的方法，失败的方法按指数退避跳过
+        backoff = self.config.get("probe_backoff", {})
+        self.gpu_probe_cache = ProbeCache(backoff_base=backoff.get("base_seconds", 10),
+                                          backoff_max=backoff.get("max_seconds", 600), metrics=self.metrics)
+        
     def load_config(self, config_file):
         """加载配置文件"""
         try:
@@ -32,114 +177,170 @@ class TemperatureMonitor:
             print(f"加载配置文件失败: {e}")
             return {}
     
+    @staticmethod
+    def parse_thermal_zone_lines(lines):
+        """解析热区温度输出（不含标题行），返回第一个合理的摄氏温度"""
+        for line in lines:
+            line = line.strip()
+            if line and line.isdigit():
+                temp_raw = float(line)
+                
+                if temp_raw > 2000:  # 开尔文*10格式
+                    temp_kelvin = temp_raw / 10.0
+                    temp_celsius = temp_kelvin - 273.15
+                elif temp_raw > 200:  # 开尔文格式
+                    temp_celsius = temp_raw - 273.15
+                else:  # 摄氏度格式
+                    temp_celsius = temp_raw
+                
+                if 0 < temp_celsius < 150:  # 合理的温度范围
+                    return round(temp_celsius, 2)
+        return None
+    
+    @staticmethod
+    def parse_acpi_lines(lines, low=0, high=150):
+        """解析 MSAcpi_ThermalZoneTemperature 输出（不含标题行，开尔文*10格式）"""
+        for line in lines:
+            line = line.strip()
+            if line and line.isdigit():
+                temp_raw = float(line)
+                if temp_raw > 2000:
+                    temp_celsius = (temp_raw / 10.0) - 273.15
+                    if low < temp_celsius < high:
+                        return round(temp_celsius, 2)
+        return None
+    
     def get_cpu_temperature(self):
-        """使用test_cpu_simple.py中的方法获取CPU温度"""
+        """使用test_cpu_simple.py中的方法获取CPU温度（sysfs后端返回每个传感器的读数 {传感器id: 温度}）"""
+        if self.sysfs is not None:
+            return self.sysfs.cpu_readings()
+        
         try:
+            if self.sessions is not None:
+                return self.parse_thermal_zone_lines(
+                    self.sessions.powershell.query(PS_THERMAL_ZONE_QUERY, self.sessions.query_timeout))
+            
             result = subprocess.run(['wmic', 'path', 'win32_perfrawdata_counters_thermalzoneinformation', 'get', 'temperature'], 
                                   capture_output=True, text=True, timeout=5)
             if result.returncode == 0:
                 lines = result.stdout.strip().split('\n')
-                for line in lines[1:]:  # 跳过标题行
-                    line = line.strip()
-                    if line and line.isdigit():
-                        temp_raw = float(line)
-                        
-                        if temp_raw > 2000:  # 开尔文*10格式
-                            temp_kelvin = temp_raw / 10.0
-                            temp_celsius = temp_kelvin - 273.15
-                        elif temp_raw > 200:  # 开尔文格式
-                            temp_celsius = temp_raw - 273.15
-                        else:  # 摄氏度格式
-                            temp_celsius = temp_raw
-                        
-                        if 0 < temp_celsius < 150:  # 合理的温度范围
-                            return round(temp_celsius, 2)
+                return self.parse_thermal_zone_lines(lines[1:])  # 跳过标题行
         except Exception as e:
-            print(f"获取CPU温度失败: {e}")
+            self.log.warning("获取CPU温度失败", method="ThermalZone", error=e)
         
         return None
     
+    def _nvidia_readings(self, temps_by_index):
+        """把 {GPU序号: 温度} 转换为 {传感器id: 温度}，并记录设备序号标签"""
+        readings = {}
+        for index, temp in temps_by_index.items():
+            if 0 < temp < 150:
+                sensor_id = make_sensor_id("gpu", "nvidia", index)
+                self._sensor_labels.setdefault(sensor_id, {"driver": "nvidia", "device_index": index})
+                readings[sensor_id] = round(temp, 2)
+        return readings or None
+    
     def get_nvidia_gpu_temp_via_smi(self):
-        """通过nvidia-smi获取NVIDIA GPU温度"""
+        """通过nvidia-smi获取每块NVIDIA GPU的温度 {传感器id: 温度}"""
+        if self.sessions is not None:
+            # 长驻的 nvidia-smi --loop-ms 进程持续输出每块GPU的温度
+            readings = self.sessions.nvidia_smi.readings(self.sessions.max_age)
+            return self._nvidia_readings({index: temp for index, (temp, _) in readings.items()})
+        
         try:
-            result = subprocess.run(['nvidia-smi', '--query-gpu=temperature.gpu', '--format=csv,noheader,nounits'], 
+            result = subprocess.run(['nvidia-smi'] + NVIDIA_SMI_QUERY, 
                                   capture_output=True, text=True, timeout=10)
             if result.returncode == 0:
-                temps = []
+                temps = {}
                 for line in result.stdout.strip().split('\n'):
-                    line = line.strip()
-                    if line and line.replace('.', '').isdigit():
-                        temp = float(line)
-                        if 0 < temp < 150:
-                            temps.append(temp)
-                
-                if temps:
-                    return round(max(temps), 2)  # 返回最高温度
+                    try:
+                        parsed = parse_nvidia_smi_line(line)
+                    except ValueError:
+                        continue
+                    if parsed is not None:
+                        temps[parsed[0]] = parsed[1]
+                return self._nvidia_readings(temps)
         except FileNotFoundError:
             # nvidia-smi 不存在
             pass
         except Exception as e:
-            print(f"nvidia-smi获取GPU温度失败: {e}")
+            self.log.warning("获取GPU温度失败", method="NVIDIA-SMI", error=e)
         
         return None
     
     def get_amd_gpu_temp_via_wmi(self):
         """通过WMI获取AMD GPU温度"""
         try:
+            if self.sessions is not None:
+                return self.parse_acpi_lines(
+                    self.sessions.powershell.query(PS_ACPI_QUERY, self.sessions.query_timeout))
+            
             # 尝试获取AMD GPU传感器信息
             result = subprocess.run(['wmic', 'path', 'MSAcpi_ThermalZoneTemperature', 'get', 'CurrentTemperature'], 
                                   capture_output=True, text=True, timeout=10)
             if result.returncode == 0:
+                # WMI温度通常是开尔文*10
                 lines = result.stdout.strip().split('\n')
-                for line in lines[1:]:
-                    line = line.strip()
-                    if line and line.isdigit():
-                        # WMI温度通常是开尔文*10
-                        temp_raw = float(line)
-                        if temp_raw > 2000:
-                            temp_celsius = (temp_raw / 10.0) - 273.15
-                            if 0 < temp_celsius < 150:
-                                return round(temp_celsius, 2)
+                return self.parse_acpi_lines(lines[1:])
         except Exception as e:
-            print(f"WMI获取GPU温度失败: {e}")
+            self.log.warning("获取GPU温度失败", method="WMI", error=e)
         
         return None
     
+    @staticmethod
+    def parse_ohm_lines(lines):
+        """解析 PS_OHM_GPU_QUERY 的输出，返回 {传感器标识: (名称, 温度)}，忽略不合理的读数"""
+        sensors = {}
+        for line in lines:
+            parts = line.strip().split('|')
+            if len(parts) != 3:
+                continue
+            identifier, name, value = parts
+            try:
+                temp = float(value)
+            except ValueError:
+                continue
+            if identifier and 0 < temp < 150:
+                sensors[identifier] = (name, temp)
+        return sensors
+    
     def get_gpu_temp_via_powershell(self):
-        """通过PowerShell获取GPU温度"""
+        """通过PowerShell查询OpenHardwareMonitor，返回每个GPU温度传感器的读数 {传感器id: 温度}"""
         try:
-            # 使用PowerShell查询GPU温度
-            ps_command = """
-            Get-WmiObject -Namespace "root/OpenHardwareMonitor" -Class Sensor | 
-            Where-Object {$_.SensorType -eq "Temperature" -and $_.Name -like "*GPU*"} | 
-            Select-Object Value
-            """
-            
-            result = subprocess.run(['powershell', '-Command', ps_command], 
-                                  capture_output=True, text=True, timeout=15)
+            if self.sessions is not None:
+                lines = self.sessions.powershell.query(PS_OHM_GPU_QUERY, self.sessions.query_timeout)
+            else:
+                result = subprocess.run(['powershell', '-Command', PS_OHM_GPU_QUERY], 
+                                      capture_output=True, text=True, timeout=15)
+                lines = result.stdout.splitlines() if result.returncode == 0 else []
             
-            if result.returncode == 0 and result.stdout.strip():
-                # 提取温度值
-                matches = re.findall(r'(\d+(?:\.\d+)?)', result.stdout)
-                if matches:
-                    temps = [float(match) for match in matches if 0 < float(match) < 150]
-                    if temps:
-                        return round(max(temps), 2)
+            readings = {}
+            for identifier, (name, temp) in self.parse_ohm_lines(lines).items():
+                # 标识例如 /nvidiagpu/0/temperature/0，在重启后保持不变
+                sensor_id = make_sensor_id("gpu", "ohm", identifier)
+                self._sensor_labels.setdefault(sensor_id, {"driver": "ohm", "sensor": name})
+                readings[sensor_id] = round(temp, 2)
+            return readings or None
         except Exception as e:
-            print(f"PowerShell获取GPU温度失败: {e}")
+            self.log.warning("获取GPU温度失败", method="PowerShell", error=e)
         
         return None
     
     def get_gpu_temp_via_wmic_gpu(self):
         """通过WMIC查询GPU信息"""
         try:
+            if self.sessions is not None:
+                # 会话模式下直接查询温度传感器，不再每次查询显卡名称
+                return self.parse_acpi_lines(
+                    self.sessions.powershell.query(PS_ACPI_QUERY, self.sessions.query_timeout), 30, 120)
+            
             # 查询显卡信息
             result = subprocess.run(['wmic', 'path', 'win32_videocontroller', 'get', 'name'], 
                                   capture_output=True, text=True, timeout=10)
             
             if result.returncode == 0:
                 gpu_info = result.stdout.strip()
-                print(f"检测到GPU: {gpu_info}")
+                self.log.debug("检测到GPU", name=gpu_info)
                 
                 # 尝试查询温度传感器
                 result2 = subprocess.run(['wmic', '/namespace:\\\\root\\wmi', 'path', 'MSAcpi_ThermalZoneTemperature', 'get', 'CurrentTemperature'], 
@@ -147,136 +348,409 @@ class TemperatureMonitor:
                 
                 if result2.returncode == 0:
                     lines = result2.stdout.strip().split('\n')
-                    for line in lines[1:]:
-                        line = line.strip()
-                        if line and line.isdigit():
-                            temp_raw = float(line)
-                            if temp_raw > 2000:
-                                temp_celsius = (temp_raw / 10.0) - 273.15
-                                if 30 < temp_celsius < 120:  # GPU合理温度范围
-                                    return round(temp_celsius, 2)
+                    return self.parse_acpi_lines(lines[1:], 30, 120)  # GPU合理温度范围
         except Exception as e:
-            print(f"WMIC GPU查询失败: {e}")
+            self.log.warning("获取GPU温度失败", method="WMIC", error=e)
         
         return None
     
-    def get_gpu_temperature(self):
-        """获取GPU温度 - 尝试多种方法"""
-        methods = [
+    def get_gpu_temp_via_sysfs(self):
+        """通过sysfs/hwmon获取每个GPU传感器的温度 {传感器id: 温度}（Linux）"""
+        return self.sysfs.gpu_readings()
+    
+    def get_gpu_methods(self):
+        """GPU温度获取方法列表（按优先级排序）"""
+        if self.sysfs is not None:
+            # Linux上没有WMI/PowerShell，只保留sysfs和nvidia-smi
+            return [
+                ("SYSFS", self.get_gpu_temp_via_sysfs),
+                ("NVIDIA-SMI", self.get_nvidia_gpu_temp_via_smi)
+            ]
+        return [
             ("NVIDIA-SMI", self.get_nvidia_gpu_temp_via_smi),
             ("PowerShell", self.get_gpu_temp_via_powershell),
             ("WMI", self.get_amd_gpu_temp_via_wmi),
             ("WMIC", self.get_gpu_temp_via_wmic_gpu)
         ]
+    
+    def _submit_gpu_probes(self):
+        """按方法选择缓存提交GPU探测"""
+        return self._submit_probes("gpu", self.gpu_probe_cache.select(self.get_gpu_methods()))
+    
+    def _resolve_gpu(self, probes, from_cache, deadline):
+        """等待GPU探测结果并更新缓存；缓存的方法不再返回数据时在本次采样内重新探测"""
+        result = self._pick_result("gpu", probes, deadline)
+        self._record_gpu_outcome(probes, result)
         
+        if result is None and from_cache and time.monotonic() < deadline:
+            self.log.warning("缓存的GPU方法未返回数据，重新探测", method=probes[0][0])
+            retry = [method for method in self.gpu_probe_cache.select(self.get_gpu_methods())
+                     if method[0] != probes[0][0]]
+            if retry:
+                probes = self._submit_probes("gpu", retry)
+                result = self._pick_result("gpu", probes, deadline)
+                self._record_gpu_outcome(probes, result)
+        return result
+    
+    def _record_gpu_outcome(self, probes, result):
+        """把探测结果写入方法选择缓存：成功方法之前的方法都视为失败（出错、无数据或超时）"""
+        winner = result[0] if result is not None else None
+        for method_name, _ in probes:
+            if method_name == winner:
+                self.gpu_probe_cache.record_success(method_name)
+                break
+            self.gpu_probe_cache.record_failure(method_name)
+    
+    def _timed_probe(self, component, method_name, method_func):
+        """执行一次探测，返回 ({传感器id: 温度} 或 None, 实际读取时间)
+        
+        探测方法可以返回单个温度（记为 "<组件>.<方法名>" 传感器），也可以返回每个传感器的读数。
+        """
+        started = time.perf_counter()
+        try:
+            temp = method_func()
+        except Exception:
+            self._count_probe(component, method_name, "failure")
+            raise
+        finally:
+            self.metrics.histogram("probe_latency_seconds", "单次探测的耗时",
+                                   component=component, method=method_name).observe(time.perf_counter() - started)
+        sampled_at = datetime.datetime.now().isoformat()
+        self._count_probe(component, method_name, "success" if temp else "failure")
+        if temp is None or isinstance(temp, dict):
+            return temp or None, sampled_at
+        return {make_sensor_id(component, method_name): temp}, sampled_at
+    
+    def _count_probe(self, component, method_name, result):
+        """探测结果计数：success / failure（出错或没有数据）/ timeout（截止时间前没有返回）"""
+        self.metrics.counter("probe_total", "探测次数，按结果区分",
+                             component=component, method=method_name, result=result).inc()
+    
+    def _submit_probes(self, component, methods):
+        """把探测方法提交到线程池，上一次还没结束的探测不会重复提交"""
+        probes = []
         for method_name, method_func in methods:
-            try:
-                temp = method_func()
+            future = self._inflight.get((component, method_name))
+            if future is None or future.done():
+                future = self.executor.submit(self._timed_probe, component, method_name, method_func)
+                self._inflight[(component, method_name)] = future
+            probes.append((method_name, future))
+        return probes
+    
+    def _pick_result(self, component, probes, deadline):
+        """等待探测结果直到截止时间，返回优先级最高的有效结果 (方法名, {传感器id: 温度}, 读取时间)"""
+        failed = set()
+        while True:
+            # 优先级更高的方法都已失败时直接采用当前结果，无需等待其余方法
+            for method_name, future in probes:
+                if not future.done():
+                    break
+                if method_name in failed:
+                    continue
+                try:
+                    temp, sampled_at = future.result()
+                except Exception as e:
+                    self.log.warning("探测方法失败", method=method_name, error=e)
+                    temp = None
                 if temp is not None:
-                    print(f"通过{method_name}获取到GPU温度: {temp}°C")
-                    return temp
-            except Exception as e:
-                print(f"{method_name}方法失败: {e}")
-                continue
+                    return method_name, temp, sampled_at
+                failed.add(method_name)
+            
+            pending = [future for _, future in probes if not future.done()]
+            remaining = deadline - time.monotonic()
+            if not pending or remaining <= 0:
+                break
+            wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
         
-        return None
+        # 已到截止时间：优先级更高的方法还没返回时，采用已完成的方法中优先级最高的结果
+        result = None
+        for method_name, future in probes:
+            if not future.done():
+                self.log.warning("探测方法超时", method=method_name)
+                self._count_probe(component, method_name, "timeout")
+            elif result is None and method_name not in failed and future.exception() is None:
+                temp, sampled_at = future.result()
+                if temp is not None:
+                    result = (method_name, temp, sampled_at)
+        return result
+    
+    def _cpu_methods(self):
+        cpu_method = "SYSFS" if self.sysfs is not None else "ThermalZone"
+        return [(cpu_method, self.get_cpu_temperature)]
     
-    def collect_temperature_data(self):
-        """收集温度数据"""
+    def _collect_component(self, component, deadline):
+        """采集一个组件直到截止时间（单调时钟），返回 (方法名, {传感器id: 温度}, 读取时间) 或 None"""
+        if component == "gpu":
+            from_cache = self.gpu_probe_cache.preferred is not None
+            return self._resolve_gpu(self._submit_gpu_probes(), from_cache, deadline)
+        return self._pick_result(component, self._submit_probes(component, self._cpu_methods()), deadline)
+    
+    def _build_record(self, tick_time, results):
+        """由各组件的采集结果生成一条记录"""
+        now = datetime.datetime.fromtimestamp(tick_time)
         data = {
-            "timestamp": datetime.datetime.now().isoformat(),
-            "temperatures": {}
+            "timestamp": now.isoformat(),
+            "temperatures": {},
+            "sensors": {},
+            "sampled_at": {}
         }
-        
-        if self.monitor_components.get("cpu", False):
-            cpu_temp = self.get_cpu_temperature()
-            if cpu_temp is not None:
-                data["temperatures"]["cpu"] = cpu_temp
-                print(f"CPU温度: {cpu_temp}°C")
+        for component, result in results.items():
+            if result is not None:
+                method_name, readings, sampled_at = result
+                # temperatures 保留每个组件的最高温度，兼容旧格式；sensors 保存每个传感器的读数
+                temp = max(readings.values())
+                data["temperatures"][component] = temp
+                data["sampled_at"][component] = sampled_at
+                for sensor_id, value in readings.items():
+                    self.sensor_registry.register(sensor_id, component, source=method_name,
+                                                  **self._sensor_labels.get(sensor_id, {}))
+                    data["sensors"][sensor_id] = value
             else:
-                print("无法获取CPU温度")
-        
-        if self.monitor_components.get("gpu", False):
-            gpu_temp = self.get_gpu_temperature()
-            if gpu_temp is not None:
-                data["temperatures"]["gpu"] = gpu_temp
-                print(f"GPU温度: {gpu_temp}°C")
-            else:
-                print("无法获取GPU温度 - 已尝试所有方法")
+                self.log.warning("无法获取温度", component=component)
         
+        self.sensor_buffer.append_row(to_epoch(now), data["sensors"])
+        if self._sensors_path is not None and len(self.sensor_registry) != self._saved_sensors:
+            self.save_sensor_metadata()
+        if data["temperatures"]:
+            self.log.info("采样", **data["temperatures"])
         return data
     
+    def save_sensor_metadata(self):
+        """出现新传感器时把注册表（标签、单位）写入数据旁边的 .sensors.json"""
+        try:
+            self.sensor_registry.save(self._sensors_path)
+            self._saved_sensors = len(self.sensor_registry)
+        except OSError as e:
+            self.log.error("保存传感器元数据失败", error=e)
+    
     def save_data(self, data):
-        """保存数据到文件"""
-        if not self.config.get("auto_save", True):
+        """保存数据到文件（交给后台写入线程，不等待磁盘I/O）
+
+        写入线程因无法重试的错误停止后记录无法保存：记录日志并计入 records_unsaved_total，
+        继续采样（告警、遥测和指标仍然工作）。
+        """
+        if self.writer is None:
             return
-        
+        started = time.perf_counter()
         try:
-            # 读取现有数据
-            existing_data = []
-            if Path(self.data_file).exists():
-                with open(self.data_file, 'r', encoding='utf-8') as f:
-                    existing_data = json.load(f)
-            
-            # 添加新数据
-            existing_data.append(data)
-            
-            # 保存数据
-            with open(self.data_file, 'w', encoding='utf-8') as f:
-                json.dump(existing_data, f, indent=2, ensure_ascii=False)
-                
-        except Exception as e:
-            print(f"保存数据失败: {e}")
+            self.writer.put(data)
+        except RuntimeError as e:
+            if not self._writer_failed:
+                self._writer_failed = True
+                print(f"无法保存数据，之后的记录不再保存: {e}")
+            self.log.error("保存数据失败", error=e)
+            self.metrics.counter("records_unsaved_total", "写入线程停止后无法保存的记录数").inc()
+            return
+        self.metrics.histogram("save_seconds", "采样线程中保存一条记录的耗时（放入写入队列）").observe(
+            time.perf_counter() - started)
+    
+    def _hot_threshold(self, component, adaptive_config):
+        """读数达到该温度时保持最短采样间隔：配置的 hot_threshold，
+        没有配置时使用告警中匹配该组件的阈值规则的最低 high 减去 threshold_margin"""
+        if adaptive_config.get("hot_threshold") is not None:
+            return adaptive_config["hot_threshold"]
+        if self.alerts is None:
+            return None
+        highs = [rule.high for rule in self.alerts.rules
+                 if rule.kind == "threshold" and rule.high is not None and rule.source == "temperatures"
+                 and rule.matches(component)]
+        if not highs:
+            return None
+        return min(highs) - adaptive_config.get("threshold_margin", 5)
+    
+    def _adapt_intervals(self, scheduler, results):
+        """根据本次采样的读数调整各组件的采样间隔"""
+        for component, result in results.items():
+            controller = self.adaptive.get(component)
+            if controller is None or result is None:
+                continue
+            interval = controller.update(result[1])
+            if interval != scheduler.intervals[component]:
+                scheduler.set_interval(component, interval)
+                self.log.debug("调整采样间隔", component=component, interval=interval)
+            self.metrics.gauge("sample_interval_seconds", "当前的采样间隔", component=component).set(interval)
+    
+    def check_alerts(self, data):
+        """用告警规则检查一条记录（只使用每个传感器固定大小的状态，不读取历史数据）"""
+        started = time.perf_counter()
+        events = self.alerts.process(data)
+        self.metrics.histogram("alert_eval_seconds", "每次采样检查告警规则的耗时").observe(time.perf_counter() - started)
+        for event in events:
+            self.metrics.counter("alerts_total", "告警事件数", rule=event["rule"], state=event["state"]).inc()
+    
+    def dump_metrics(self):
+        """按配置把监控指标写入文件（.json 或 Prometheus 文本格式）"""
+        path = self._metrics_config.get("dump_file")
+        if not path:
+            return
+        try:
+            self.metrics.dump(path)
+        except OSError as e:
+            self.log.error("保存监控指标失败", path=path, error=e)
+    
+    @staticmethod
+    def _handle_sigterm(signum, frame):
+        # 和 Ctrl+C 走同一条退出路径，写完队列中的记录后再退出
+        raise KeyboardInterrupt
     
     def test_gpu_methods(self):
         """测试所有GPU温度获取方法"""
         print("=== 测试GPU温度获取方法 ===")
         
-        methods = [
-            ("NVIDIA-SMI", self.get_nvidia_gpu_temp_via_smi),
-            ("PowerShell", self.get_gpu_temp_via_powershell),
-            ("WMI", self.get_amd_gpu_temp_via_wmi),
-            ("WMIC", self.get_gpu_temp_via_wmic_gpu)
-        ]
-        
-        for method_name, method_func in methods:
+        found = False
+        for method_name, method_func in self.get_gpu_methods():
             print(f"\n测试 {method_name} 方法:")
             try:
                 temp = method_func()
-                if temp is not None:
+                if isinstance(temp, dict):
+                    for sensor_id, value in temp.items():
+                        print(f"成功: {sensor_id} {value}°C")
+                    temp = temp or None
+                elif temp is not None:
                     print(f"成功: {temp}°C")
-                else:
+                if temp is None:
                     print(f"未获取到温度")
             except Exception as e:
+                temp = None
                 print(f"错误: {e}")
+            
+            # 记住第一个可用的方法，之后的采样直接使用
+            if temp is None:
+                self.gpu_probe_cache.record_failure(method_name)
+            elif not found:
+                self.gpu_probe_cache.record_success(method_name)
+                found = True
+        
+        if found:
+            print(f"\n之后将使用 {self.gpu_probe_cache.preferred} 方法获取GPU温度")
+    
+    def stop(self):
+        """让正在运行的 run() 在当前采样结束后返回（可以从其他线程调用）"""
+        self._stop_requested = True
+        if self.scheduler is not None:
+            self.scheduler.stop()
     
-    def run(self):
-        """运行温度监控"""
-        print(f"开始温度监控 (间隔: {self.interval}秒)")
-        print(f"监控组件: {', '.join([k for k, v in self.monitor_components.items() if v])}")
+    def run(self, max_ticks=None):
+        """运行温度监控，直到 Ctrl+C/SIGTERM、stop() 或触发了 max_ticks 次采样"""
+        if not self.sample_intervals:
+            print("没有启用任何监控组件")
+            return
+        print(f"开始温度监控 (间隔: {', '.join(f'{k} {v}秒' for k, v in self.sample_intervals.items())})")
         
         # 如果启用GPU监控，先测试GPU方法
         if self.monitor_components.get("gpu", False):
             self.test_gpu_methods()
         
+        if self.telemetry is not None:
+            self.telemetry.start()
+        if self.writer is not None:
+            self.writer.start()
+        if self.metrics_server is not None:
+            self.metrics_server.start()
+        if threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGTERM, self._handle_sigterm)
+        
         print("\n按 Ctrl+C 停止监控")
         
+        scheduler = self.scheduler = DeadlineScheduler(self.sample_intervals, self.late_tolerance)
+        if self._stop_requested:
+            scheduler.stop()
+        ticks = 0
+        # 每个组件在自己的线程中等待探测结果，慢的组件不会推迟其他组件的下一次采样
+        collectors = ThreadPoolExecutor(max_workers=len(self.sample_intervals), thread_name_prefix="collect")
+        collecting = {}
+        tick_duration = self.metrics.histogram("tick_duration_seconds", "一次采样从触发到放入写入队列的耗时")
+        tick_lateness = self.metrics.histogram("tick_lateness_seconds", "采样触发时间晚于计划时间的量")
+        dump_interval = self._metrics_config.get("dump_interval_seconds", 60)
+        next_dump = time.monotonic() + dump_interval
         try:
             while True:
-                print(f"\n--- {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')} ---")
+                tick = scheduler.wait()
+                if tick is None:
+                    break
+                ticks += 1
+                tick_time = time.time()
+                tick_lateness.observe(tick.lateness)
+                for component, skipped in tick.missed.items():
+                    self.log.warning("错过采样", component=component, missed=skipped,
+                                     lateness_ms=round(tick.lateness * 1000))
+                    self.metrics.counter("ticks_missed_total", "处理太慢而错过的计划采样次数",
+                                         component=component).inc(skipped)
                 
-                # 收集温度数据
-                data = self.collect_temperature_data()
+                for component in tick.due:
+                    if component in collecting:
+                        self.log.warning("上一次采样尚未完成，跳过本次采样", component=component)
+                        self.metrics.counter("ticks_skipped_total", "上一次采样还没完成而跳过的次数",
+                                             component=component).inc()
+                        continue
+                    deadline = tick.deadline + min(self.tick_deadline, scheduler.intervals[component])
+                    collecting[component] = collectors.submit(self._collect_component, component, deadline)
                 
-                # 保存数据
-                if data["temperatures"]:
-                    self.save_data(data)
+                # 最多等到下一次计划时间；没有完成的组件计入之后的记录（读取时间见 sampled_at）
+                wait(list(collecting.values()), timeout=scheduler.time_until_next())
+                results = {}
+                for component, future in list(collecting.items()):
+                    if future.done():
+                        del collecting[component]
+                        try:
+                            results[component] = future.result()
+                        except Exception as e:
+                            self.log.error("采样失败", component=component, error=e)
+                            results[component] = None
+                if results:
+                    # 收集温度数据
+                    data = self._build_record(tick_time, results)
+                    
+                    # 保存数据
+                    if data["temperatures"]:
+                        # 本地存储的死区压缩在写入线程中进行（聚合仍然包含每次采样）；
+                        # 采集端模式在发送前压缩，减少发送到汇总端的记录
+                        if not self.agent_mode or self.deadband is None or self.deadband.accept(data, tick_time):
+                            self.save_data(data)
+                        else:
+                            self.metrics.counter("records_suppressed_total", "死区压缩没有保存的记录数").inc()
+                        if self.telemetry is not None:
+                            self.telemetry.publish(data)
+                        if self.alerts is not None:
+                            self.check_alerts(data)
+                    if self.adaptive is not None:
+                        self._adapt_intervals(scheduler, results)
+                    tick_duration.observe(time.monotonic() - tick.fired_at)
                 
-                # 等待下一次监控
-                time.sleep(self.interval)
+                if time.monotonic() >= next_dump:
+                    self.dump_metrics()
+                    next_dump = time.monotonic() + dump_interval
+                if max_ticks is not None and ticks >= max_ticks:
+                    break
                 
         except KeyboardInterrupt:
             print("\n\n监控已停止")
+        finally:
+            print(f"采样调度统计: {scheduler.stats()}")
+            if self.monitor_components.get("gpu", False):
+                print(f"GPU方法缓存统计: {self.gpu_probe_cache.stats()}")
+            collectors.shutdown(wait=False, cancel_futures=True)
+            if self.writer is not None:
+                self.writer.close()
+                print(f"写入统计: {self.writer.stats()}")
+            if self.deadband is not None:
+                print(f"死区压缩统计: {self.deadband.stats()}")
+            self.dump_metrics()
+            if self.metrics_server is not None:
+                self.metrics_server.close()
+            if self.telemetry is not None:
+                self.telemetry.close()
+            if self.alerts is not None:
+                self.alerts.close()
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            if self.sessions is not None:
+                self.sessions.close()
+            if self.sysfs is not None:
+                self.sysfs.close()
+            if self.storage is not None:
+                self.storage.close()
+            if self.rollups is not None:
+                self.rollups.close()
 
 if __name__ == "__main__":
     monitor = TemperatureMonitor()
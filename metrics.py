@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import bisect
+import threading
+from pathlib import Path
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# 延迟直方图的默认桶上限（秒），覆盖 sysfs 的微秒级读取到子进程探测的数秒
+LATENCY_BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+PREFIX = "tempmon_"
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels, extra=None):
+    items = list(labels) + ([extra] if extra else [])
+    if not items:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in items) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return repr(value)
+
+
+class Counter:
+    def __init__(self, lock):
+        self._lock = lock
+        self.value = 0
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+
+class Gauge:
+    def __init__(self, lock):
+        self._lock = lock
+        self.value = 0
+
+    def set(self, value):
+        self.value = value
+
+
+class Histogram:
+    """累计桶直方图（与 Prometheus 的 histogram 相同），observe 只做一次二分查找"""
+
+    def __init__(self, lock, buckets):
+        self._lock = lock
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def cumulative(self):
+        total = 0
+        result = []
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+
+class MetricsRegistry:
+    """进程内的监控指标：计数器、仪表和直方图，按名称和标签区分
+
+    counter()/gauge()/histogram() 返回同一个名称和标签对应的同一个对象，调用方可以保存下来重复使用。
+    render() 输出 Prometheus 文本格式，snapshot() 输出可以保存为JSON的字典。
+    """
+
+    def __init__(self, prefix=PREFIX):
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._families = {}  # 名称 -> (类型, 说明, {标签: 指标})
+
+    def _get(self, kind, name, help_text, labels, factory):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            family = self._families.get(name)
+            if family is None:
+                family = self._families[name] = (kind, help_text, {})
+            elif family[0] != kind:
+                raise ValueError(f"指标 {name} 已经注册为 {family[0]}")
+            metric = family[2].get(key)
+            if metric is None:
+                metric = family[2][key] = factory()
+            return metric
+
+    def counter(self, name, help_text="", **labels):
+        return self._get("counter", name, help_text, labels, lambda: Counter(self._lock))
+
+    def gauge(self, name, help_text="", **labels):
+        return self._get("gauge", name, help_text, labels, lambda: Gauge(self._lock))
+
+    def histogram(self, name, help_text="", buckets=LATENCY_BUCKETS, **labels):
+        return self._get("histogram", name, help_text, labels, lambda: Histogram(self._lock, buckets))
+
+    def render(self):
+        """Prometheus 文本格式（exposition format 0.0.4）"""
+        lines = []
+        with self._lock:
+            families = [(name, kind, help_text, list(metrics.items()))
+                        for name, (kind, help_text, metrics) in sorted(self._families.items())]
+        for name, kind, help_text, metrics in families:
+            full_name = self.prefix + name
+            if help_text:
+                lines.append(f"# HELP {full_name} {help_text}")
+            lines.append(f"# TYPE {full_name} {kind}")
+            for labels, metric in sorted(metrics, key=lambda item: item[0]):
+                if kind == "histogram":
+                    for bound, total in metric.cumulative():
+                        lines.append(f"{full_name}_bucket{_format_labels(labels, ('le', _format_value(float(bound))))} {total}")
+                    lines.append(f"{full_name}_sum{_format_labels(labels)} {_format_value(float(metric.sum))}")
+                    lines.append(f"{full_name}_count{_format_labels(labels)} {metric.count}")
+                else:
+                    lines.append(f"{full_name}{_format_labels(labels)} {_format_value(metric.value)}")
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self):
+        """所有指标的当前值：{名称: [{labels, value}]}，直方图的值为 count/sum/buckets"""
+        result = {}
+        with self._lock:
+            families = [(name, kind, list(metrics.items())) for name, (kind, _, metrics) in self._families.items()]
+        for name, kind, metrics in sorted(families):
+            entries = []
+            for labels, metric in sorted(metrics, key=lambda item: item[0]):
+                if kind == "histogram":
+                    value = {"count": metric.count, "sum": metric.sum,
+                             "buckets": [[_format_value(float(bound)), total] for bound, total in metric.cumulative()]}
+                else:
+                    value = metric.value
+                entries.append({"labels": dict(labels), "value": value})
+            result[name] = entries
+        return result
+
+    def dump(self, path):
+        """写入文件（先写临时文件再替换）：.json 为 snapshot()，其他扩展名为 Prometheus 文本格式，
+        可以直接交给 node_exporter 的 textfile collector"""
+        path = Path(path)
+        if path.suffix == ".json":
+            text = json.dumps(self.snapshot(), ensure_ascii=False, indent=2)
+        else:
+            text = self.render()
+        temp_path = Path(str(path) + ".tmp")
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        os.replace(temp_path, path)
+
+
+class MetricsServer:
+    """在本地端口上提供 GET /metrics（Prometheus 文本格式）"""
+
+    def __init__(self, registry, host="127.0.0.1", port=9108):
+        handler = type("MetricsHandler", (_MetricsHandler,), {"registry": registry})
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+        self.httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def address(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/metrics"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="metrics-server", daemon=True)
+        self._thread.start()
+        print(f"监控指标接口已启动: {self.address}")
+
+    def close(self):
+        if self._thread is not None:
+            self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_response(404)
+            self.end_headers()
+            return
+        body = self.registry.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+
+import time
+
+from metrics import MetricsRegistry
+
+
+class ProbeCache:
+    """探测方法选择缓存
+
+    记住上一次成功的方法，之后只调用该方法；失败的方法进入负缓存，
+    按指数退避时间跳过，只有当缓存的方法不再返回数据时才重新探测。
+    命中和未命中次数同时计入 probe_cache_hits_total / probe_cache_misses_total（按组件区分）。
+    """
+
+    def __init__(self, backoff_base=10.0, backoff_max=600.0, clock=time.monotonic, metrics=None, component="gpu"):
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.clock = clock
+
+        self.preferred = None
+        self._failures = {}  # 方法名 -> (连续失败次数, 下次允许重试的时间)
+
+        self.hits = 0
+        self.misses = 0
+        metrics = metrics if metrics is not None else MetricsRegistry()
+        self._hits = metrics.counter("probe_cache_hits_total", "缓存的探测方法再次成功的次数", component=component)
+        self._misses = metrics.counter("probe_cache_misses_total", "没有可用的缓存方法、需要探测多个方法的次数",
+                                       component=component)
+
+    def is_backed_off(self, name):
+        """方法是否还处于退避期"""
+        failure = self._failures.get(name)
+        return failure is not None and self.clock() < failure[1]
+
+    def select(self, methods):
+        """返回本次需要调用的方法列表（保持原有优先级顺序）"""
+        if self.preferred is not None:
+            for method in methods:
+                if method[0] == self.preferred:
+                    return [method]
+
+        self.misses += 1
+        self._misses.inc()
+        candidates = [method for method in methods if not self.is_backed_off(method[0])]
+        # 所有方法都在退避期时仍然全部尝试，避免完全拿不到数据
+        return candidates or list(methods)
+
+    def record_success(self, name):
+        """记录一次成功"""
+        if name == self.preferred:
+            self.hits += 1
+            self._hits.inc()
+        self.preferred = name
+        self._failures.pop(name, None)
+
+    def record_failure(self, name):
+        """记录一次失败，缓存的方法失败时清除缓存"""
+        if name == self.preferred:
+            self.preferred = None
+
+        count = self._failures.get(name, (0, 0))[0] + 1
+        delay = min(self.backoff_base * (2 ** (count - 1)), self.backoff_max)
+        self._failures[name] = (count, self.clock() + delay)
+
+    def stats(self):
+        """返回缓存命中统计"""
+        now = self.clock()
+        return {
+            "preferred": self.preferred,
+            "hits": self.hits,
+            "misses": self.misses,
+            "backed_off": {name: round(retry_at - now, 1)
+                           for name, (_, retry_at) in self._failures.items() if retry_at > now},
+        }
@@ -0,0 +1,421 @@
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import json
+import math
+import datetime
+from pathlib import Path
+
+# (名称, 桶宽度秒数)，从细到粗
+TIERS = (("1m", 60), ("1h", 3600), ("1d", 86400))
+EPOCH = datetime.datetime(1970, 1, 1)
+# 记录条数保存在这个键下（只有 count 有意义）
+RECORDS_KEY = "_records"
+
+
+def to_epoch(timestamp):
+    """把本地时间（datetime或ISO字符串，不带时区）转换为秒数，使日聚合按本地零点对齐"""
+    if isinstance(timestamp, str):
+        timestamp = datetime.datetime.fromisoformat(timestamp)
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.replace(tzinfo=None)
+    return (timestamp - EPOCH).total_seconds()
+
+
+def from_epoch(seconds):
+    """to_epoch 的逆运算，返回本地时间的 datetime"""
+    return EPOCH + datetime.timedelta(seconds=seconds)
+
+
+def rollup_dir_for(data_path):
+    """聚合文件保存在原始数据旁边：data.json -> data.rollups/，分段目录 -> 分段目录/rollups/"""
+    data_path = Path(data_path)
+    if data_path.is_dir():
+        return data_path / "rollups"
+    return data_path.with_suffix(".rollups")
+
+
+def tier_path(directory, tier_name):
+    return Path(directory) / f"rollup-{tier_name}.jsonl"
+
+
+def merge_stats(target, stats):
+    """合并两组 [count, sum, sumsq, min, max]"""
+    target[0] += stats[0]
+    target[1] += stats[1]
+    target[2] += stats[2]
+    target[3] = min(target[3], stats[3])
+    target[4] = max(target[4], stats[4])
+
+
+def merge_into(buckets, sensors):
+    """把 {传感器: 统计} 合并到 buckets 中"""
+    for key, stats in sensors.items():
+        current = buckets.get(key)
+        if current is None:
+            buckets[key] = list(stats)
+        else:
+            merge_stats(current, stats)
+
+
+def _line_at(f, offset):
+    """返回 offset 处或之后第一行的 (起始位置, 内容)"""
+    f.seek(max(offset - 1, 0))
+    if offset > 0:
+        f.readline()
+    return f.tell(), f.readline()
+
+
+def _bisect(f, size, target):
+    """聚合文件按时间排序，二分查找第一条 t >= target 的行的起始位置"""
+    lo, hi = 0, size
+    while lo < hi:
+        mid = (lo + hi) // 2
+        _, line = _line_at(f, mid)
+        if not line.endswith(b'\n') or json.loads(line)["t"] >= target:
+            hi = mid
+        else:
+            lo = mid + 1
+    return _line_at(f, lo)[0]
+
+
+def read_tier(path, start=-math.inf, end=math.inf):
+    """读取聚合文件中 start <= t < end 的桶，返回按时间排序的 [(桶开始时间, {传感器: 统计})]
+
+    用二分查找定位起始行，读取量只与结果大小有关。同一个桶的多行（程序重启造成）会被合并。
+    """
+    buckets = {}
+    path = Path(path)
+    if not path.exists() or start >= end:
+        return []
+    with open(path, 'rb') as f:
+        size = f.seek(0, os.SEEK_END)
+        f.seek(_bisect(f, size, start) if start > -math.inf else 0)
+        for line in f:
+            if not line.endswith(b'\n'):
+                break
+            entry = json.loads(line)
+            if entry["t"] >= end:
+                break
+            merge_into(buckets.setdefault(entry["t"], {}), entry["s"])
+    return sorted(buckets.items())
+
+
+def read_tier_first_t(path):
+    """返回聚合文件第一条记录的桶开始时间"""
+    path = Path(path)
+    if not path.exists():
+        return None
+    with open(path, 'rb') as f:
+        line = f.readline()
+    return json.loads(line)["t"] if line.endswith(b'\n') else None
+
+
+def _read_tail(path, min_t):
+    """从文件尾部向前读取所有 t >= min_t 的行"""
+    entries = []
+    if not Path(path).exists():
+        return entries
+    with open(path, 'rb') as f:
+        pos = f.seek(0, os.SEEK_END)
+        rest = b''
+        while pos > 0:
+            start = max(0, pos - 64 * 1024)
+            f.seek(start)
+            chunk = f.read(pos - start) + rest
+            pos = start
+            lines = chunk.split(b'\n')
+            # 第一行可能不完整，留到下一轮
+            rest = lines[0] if pos > 0 else b''
+            done = False
+            for line in reversed(lines[1:] if pos > 0 else lines):
+                if not line.strip():
+                    continue
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if entry["t"] < min_t:
+                    done = True
+                    break
+                entries.append(entry)
+            if done:
+                break
+    entries.reverse()
+    return entries
+
+
+def read_tier_last_t(path):
+    """返回聚合文件最后一条完整记录的桶开始时间"""
+    path = Path(path)
+    if not path.exists():
+        return None
+    with open(path, 'rb') as f:
+        pos = f.seek(0, os.SEEK_END)
+        block = 4096
+        while True:
+            start = max(0, pos - block)
+            f.seek(start)
+            lines = f.read(pos - start).split(b'\n')
+            if start > 0:
+                lines = lines[1:]
+            for line in reversed(lines):
+                try:
+                    return json.loads(line)["t"]
+                except ValueError:
+                    continue
+            if start == 0:
+                return None
+            block *= 4
+
+
+def _truncate_partial(path):
+    """截掉崩溃时写了一半的最后一行（每行一次写入，只有最后一行可能不完整）"""
+    if not path.exists():
+        return
+    with open(path, 'r+b') as f:
+        size = f.seek(0, os.SEEK_END)
+        pos = size
+        while pos > 0:
+            start = max(0, pos - 4096)
+            f.seek(start)
+            newline = f.read(pos - start).rfind(b'\n')
+            if newline >= 0:
+                pos = start + newline + 1
+                break
+            pos = start
+        if pos != size:
+            print(f"聚合文件 {path.name} 尾部有不完整记录，已截断 {size - pos} 字节")
+            f.truncate(pos)
+
+
+class RollupWriter:
+    """写入时增量维护的多分辨率聚合（1分钟 / 1小时 / 1天）
+
+    每个桶、每个传感器保存 [count, sum, sumsq, min, max]。原始样本只进入最细的一级，
+    一个桶结束时合并到上一级的当前桶并追加写入该级的文件，每个样本的开销是常数。
+    程序重启时，较粗一级的当前桶由更细一级已写入的桶重新计算，崩溃时最多丢失最后一分钟的聚合。
+    """
+
+    def __init__(self, directory, tiers=TIERS):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.tiers = tiers
+        for name, _ in tiers:
+            _truncate_partial(self.path_for(name))
+        self._files = [open(self.path_for(name), 'ab') for name, _ in tiers]
+        # 每一级当前（未结束）的桶: [桶开始时间, {传感器: 统计}]
+        self._open = [[None, {}] for _ in tiers]
+        self._recover()
+
+    def path_for(self, tier_name):
+        return tier_path(self.directory, tier_name)
+
+    def _recover(self):
+        """由细一级已写入的桶恢复较粗一级的当前桶
+
+        从最粗一级开始恢复：较细一级恢复时如果有已经结束的桶（例如程序停了一段时间），
+        会补写到上一级并合并进刚恢复的当前桶，不会重复计数。
+        """
+        for level in range(len(self.tiers) - 1, 0, -1):
+            name, size = self.tiers[level]
+            closed = read_tier_last_t(self.path_for(name))
+            min_t = closed + size if closed is not None else -math.inf
+            lower_name = self.tiers[level - 1][0]
+            for entry in _read_tail(self.path_for(lower_name), min_t):
+                self._merge(level, entry["t"], entry["s"])
+
+    def _write(self, level, t, sensors):
+        line = json.dumps({"t": t, "s": sensors}, separators=(',', ':')) + '\n'
+        self._files[level].write(line.encode('utf-8'))
+        self._files[level].flush()
+
+    def _close_bucket(self, level):
+        t, sensors = self._open[level]
+        if t is None:
+            return
+        self._write(level, t, sensors)
+        if level + 1 < len(self.tiers):
+            self._merge(level + 1, t, sensors)
+        self._open[level] = [None, {}]
+
+    def _merge(self, level, t, sensors):
+        size = self.tiers[level][1]
+        bucket = math.floor(t / size) * size
+        if self._open[level][0] is not None and self._open[level][0] != bucket:
+            self._close_bucket(level)
+        self._open[level][0] = bucket
+        merge_into(self._open[level][1], sensors)
+
+    def add(self, timestamp, readings):
+        """加入一个样本，readings 为 {传感器: 温度}"""
+        t = to_epoch(timestamp)
+        size = self.tiers[0][1]
+        bucket = math.floor(t / size) * size
+        if self._open[0][0] is not None and self._open[0][0] != bucket:
+            self._close_bucket(0)
+        self._open[0][0] = bucket
+        buckets = self._open[0][1]
+        # 每个样本记一次，用于统计记录条数
+        records = buckets.get(RECORDS_KEY)
+        if records is None:
+            buckets[RECORDS_KEY] = [1, 0.0, 0.0, 0.0, 0.0]
+        else:
+            records[0] += 1
+        for key, value in readings.items():
+            if value is None:
+                continue
+            stats = buckets.get(key)
+            if stats is None:
+                buckets[key] = [1, value, value * value, value, value]
+            else:
+                stats[0] += 1
+                stats[1] += value
+                stats[2] += value * value
+                if value < stats[3]:
+                    stats[3] = value
+                if value > stats[4]:
+                    stats[4] = value
+
+    def close(self):
+        """写出最细一级的当前桶（重启后同一分钟的数据会在读取时合并）"""
+        t, sensors = self._open[0]
+        if t is not None:
+            self._write(0, t, sensors)
+        for f in self._files:
+            f.close()
+
+
+def collect_buckets(directory, start=None, end=None, tiers=TIERS):
+    """用尽量粗的桶覆盖 [start, end)
+
+    完整落在范围内且已经结束的粗桶直接使用，范围两端和最近尚未结束的部分用更细一级的桶补齐，
+    因此一年数据的汇总只需要读取几百个桶。精度为最细一级的桶宽度（1分钟）。
+    """
+    directory = Path(directory)
+    start = -math.inf if start is None else start
+    end = math.inf if end is None else end
+
+    def gather(level, lo, hi):
+        if lo >= hi:
+            return []
+        name, size = tiers[level]
+        path = tier_path(directory, name)
+        if level == 0:
+            return read_tier(path, lo, hi)
+
+        last = read_tier_last_t(path)
+        if last is None:
+            return gather(level - 1, lo, hi)
+        first_full = lo if lo == -math.inf else math.ceil(lo / size) * size
+        full_end = min(hi if hi == math.inf else math.floor(hi / size) * size, last + size)
+        if first_full >= full_end:
+            return gather(level - 1, lo, hi)
+        return (gather(level - 1, lo, first_full)
+                + read_tier(path, first_full, full_end)
+                + gather(level - 1, full_end, hi))
+
+    return gather(len(tiers) - 1, start, end)
+
+
+def summarize(buckets, key):
+    """由若干桶计算某个传感器的 count/mean/min/max/std"""
+    total = [0, 0.0, 0.0, math.inf, -math.inf]
+    for _, sensors in buckets:
+        stats = sensors.get(key)
+        if stats is not None:
+            merge_stats(total, stats)
+    count = total[0]
+    if count == 0:
+        return None
+    mean = total[1] / count
+    variance = max(total[2] / count - mean * mean, 0.0)
+    return {"count": count, "mean": mean, "min": total[3], "max": total[4], "std": math.sqrt(variance)}
+
+
+def choose_tier(start, end, min_buckets, tiers=TIERS):
+    """选择能在 [start, end] 内提供至少 min_buckets 个桶的最粗一级，没有合适的级别时返回 None"""
+    span = end - start
+    for name, size in reversed(tiers):
+        if span / size >= min_buckets:
+            return name, size
+    return None
+
+
+def series_buckets(directory, start, end, min_buckets, tiers=TIERS):
+    """绘制 [start, end) 的趋势曲线时使用的桶
+
+    选择至少能提供 min_buckets 个桶的最粗一级，范围两端用更细的桶补齐。
+    时间跨度太短（原始数据更合适）或没有数据时返回 None，否则返回 (级别名称, 桶列表)。
+    """
+    tier = choose_tier(start, end, min_buckets, tiers)
+    if tier is None:
+        return None
+    buckets = collect_buckets(directory, start, end, tiers[:tiers.index(tier) + 1])
+    return (tier[0], buckets) if buckets else None
+
+
+def rollup_extent(directory, data_path=None):
+    """返回聚合数据覆盖的时间范围 (开始, 结束) 秒数
+
+    没有聚合文件时返回 None。给出 data_path 时还会检查最早的原始记录是否在聚合范围内：
+    开启聚合之前记录的数据不在聚合文件中，此时不能用聚合数据代替原始数据。
+    """
+    finest = tier_path(directory, TIERS[0][0])
+    first = read_tier_first_t(finest)
+    last = read_tier_last_t(finest)
+    if first is None or last is None:
+        return None
+
+    if data_path is not None:
+        path = Path(data_path)
+        # 只有已归档的分段需要 data_loader（NumPy）读取，否则直接读开头的记录
+        if path.suffix == ".tca" or (path.is_dir() and any(path.glob("segment-*.tca"))):
+            from data_loader import iter_records
+        else:
+            from storage import iter_file_records as iter_records
+        try:
+            first_record = next(iter(iter_records(path)), None)
+            if first_record is not None and to_epoch(first_record["timestamp"]) < first:
+                print(f"聚合文件不包含最早的数据，可以运行 python rollups.py {data_path} 重新生成")
+                return None
+        except (OSError, ValueError, TypeError, KeyError):
+            return None
+    return first, last + TIERS[0][1]
+
+
+def rebuild(data_path, tiers=TIERS):
+    """由已有的原始数据重新生成聚合文件（开启聚合之前记录的数据需要先执行一次）"""
+    from data_loader import iter_records
+
+    directory = rollup_dir_for(data_path)
+    for name, _ in tiers:
+        tier_path(directory, name).unlink(missing_ok=True)
+
+    writer = RollupWriter(directory, tiers)
+    count = 0
+    try:
+        for entry in iter_records(data_path):
+            try:
+                readings = {**(entry.get("temperatures") or {}), **(entry.get("sensors") or {})}
+                writer.add(entry["timestamp"], readings)
+            except (TypeError, KeyError, ValueError, AttributeError):
+                continue
+            count += 1
+    finally:
+        writer.close()
+    return directory, count
+
+
+def main():
+    if len(sys.argv) != 2:
+        print("用法: python rollups.py <data.json 或分段目录>")
+        return
+
+    directory, count = rebuild(sys.argv[1])
+    print(f"已由 {count} 条记录生成聚合文件: {directory}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+
+import time
+import threading
+
+# 同一时刻（相差不超过这个秒数）到期的任务合并为一次触发
+COALESCE_SECONDS = 0.001
+# 睡眠的最后这段时间改为忙等，弥补系统定时器的粒度（Windows 上约15ms）
+SPIN_SECONDS = 0.002
+
+
+class Tick:
+    """一次调度触发：到期的任务、计划时间（单调时钟）和实际的延迟/错过次数"""
+
+    def __init__(self, deadline, fired_at, due, missed):
+        self.deadline = deadline
+        self.fired_at = fired_at
+        self.due = due
+        self.missed = missed  # {任务名: 因为上一次处理太慢而错过的次数}
+
+    @property
+    def lateness(self):
+        return self.fired_at - self.deadline
+
+
+class DeadlineScheduler:
+    """基于单调时钟的固定截止时间调度器
+
+    每个任务有自己的周期，第 k 次触发的计划时间是 起点 + k*周期，不依赖上一次处理花了多长时间，
+    所以不会累积漂移，系统时间被调整也不受影响。处理超过一个周期时跳过已经错过的计划时间
+    （记入 missed），而不是连续补触发；触发晚于计划时间 late_tolerance 以上记为 late。
+    """
+
+    def __init__(self, intervals, late_tolerance=0.02, clock=time.monotonic):
+        if not intervals:
+            raise ValueError("至少需要一个调度任务")
+        for name, interval in intervals.items():
+            if interval <= 0:
+                raise ValueError(f"{name} 的采样间隔必须大于0: {interval}")
+        self.intervals = dict(intervals)
+        self.late_tolerance = late_tolerance
+        self.clock = clock
+        self._stop = threading.Event()
+
+        start = clock()
+        # 第 k 次触发的计划时间为 起点 + k*周期；修改周期后起点移到上一次计划时间
+        self._anchors = {name: start for name in self.intervals}
+        self._counts = {name: 0 for name in self.intervals}  # 下一次触发的序号 k
+        self._stats = {name: {"ticks": 0, "missed": 0, "late": 0, "max_lateness": 0.0, "total_lateness": 0.0}
+                       for name in self.intervals}
+
+    def _due_time(self, name):
+        return self._anchors[name] + self._counts[name] * self.intervals[name]
+
+    def set_interval(self, name, interval):
+        """修改一个任务的周期（用于自适应采样）：下一次触发为上一次计划时间 + 新周期，之后按新周期对齐"""
+        if interval <= 0:
+            raise ValueError(f"{name} 的采样间隔必须大于0: {interval}")
+        if interval == self.intervals[name]:
+            return
+        if self._counts[name]:
+            self._anchors[name] = self._due_time(name) - self.intervals[name]
+            self._counts[name] = 1
+        self.intervals[name] = interval
+
+    def next_deadline(self):
+        return min(self._due_time(name) for name in self.intervals)
+
+    def time_until_next(self):
+        return max(self.next_deadline() - self.clock(), 0.0)
+
+    def _sleep_until(self, deadline):
+        """睡眠到 deadline；stop() 被调用时提前返回 False"""
+        while True:
+            remaining = deadline - self.clock()
+            if remaining <= 0:
+                return not self._stop.is_set()
+            if remaining > SPIN_SECONDS:
+                if self._stop.wait(remaining - SPIN_SECONDS):
+                    return False
+            else:
+                time.sleep(0)
+
+    def wait(self):
+        """等待下一次触发并返回 Tick；调度器已停止时返回 None"""
+        deadline = self.next_deadline()
+        if not self._sleep_until(deadline):
+            return None
+        now = self.clock()
+
+        due = []
+        missed = {}
+        for name, interval in self.intervals.items():
+            scheduled = self._due_time(name)
+            if scheduled > deadline + COALESCE_SECONDS:
+                continue
+            # 已经错过的计划时间直接跳过，下一次触发仍然对齐到 起点 + k*周期
+            skipped = max(int((now - scheduled) // interval), 0)
+            self._counts[name] += skipped + 1
+            stats = self._stats[name]
+            lateness = now - (scheduled + skipped * interval)
+            stats["ticks"] += 1
+            stats["total_lateness"] += lateness
+            stats["max_lateness"] = max(stats["max_lateness"], lateness)
+            if lateness > self.late_tolerance:
+                stats["late"] += 1
+            if skipped:
+                stats["missed"] += skipped
+                missed[name] = skipped
+            due.append(name)
+        return Tick(deadline, now, due, missed)
+
+    def stop(self):
+        """让正在等待的 wait() 立即返回 None（可以从其他线程或信号处理函数调用）"""
+        self._stop.set()
+
+    @property
+    def stopped(self):
+        return self._stop.is_set()
+
+    def stats(self):
+        """每个任务的触发次数、错过次数、迟到次数和平均/最大延迟（毫秒）"""
+        result = {}
+        for name, stats in self._stats.items():
+            ticks = stats["ticks"]
+            result[name] = {
+                "interval": self.intervals[name],
+                "ticks": ticks,
+                "missed": stats["missed"],
+                "late": stats["late"],
+                "mean_lateness_ms": round(stats["total_lateness"] / ticks * 1000, 3) if ticks else 0.0,
+                "max_lateness_ms": round(stats["max_lateness"] * 1000, 3),
+            }
+        return result
@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+
+import time
+import queue
+import datetime
+import threading
+import subprocess
+
+NVIDIA_SMI_QUERY = ['--query-gpu=index,temperature.gpu', '--format=csv,noheader,nounits']
+POWERSHELL_COMMAND = ['powershell', '-NoLogo', '-NoProfile', '-NonInteractive', '-Command', '-']
+
+
+class _ChildProcess:
+    """长驻子进程的公共部分：启动、退出检测和自动重启"""
+
+    def __init__(self, command, restart_delay=1.0):
+        self.command = command
+        self.restart_delay = restart_delay
+        self.process = None
+        self.spawns = 0
+        self._last_start = None
+        self._spawn_lock = threading.Lock()
+
+    def _spawn(self):
+        raise NotImplementedError
+
+    def _on_started(self, process):
+        pass
+
+    def is_running(self):
+        return self.process is not None and self.process.poll() is None
+
+    def ensure_running(self):
+        """子进程退出后自动重启，两次启动之间至少间隔 restart_delay 秒"""
+        with self._spawn_lock:
+            return self._ensure_running()
+
+    def _ensure_running(self):
+        if self.is_running():
+            return True
+        now = time.monotonic()
+        if self._last_start is not None and now - self._last_start < self.restart_delay:
+            return False
+
+        self._last_start = now
+        if self.process is not None:
+            print(f"子进程 {self.command[0]} 已退出 (返回码 {self.process.returncode})，正在重启")
+        try:
+            self.process = self._spawn()
+        except OSError as e:
+            print(f"启动子进程 {self.command[0]} 失败: {e}")
+            self.process = None
+            return False
+        self.spawns += 1
+        self._on_started(self.process)
+        return True
+
+    def close(self):
+        """结束子进程"""
+        process, self.process = self.process, None
+        if process is None or process.poll() is not None:
+            return
+        process.terminate()
+        try:
+            process.wait(timeout=2)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+class StreamingSession(_ChildProcess):
+    """持续输出读数的长驻子进程（例如 nvidia-smi --loop-ms）
+
+    parse_line 把一行输出解析为 (键, 温度)，无法解析时返回 None。
+    每个键只保留最新的读数。只有第一次调用 readings() 时等待子进程输出第一条读数，
+    之后（包括子进程一直没有输出或重启期间）立即返回当前缓存的读数。
+    """
+
+    def __init__(self, command, parse_line, restart_delay=1.0):
+        super().__init__(command, restart_delay)
+        self.parse_line = parse_line
+        self._latest = {}
+        self._lock = threading.Lock()
+        self._has_reading = threading.Event()
+        self._warmed_up = False
+
+    def _spawn(self):
+        return subprocess.Popen(self.command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                stdin=subprocess.DEVNULL, text=True, bufsize=1)
+
+    def _on_started(self, process):
+        threading.Thread(target=self._read_loop, args=(process,), daemon=True).start()
+
+    def _read_loop(self, process):
+        for line in process.stdout:
+            try:
+                parsed = self.parse_line(line)
+            except ValueError:
+                parsed = None
+            if parsed is None:
+                continue
+            key, value = parsed
+            with self._lock:
+                self._latest[key] = (value, time.monotonic(), datetime.datetime.now().isoformat())
+            self._has_reading.set()
+
+    def readings(self, max_age):
+        """返回不超过 max_age 秒的最新读数 {键: (温度, 读取时间)}"""
+        self.ensure_running()
+        if not self._warmed_up:
+            # 会话刚启动时等待第一条读数（只等一次，不输出的子进程不会拖慢之后的每次采样）
+            self._warmed_up = True
+            self._has_reading.wait(timeout=max_age)
+        now = time.monotonic()
+        with self._lock:
+            return {key: (value, sampled_at) for key, (value, received, sampled_at) in self._latest.items()
+                    if now - received <= max_age}
+
+
+class ReplSession(_ChildProcess):
+    """通过stdin发送命令的长驻交互式子进程（例如 PowerShell）
+
+    每条命令后追加一条输出结束标记的命令，读取到标记即认为本次输出结束。
+    """
+
+    SENTINEL = "__PROBE_END__"
+
+    def __init__(self, command, sentinel_command="Write-Output '{sentinel}'", restart_delay=1.0):
+        super().__init__(command, restart_delay)
+        self.sentinel_command = sentinel_command.format(sentinel=self.SENTINEL)
+        self._lines = None
+        self._lock = threading.Lock()
+
+    def _spawn(self):
+        return subprocess.Popen(self.command, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                stderr=subprocess.DEVNULL, text=True, bufsize=1)
+
+    def _on_started(self, process):
+        self._lines = queue.Queue()
+        threading.Thread(target=self._read_loop, args=(process, self._lines), daemon=True).start()
+
+    @staticmethod
+    def _read_loop(process, lines):
+        for line in process.stdout:
+            lines.put(line.rstrip('\r\n'))
+        lines.put(None)
+
+    def query(self, command, timeout=5.0):
+        """执行一条命令并返回输出的各行，超时后结束子进程（下次调用时重启）"""
+        # 交互式解释器按行执行，多行命令合并为一行
+        command = ' '.join(line.strip() for line in command.strip().splitlines())
+
+        with self._lock:
+            if not self.ensure_running():
+                raise RuntimeError(f"子进程 {self.command[0]} 不可用")
+
+            # 丢弃上一次超时遗留的输出
+            while not self._lines.empty():
+                self._lines.get_nowait()
+
+            try:
+                self.process.stdin.write(f"{command}\n{self.sentinel_command}\n")
+                self.process.stdin.flush()
+            except OSError as e:
+                self.close()
+                raise RuntimeError(f"向子进程 {self.command[0]} 发送命令失败: {e}")
+
+            output = []
+            deadline = time.monotonic() + timeout
+            while True:
+                remaining = deadline - time.monotonic()
+                try:
+                    line = self._lines.get(timeout=max(remaining, 0))
+                except queue.Empty:
+                    self.close()
+                    raise TimeoutError(f"子进程 {self.command[0]} 在 {timeout} 秒内没有返回结果")
+                if line is None:
+                    raise RuntimeError(f"子进程 {self.command[0]} 意外退出")
+                if line.strip() == self.SENTINEL:
+                    return output
+                output.append(line)
+
+
+def parse_nvidia_smi_line(line):
+    """解析 nvidia-smi 的一行输出 "index, temperature" """
+    parts = [part.strip() for part in line.split(',')]
+    if len(parts) != 2 or not parts[0].isdigit():
+        return None
+    return int(parts[0]), float(parts[1])
+
+
+class ProbeSessions:
+    """探测会话集合：一个 nvidia-smi 循环输出进程和一个 PowerShell 解释器"""
+
+    def __init__(self, session_config=None):
+        session_config = session_config or {}
+        loop_ms = session_config.get("nvidia_smi_loop_ms", 1000)
+        restart_delay = session_config.get("restart_delay_seconds", 1.0)
+
+        nvidia_smi_command = session_config.get("nvidia_smi_command") or \
+            ['nvidia-smi'] + NVIDIA_SMI_QUERY + [f'--loop-ms={loop_ms}']
+        powershell_command = session_config.get("powershell_command") or POWERSHELL_COMMAND
+
+        # 读数超过几个循环周期没有更新就视为过期
+        self.max_age = session_config.get("max_age_seconds", max(3 * loop_ms / 1000.0, 2.0))
+        self.query_timeout = session_config.get("query_timeout_seconds", 5.0)
+        self.nvidia_smi = StreamingSession(nvidia_smi_command, parse_nvidia_smi_line, restart_delay)
+        self.powershell = ReplSession(powershell_command, restart_delay=restart_delay)
+
+    def spawns(self):
+        """到目前为止启动子进程的总次数"""
+        return self.nvidia_smi.spawns + self.powershell.spawns
+
+    def close(self):
+        self.nvidia_smi.close()
+        self.powershell.close()
@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+
+import os
+import re
+import json
+import math
+import socket
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from pathlib import Path
+
+
+def make_sensor_id(*parts):
+    """由若干部分生成稳定的传感器id，例如 ("cpu", "coretemp", "Core 0") -> "cpu.coretemp.core_0" """
+    slugs = [re.sub(r'[^0-9a-z]+', '_', str(part).strip().lower()).strip('_') for part in parts]
+    return '.'.join(slug for slug in slugs if slug)
+
+
+def sensors_path_for(location):
+    """传感器元数据（标签、单位）保存在数据文件/分段目录旁边：data.json -> data.json.sensors.json"""
+    return Path(str(location) + ".sensors.json")
+
+
+class Sensor:
+    """一个温度传感器：稳定的id、所属组件、标签（主机、设备序号、核心等）和单位"""
+
+    __slots__ = ("id", "component", "labels", "unit", "index")
+
+    def __init__(self, sensor_id, component, labels, unit, index):
+        self.id = sensor_id
+        self.component = component
+        self.labels = labels
+        self.unit = unit
+        self.index = index
+
+    def to_dict(self):
+        return {"id": self.id, "component": self.component, "labels": self.labels, "unit": self.unit}
+
+
+class SensorRegistry:
+    """传感器注册表：每个传感器注册一次，按注册顺序分配列号"""
+
+    def __init__(self, host=None):
+        self.host = host or socket.gethostname()
+        self._sensors = {}
+        self._listeners = []
+
+    def register(self, sensor_id, component=None, unit="celsius", **labels):
+        """注册传感器，重复注册时返回已有的传感器"""
+        sensor = self._sensors.get(sensor_id)
+        if sensor is not None:
+            return sensor
+
+        if component is None:
+            component = sensor_id.split('.', 1)[0]
+        labels = dict(labels)
+        labels.setdefault("host", self.host)
+        sensor = Sensor(sensor_id, component, labels, unit, len(self._sensors))
+        self._sensors[sensor_id] = sensor
+        for listener in self._listeners:
+            listener(sensor)
+        return sensor
+
+    def load(self, path):
+        """注册 path 中保存的传感器（上次运行发现的传感器保留原来的标签和单位）"""
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                saved = json.load(f)
+        except FileNotFoundError:
+            return
+        except ValueError as e:
+            print(f"传感器元数据文件损坏，忽略: {path}: {e}")
+            return
+        for item in saved.get("sensors", []):
+            self.register(item["id"], item.get("component"), item.get("unit", "celsius"), **item.get("labels", {}))
+
+    def save(self, path):
+        """把所有传感器的元数据写入 path（先写临时文件再替换）"""
+        path = Path(path)
+        tmp = path.with_name(path.name + ".tmp")
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({"host": self.host, "sensors": [sensor.to_dict() for sensor in self]}, f,
+                      indent=2, ensure_ascii=False)
+        os.replace(tmp, path)
+
+    def add_listener(self, listener):
+        """注册新传感器时回调 listener(sensor)"""
+        self._listeners.append(listener)
+
+    def get(self, sensor_id):
+        return self._sensors.get(sensor_id)
+
+    def by_component(self, component):
+        return [sensor for sensor in self._sensors.values() if sensor.component == component]
+
+    def __iter__(self):
+        return iter(self._sensors.values())
+
+    def __len__(self):
+        return len(self._sensors)
+
+
+class ColumnBuffer:
+    """列式内存缓冲
+
+    一个时间戳列加上每个传感器一列，每列都是 array('d')，缺失的读数为 NaN。
+    每次采样只向各列追加一个浮点数，不为单个读数分配对象。
+    超过 capacity 行后丢弃最旧的数据。采样线程写入，其他线程（遥测接口）通过 window() 读取。
+    """
+
+    def __init__(self, registry, capacity=3600):
+        self.registry = registry
+        self.capacity = capacity
+        self.timestamps = array('d')
+        self.columns = []
+        self._ids = []  # 列号 -> 传感器id
+        self._lock = threading.Lock()
+        for sensor in registry:
+            self._add_column(sensor)
+        registry.add_listener(self._add_column)
+
+    def _add_column(self, sensor):
+        with self._lock:
+            # 新传感器出现之前的行都记为缺失
+            self.columns.append(array('d', [math.nan]) * len(self.timestamps))
+            self._ids.append(sensor.id)
+
+    def append_row(self, timestamp, readings):
+        """追加一行，readings 为 {传感器id: 温度}，timestamp 为秒数（见 rollups.to_epoch）"""
+        sensors = [self.registry.register(sensor_id) for sensor_id in readings]
+        with self._lock:
+            self.timestamps.append(timestamp)
+            for column in self.columns:
+                column.append(math.nan)
+            for sensor, value in zip(sensors, readings.values()):
+                self.columns[sensor.index][-1] = value
+
+            if len(self.timestamps) > 2 * self.capacity:
+                self._trim()
+
+    def trim(self):
+        """只保留最近 capacity 行"""
+        with self._lock:
+            self._trim()
+
+    def _trim(self):
+        excess = len(self.timestamps) - self.capacity
+        if excess <= 0:
+            return
+        del self.timestamps[:excess]
+        for column in self.columns:
+            del column[:excess]
+
+    def sensor_ids(self):
+        """按列号返回所有传感器的id"""
+        with self._lock:
+            return list(self._ids)
+
+    def window(self, start, end=None):
+        """复制 [start, end] 内的行，返回 (timestamps, {传感器id: 列})；缓冲没有覆盖 start 时返回 None"""
+        with self._lock:
+            if not self.timestamps or self.timestamps[0] > start:
+                return None
+            lo = bisect_left(self.timestamps, start)
+            hi = len(self.timestamps) if end is None else bisect_right(self.timestamps, end)
+            columns = {sensor_id: column[lo:hi] for sensor_id, column in zip(self._ids, self.columns)}
+            return self.timestamps[lo:hi], columns
+
+    def column(self, sensor_id):
+        """返回某个传感器的列（与 timestamps 等长）"""
+        sensor = self.registry.get(sensor_id)
+        return self.columns[sensor.index] if sensor is not None else None
+
+    def latest(self):
+        """返回最后一行 {传感器id: 温度}（不含缺失值）"""
+        with self._lock:
+            if not self.timestamps:
+                return {}
+            return {sensor_id: column[-1] for sensor_id, column in zip(self._ids, self.columns)
+                    if not math.isnan(column[-1])}
+
+    def __len__(self):
+        return len(self.timestamps)
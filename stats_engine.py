@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+
+from collections import OrderedDict
+
+import numpy as np
+
+# 直方图分辨率（°C）。温度读数本身只精确到0.01~1°C，百分位数按这个分辨率计算
+RESOLUTION = 0.1
+PERCENTILES = (5, 25, 50, 75, 95, 99)
+
+
+def series_stats(values, resolution=RESOLUTION):
+    """一次遍历计算一列温度的全部统计量，NaN（缺失值）会被跳过
+
+    矩（count/sum/平方和）以第一个值为偏移累加，避免大数相减的精度损失；
+    同时按 resolution 量化统计一个细粒度直方图，百分位数、箱线图和分布图都由这个直方图得到，
+    不需要对数据排序。没有有效数据时返回 None。
+    """
+    values = np.asarray(values, dtype=np.float64)
+    values = values[~np.isnan(values)]
+    count = values.size
+    if count == 0:
+        return None
+
+    low = float(values.min())
+    high = float(values.max())
+    shift = values[0]
+    deltas = values - shift
+    total = float(deltas.sum())
+    total_sq = float(np.dot(deltas, deltas))
+    mean = shift + total / count
+    variance = max(total_sq / count - (total / count) ** 2, 0.0)
+
+    bins = np.bincount(np.rint((values - low) / resolution).astype(np.int64))
+    stats = {
+        "count": count,
+        "mean": mean,
+        "std": float(np.sqrt(variance)),
+        "min": low,
+        "max": high,
+        "resolution": resolution,
+        "bins": bins,
+    }
+    stats["percentiles"] = {q: percentile(stats, q) for q in PERCENTILES}
+    return stats
+
+
+def _bin_values(stats):
+    """细粒度直方图每个桶对应的温度"""
+    return stats["min"] + np.arange(len(stats["bins"])) * stats["resolution"]
+
+
+def percentile(stats, q):
+    """由细粒度直方图估计第 q 百分位数，误差不超过半个分辨率"""
+    cumulative = np.cumsum(stats["bins"])
+    index = int(np.searchsorted(cumulative, q / 100.0 * stats["count"]))
+    value = stats["min"] + min(index, len(cumulative) - 1) * stats["resolution"]
+    return min(max(value, stats["min"]), stats["max"])
+
+
+def histogram(stats, bins=20):
+    """把细粒度直方图合并为 bins 个等宽桶，返回 (计数, 边界)，用法与 np.histogram 相同"""
+    edges = np.linspace(stats["min"], stats["max"], bins + 1)
+    if stats["min"] == stats["max"]:
+        edges = np.linspace(stats["min"] - 0.5, stats["max"] + 0.5, bins + 1)
+    counts, _ = np.histogram(np.clip(_bin_values(stats), edges[0], edges[-1]), edges, weights=stats["bins"])
+    return counts, edges
+
+
+def box_stats(stats, label, whis=1.5):
+    """生成 Axes.bxp 需要的箱线图统计量（与 Axes.boxplot 的规则相同，离群点每个分辨率桶取一个）"""
+    q1 = stats["percentiles"][25]
+    q3 = stats["percentiles"][75]
+    iqr = q3 - q1
+    values = _bin_values(stats)[stats["bins"] > 0]
+    inside = values[(values >= q1 - whis * iqr) & (values <= q3 + whis * iqr)]
+    return {
+        "label": label,
+        "med": stats["percentiles"][50],
+        "q1": q1,
+        "q3": q3,
+        "whislo": float(inside.min()) if inside.size else q1,
+        "whishi": float(inside.max()) if inside.size else q3,
+        "fliers": values[(values < q1 - whis * iqr) | (values > q3 + whis * iqr)],
+        "mean": stats["mean"],
+    }
+
+
+def dataset_stats(data, components=("cpu", "gpu")):
+    """计算整个数据集的统计：记录数、时间范围和每个组件的 series_stats"""
+    return {
+        "records": len(data),
+        "first": data.timestamps[0] if len(data) else None,
+        "last": data.timestamps[-1] if len(data) else None,
+        "series": {name: series_stats(data.column(name)) for name in components},
+    }
+
+
+class StatsCache:
+    """按数据集版本缓存统计结果，数据文件没有变化时直接复用"""
+
+    def __init__(self, maxsize=8):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+
+    def get(self, key, compute):
+        """key 包含数据集版本；缓存中没有时调用 compute() 计算"""
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            return self._entries[key]
+        value = compute()
+        self._entries[key] = value
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+        return value
+
+    def clear(self):
+        self._entries.clear()
+
+
+# 同一进程中的所有图表生成器共用一个缓存
+default_cache = StatsCache()
@@ -0,0 +1,512 @@
+# -*- coding: utf-8 -*-
+
+import os
+import re
+import sys
+import json
+import time
+from pathlib import Path
+
+from rollups import to_epoch
+
+SEGMENT_PATTERN = re.compile(r'^segment-(\d{8})-(\d+)\.jsonl$')
+FSYNC_POLICIES = ("always", "interval", "never")
+DEFAULT_BACKEND = "segments"
+# 导入旧的 data.json 时每批追加的记录数
+IMPORT_BATCH = 1000
+# 稀疏时间索引：每隔多少条记录保存一个 (时间, 字节偏移)
+INDEX_EVERY = 256
+
+
+def encode_record(record):
+    """把一条记录编码为一行紧凑的JSON"""
+    return (json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n').encode('utf-8')
+
+
+def record_epoch(record):
+    """记录的时间戳（秒数，见 rollups.to_epoch），无法解析时返回 None"""
+    try:
+        return to_epoch(record["timestamp"])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def index_path_for(path):
+    """数据文件或分段的稀疏时间索引文件：data.json -> data.json.idx"""
+    return Path(str(path) + ".idx")
+
+
+def encode_index_entry(epoch, offset):
+    return f"[{epoch!r},{offset}]\n".encode('ascii')
+
+
+def write_index(path, header, entries):
+    """写入完整的索引文件：第一行为头部信息，之后每行一个 [时间, 字节偏移]"""
+    temp_path = Path(str(path) + ".tmp")
+    with open(temp_path, 'wb') as f:
+        f.write((json.dumps(header) + '\n').encode('utf-8'))
+        for epoch, offset in entries:
+            f.write(encode_index_entry(epoch, offset))
+    os.replace(temp_path, path)
+
+
+class JsonArrayStorage:
+    """旧格式存储：整个文件是一个JSON数组，每次写入都要重写整个文件"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.location = self.path
+
+    def append(self, record):
+        """追加一条记录（O(历史长度)，仅为兼容保留）"""
+        self.append_many([record])
+
+    def append_many(self, records):
+        """一次追加多条记录，只读取和重写一次文件，返回写入的字节数"""
+        existing_data = []
+        if self.path.exists():
+            with open(self.path, 'r', encoding='utf-8') as f:
+                existing_data = json.load(f)
+
+        existing_data.extend(records)
+        return self._write(existing_data)
+
+    def _write(self, records):
+        """按 json.dump(indent=2) 的格式写出整个数组，同时记录每隔 INDEX_EVERY 条记录的字节偏移"""
+        entries = []
+        with open(self.path, 'wb') as f:
+            offset = f.write(b'[\n' if records else b'[')
+            for i, record in enumerate(records):
+                if i:
+                    offset += f.write(b',\n')
+                text = '  ' + json.dumps(record, indent=2, ensure_ascii=False).replace('\n', '\n  ')
+                if i % INDEX_EVERY == 0:
+                    epoch = record_epoch(record)
+                    if epoch is not None:
+                        # 偏移指向记录开头的 "{"
+                        entries.append((epoch, offset + 2))
+                offset += f.write(text.encode('utf-8'))
+            f.write(b'\n]' if records else b']')
+
+        stat = self.path.stat()
+        write_index(index_path_for(self.path),
+                    {"format": "array", "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}, entries)
+        return stat.st_size
+
+    def iter_records(self):
+        """遍历所有记录"""
+        if not self.path.exists():
+            return
+        with open(self.path, 'r', encoding='utf-8') as f:
+            yield from json.load(f)
+
+    def close(self):
+        pass
+
+
+class SegmentedStorage:
+    """追加写入的分段存储
+
+    每个分段是一个JSON Lines文件，文件名为 segment-<序号>-<创建时间>.jsonl，
+    超过大小或时长上限时轮转到新分段。每次写入的开销与历史长度无关。
+    每个分段旁边有一个稀疏时间索引 <分段>.idx，每隔 INDEX_EVERY 条记录追加一行 [时间, 字节偏移]。
+    """
+
+    def __init__(self, directory, segment_max_bytes=64 * 1024 * 1024, segment_max_seconds=24 * 3600,
+                 fsync="interval", fsync_interval=1.0):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"未知的fsync策略: {fsync} (可选: {', '.join(FSYNC_POLICIES)})")
+
+        self.directory = Path(directory)
+        self.location = self.directory
+        self.segment_max_bytes = segment_max_bytes
+        self.segment_max_seconds = segment_max_seconds
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+
+        self._file = None
+        self._segment_path = None
+        self._segment_seq = 0
+        self._segment_created = 0
+        self._segment_size = 0
+        self._index_file = None
+        self._since_index = 0
+        self._last_fsync = time.monotonic()
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._open_last_segment()
+
+    @staticmethod
+    def list_segments(directory):
+        """按序号返回目录中的所有分段文件"""
+        segments = []
+        directory = Path(directory)
+        if not directory.is_dir():
+            return segments
+        for path in directory.iterdir():
+            match = SEGMENT_PATTERN.match(path.name)
+            if match:
+                segments.append((int(match.group(1)), int(match.group(2)), path))
+        segments.sort()
+        return segments
+
+    @staticmethod
+    def read_records(directory):
+        """按写入顺序遍历目录中的所有记录"""
+        for _, _, path in SegmentedStorage.list_segments(directory):
+            with open(path, 'rb') as f:
+                for line in f:
+                    if not line.endswith(b'\n'):
+                        # 尚未写完的尾部记录
+                        break
+                    line = line.strip()
+                    if line:
+                        yield json.loads(line)
+
+    def _recover_tail(self, path):
+        """截掉崩溃时写了一半的尾部记录，返回恢复后的文件大小"""
+        with open(path, 'r+b') as f:
+            size = f.seek(0, os.SEEK_END)
+
+            # 从尾部向前读取，直到包含最后一条完整记录
+            pos = size
+            tail = b''
+            while pos > 0 and tail.count(b'\n') < 2:
+                start = max(0, pos - 64 * 1024)
+                f.seek(start)
+                tail = f.read(pos - start) + tail
+                pos = start
+
+            lines = tail.split(b'\n')
+            # 最后一个元素是没有换行结尾的残缺部分
+            good_end = size - len(lines[-1])
+            if len(lines) >= 2:
+                try:
+                    json.loads(lines[-2])
+                except ValueError:
+                    good_end -= len(lines[-2]) + 1
+
+            if good_end != size:
+                print(f"分段 {path.name} 尾部有不完整记录，已截断 {size - good_end} 字节")
+                f.truncate(good_end)
+            return good_end
+
+    def _open_last_segment(self):
+        segments = self.list_segments(self.directory)
+        if not segments:
+            self._start_new_segment(1)
+            return
+
+        seq, created, path = segments[-1]
+        self._segment_seq = seq
+        self._segment_created = created
+        self._segment_path = path
+        self._segment_size = self._recover_tail(path)
+        self._file = open(path, 'ab')
+        self._open_index(path, self._segment_size)
+
+    @staticmethod
+    def build_segment_index(path, size=None):
+        """扫描一个分段生成索引条目（用于没有索引的旧分段）"""
+        entries = []
+        with open(path, 'rb') as f:
+            offset = 0
+            count = 0
+            for line in f:
+                if size is not None and offset + len(line) > size or not line.endswith(b'\n'):
+                    break
+                if count % INDEX_EVERY == 0 and line.strip():
+                    try:
+                        epoch = record_epoch(json.loads(line))
+                    except ValueError:
+                        epoch = None
+                    if epoch is not None:
+                        entries.append((epoch, offset))
+                count += 1
+                offset += len(line)
+        return entries
+
+    @staticmethod
+    def read_segment_index(path, size=None):
+        """读取分段的索引条目，忽略超出分段大小的条目（数据没有落盘而索引已经写入）"""
+        entries = []
+        try:
+            with open(index_path_for(path), 'rb') as f:
+                f.readline()
+                for line in f:
+                    if not line.endswith(b'\n'):
+                        break
+                    try:
+                        epoch, offset = json.loads(line)
+                    except ValueError:
+                        # 崩溃时写坏的条目：只使用之前的条目，_open_index 会发现大小不符并重新生成
+                        break
+                    if size is not None and offset >= size:
+                        break
+                    entries.append((epoch, offset))
+        except FileNotFoundError:
+            return None
+        return entries
+
+    def _open_index(self, path, size):
+        """打开当前分段的索引；没有索引或索引比数据多时重新生成"""
+        index_path = index_path_for(path)
+        entries = self.read_segment_index(path, size)
+        if entries is None or index_path.stat().st_size != self._index_size(entries):
+            entries = self.build_segment_index(path, size)
+            write_index(index_path, {"format": "lines", "every": INDEX_EVERY}, entries)
+        self._index_file = open(index_path, 'ab')
+        # 重新打开后的第一条记录总是建立索引
+        self._since_index = INDEX_EVERY
+
+    @staticmethod
+    def _index_size(entries):
+        header = json.dumps({"format": "lines", "every": INDEX_EVERY}) + '\n'
+        return len(header) + sum(len(encode_index_entry(epoch, offset)) for epoch, offset in entries)
+
+    def _start_new_segment(self, seq):
+        if self._file:
+            self._sync(force=True)
+            self._file.close()
+            self._index_file.close()
+
+        created = int(time.time())
+        self._segment_seq = seq
+        self._segment_created = created
+        self._segment_path = self.directory / f"segment-{seq:08d}-{created}.jsonl"
+        self._segment_size = 0
+        self._file = open(self._segment_path, 'ab')
+        write_index(index_path_for(self._segment_path), {"format": "lines", "every": INDEX_EVERY}, [])
+        self._index_file = open(index_path_for(self._segment_path), 'ab')
+        self._since_index = 0
+
+    def _should_rotate(self, incoming):
+        if self._segment_size == 0:
+            return False
+        if self._segment_size + incoming > self.segment_max_bytes:
+            return True
+        return time.time() - self._segment_created >= self.segment_max_seconds
+
+    def _sync(self, force=False):
+        self._file.flush()
+        if self.fsync == "never" and not force:
+            return
+        now = time.monotonic()
+        if force or self.fsync == "always" or now - self._last_fsync >= self.fsync_interval:
+            os.fsync(self._file.fileno())
+            self._last_fsync = now
+
+    def append(self, record):
+        """追加一条记录"""
+        self._append_line(record, encode_record(record))
+        self._sync()
+
+    def append_many(self, records):
+        """一次追加多条记录，按 fsync 策略最多落盘一次，返回写入的字节数
+
+        先编码整批记录再写入，有记录无法编码时整批都不写（调用方可以原样保存这一批而不会重复）。
+        """
+        lines = [encode_record(record) for record in records]
+        written = sum(self._append_line(record, line) for record, line in zip(records, lines))
+        if records:
+            self._sync(force=self.fsync == "always")
+        return written
+
+    def _append_line(self, record, line):
+        if self._should_rotate(len(line)):
+            self._start_new_segment(self._segment_seq + 1)
+
+        if self._since_index == 0 or self._since_index >= INDEX_EVERY:
+            epoch = record_epoch(record)
+            if epoch is not None:
+                self._index_file.write(encode_index_entry(epoch, self._segment_size))
+                self._index_file.flush()
+                self._since_index = 0
+        self._since_index += 1
+
+        self._file.write(line)
+        self._segment_size += len(line)
+        return len(line)
+
+    def iter_records(self):
+        """遍历所有记录"""
+        if self._file:
+            self._file.flush()
+        return self.read_records(self.directory)
+
+    def close(self):
+        """刷新并关闭当前分段"""
+        if self._file:
+            self._sync(force=True)
+            self._file.close()
+            self._file = None
+            self._index_file.close()
+
+
+def create_storage(config):
+    """根据配置创建存储后端（默认 segments）
+
+    segments 的目录中还没有任何分段而旧的 data_file 存在时，先把其中的记录导入到分段目录（旧文件保留不动）。
+    """
+    storage_config = config.get("storage", {})
+    backend = storage_config.get("backend", DEFAULT_BACKEND)
+
+    if backend == "json":
+        return JsonArrayStorage(config.get("data_file", "data.json"))
+    if backend == "segments":
+        directory = Path(storage_config.get("segment_dir", "data_segments"))
+        # 已归档的分段（segment-*.tca）也算已有数据
+        empty = not any(directory.glob("segment-*"))
+        storage = SegmentedStorage(
+            directory,
+            segment_max_bytes=int(storage_config.get("segment_max_mb", 64) * 1024 * 1024),
+            segment_max_seconds=storage_config.get("segment_max_hours", 24) * 3600,
+            fsync=storage_config.get("fsync", "interval"),
+            fsync_interval=storage_config.get("fsync_interval_seconds", 1.0),
+        )
+        legacy = Path(config.get("data_file", "data.json"))
+        if empty and storage_config.get("migrate", True) and legacy.is_file():
+            migrate_json_array(legacy, storage)
+        return storage
+    raise ValueError(f"未知的存储后端: {backend}")
+
+
+def migrate_json_array(json_file, storage):
+    """把旧的 data.json 导入到新建的分段目录，并为导入的数据生成聚合"""
+    from rollups import rebuild
+
+    print(f"把旧格式的数据 {json_file} 导入到 {storage.location} ...")
+    try:
+        count = import_json_array(json_file, storage)
+    except ValueError as e:
+        # 文件尾部损坏：已经解析出的记录都已导入
+        print(f"{json_file} 没有完整导入: {e}")
+    else:
+        print(f"已导入 {count} 条记录，{json_file} 保留不动，确认无误后可以删除")
+    storage._sync(force=True)
+    rebuild(storage.location)
+
+
+def iter_json_array(f, chunk_size=1 << 20, in_array=False, with_offsets=False):
+    """增量解析一个JSON数组文件，逐条产出记录，不需要把整个文件读入内存
+
+    in_array 为 True 时文件当前位置已经在数组内部（例如按索引 seek 到某条记录的开头）。
+    with_offsets 为 True 时产出 (相对起始位置的字符偏移, 记录)；用 latin-1 打开文件时字符偏移就是字节偏移。
+    """
+    decoder = json.JSONDecoder()
+    buffer = f.read(chunk_size)
+    # base 为 buffer[0] 相对起始位置的偏移
+    base = 0
+    if in_array:
+        pos = 0
+    else:
+        pos = buffer.find('[')
+        if pos < 0:
+            return
+        pos += 1
+    eof = False
+
+    while True:
+        # 跳过空白和逗号
+        while True:
+            while pos < len(buffer) and buffer[pos] in ' \t\r\n,':
+                pos += 1
+            if pos < len(buffer) or eof:
+                break
+            base += len(buffer)
+            buffer = f.read(chunk_size)
+            pos = 0
+            eof = not buffer
+
+        if pos >= len(buffer) or buffer[pos] == ']':
+            return
+
+        try:
+            record, end = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            # 当前缓冲区里的记录不完整，继续读取
+            more = f.read(chunk_size)
+            eof = not more
+            base += pos
+            buffer = buffer[pos:] + more
+            pos = 0
+            continue
+
+        yield (base + pos, record) if with_offsets else record
+        pos = end
+        if pos > chunk_size:
+            base += pos
+            buffer = buffer[pos:]
+            pos = 0
+
+
+def iter_file_records(path):
+    """遍历 data.json（JSON数组或JSON Lines）或分段目录中的记录，不包括已归档的分段"""
+    path = Path(path)
+    if path.is_dir():
+        yield from SegmentedStorage.read_records(path)
+        return
+
+    with open(path, 'r', encoding='utf-8') as f:
+        head = f.read(1)
+        while head and head.isspace():
+            head = f.read(1)
+        f.seek(0)
+        if head == '[':
+            yield from iter_json_array(f)
+        else:
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+
+
+def import_json_array(json_file, storage, batch_size=IMPORT_BATCH):
+    """把旧的 data.json 导入到新的存储后端：增量解析，每 batch_size 条记录调用一次 append_many"""
+    count = 0
+    batch = []
+    with open(json_file, 'r', encoding='utf-8') as f:
+        for record in iter_json_array(f):
+            batch.append(record)
+            if len(batch) >= batch_size:
+                storage.append_many(batch)
+                count += len(batch)
+                batch = []
+    if batch:
+        storage.append_many(batch)
+        count += len(batch)
+    return count
+
+
+def default_data_path(config_file="config.json"):
+    """图表等工具默认读取的数据：按配置文件中的存储后端返回分段目录或 data_file"""
+    try:
+        with open(config_file, 'r', encoding='utf-8') as f:
+            config = json.load(f)
+    except (OSError, ValueError):
+        config = {}
+    storage_config = config.get("storage", {})
+    if storage_config.get("backend", DEFAULT_BACKEND) == "segments":
+        directory = Path(storage_config.get("segment_dir", "data_segments"))
+        if directory.is_dir():
+            return str(directory)
+    return config.get("data_file", "data.json")
+
+
+def main():
+    if len(sys.argv) != 3:
+        print("用法: python storage.py <data.json> <分段目录>")
+        return
+
+    storage = SegmentedStorage(sys.argv[2])
+    try:
+        count = import_json_array(sys.argv[1], storage)
+    finally:
+        storage.close()
+    print(f"已导入 {count} 条记录到 {sys.argv[2]}")
+
+
+if __name__ == "__main__":
+    main()
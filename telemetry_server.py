@@ -0,0 +1,298 @@
+# -*- coding: utf-8 -*-
+
+import json
+import math
+import queue
+import datetime
+import threading
+from pathlib import Path
+from urllib.parse import urlparse, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import numpy as np
+
+from data_loader import load_arrays, TemperatureArrays
+from downsample import decimate
+from rollups import rollup_dir_for, rollup_extent, series_buckets, summarize, to_epoch, from_epoch, RECORDS_KEY
+from stats_engine import series_stats
+
+COMPONENTS = ("cpu", "gpu")
+VIEWER_FILE = Path(__file__).with_name("temperature_viewer.html")
+
+
+def _iso(epoch):
+    return from_epoch(epoch).isoformat(timespec='seconds')
+
+
+def _point_value(value):
+    """曲线上的一个值；降采样插入的断开点（NaN）输出为 null，网页图表在这里断开"""
+    return None if math.isnan(value) else round(float(value), 2)
+
+
+def _public_stats(stats):
+    """只保留浏览器需要的统计量"""
+    if stats is None:
+        return None
+    return {key: stats[key] for key in ("count", "mean", "min", "max")}
+
+
+class TelemetryServer:
+    """本地HTTP接口：按时间范围查询（服务器端降采样）和新样本的 Server-Sent Events 推送
+
+    - GET /                 温度图表网页（temperature_viewer.html）
+    - GET /api/range        参数 minutes（最近N分钟）或 start/end（ISO时间），points（最多返回的点数）
+    - GET /api/stream       SSE，每采集一次推送一条记录；参数 since（ISO时间）先补发最近的样本
+    - GET /api/sensors      传感器注册表（id、组件、标签、单位）和每个传感器的最新读数
+    最近的样本从监控程序的列式缓冲（sensors.ColumnBuffer）读取，查询最近的时间窗口不需要读取数据文件；
+    较长的范围优先使用聚合数据。
+    """
+
+    def __init__(self, data_path, buffer, host="127.0.0.1", port=8765, allowed_origins=()):
+        # 采集端模式没有本地数据（data_path 为 None），只能查询列式缓冲中的最近样本
+        self.data_path = Path(data_path) if data_path is not None else None
+        self.rollup_dir = rollup_dir_for(data_path) if data_path is not None else None
+        self.buffer = buffer
+        # 接口没有认证：默认不发送 CORS 头，其他网站的脚本不能读取本机的温度数据（查看页面由本服务提供，同源）
+        self.allowed_origins = frozenset(allowed_origins)
+        self._subscribers = set()
+        self._subscribers_lock = threading.Lock()
+
+        handler = type("TelemetryHandler", (_TelemetryHandler,), {"telemetry": self})
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+        self.httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def address(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="telemetry-server", daemon=True)
+        self._thread.start()
+        print(f"遥测接口已启动: {self.address}")
+
+    def publish(self, record):
+        """采集到一条新记录时调用（记录已经写入列式缓冲）：推送给所有SSE连接"""
+        with self._subscribers_lock:
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(record)
+            except queue.Full:
+                # 浏览器读取太慢时丢弃新样本，不阻塞采样
+                pass
+
+    def subscribe(self, since=None):
+        """注册一个SSE连接，返回 (队列, 需要补发的记录)"""
+        subscriber = queue.Queue(maxsize=1000)
+        with self._subscribers_lock:
+            self._subscribers.add(subscriber)
+        backlog = []
+        if since is not None:
+            # 缓冲没有覆盖 since 时补发缓冲中的所有样本
+            window = self.buffer.window(since)
+            if window is None:
+                window = self.buffer.window(-math.inf)
+            if window is not None:
+                backlog = self._window_records(*window, since)
+        return subscriber, backlog
+
+    def unsubscribe(self, subscriber):
+        with self._subscribers_lock:
+            self._subscribers.discard(subscriber)
+
+    def _component_columns(self, columns):
+        """每个组件取其所有传感器的最高温度（与记录中的 temperatures 相同），没有读数为 NaN"""
+        by_component = {name: [] for name in COMPONENTS}
+        for sensor_id, column in columns.items():
+            sensor = self.buffer.registry.get(sensor_id)
+            if sensor is not None and sensor.component in by_component:
+                by_component[sensor.component].append(np.frombuffer(column, dtype=np.float64))
+        length = len(next(iter(columns.values()))) if columns else 0
+        return {name: np.fmax.reduce(values, axis=0) if values else np.full(length, math.nan)
+                for name, values in by_component.items()}
+
+    def _window_records(self, timestamps, columns, since):
+        """把缓冲中 since 之后的行还原为与 publish 相同结构的记录（用于SSE补发）"""
+        components = self._component_columns(columns)
+        records = []
+        for i, epoch in enumerate(timestamps):
+            if epoch <= since:
+                continue
+            temperatures = {name: float(values[i]) for name, values in components.items() if not math.isnan(values[i])}
+            sensors = {sensor_id: column[i] for sensor_id, column in columns.items() if not math.isnan(column[i])}
+            records.append({"timestamp": from_epoch(epoch).isoformat(), "temperatures": temperatures,
+                            "sensors": sensors})
+        return records
+
+    def query_range(self, start=None, end=None, points=1000, method="m4"):
+        """返回 [start, end] 内降采样后的温度曲线和统计，start/end 为秒数（见 rollups.to_epoch），None 表示不限"""
+        points = max(4, min(int(points), 20000))
+
+        source = "recent"
+        window = None
+        if start is not None:
+            window = self.buffer.window(start, end)
+        if window is not None:
+            epochs, sensor_columns = window
+            timestamps = (np.frombuffer(epochs, dtype=np.float64) * 1000).astype(np.int64).astype('datetime64[ms]')
+            columns = self._component_columns(sensor_columns)
+            count = len(epochs)
+            stats = {name: _public_stats(series_stats(columns[name])) for name in COMPONENTS}
+        else:
+            result = self._query_rollups(start, end, points) if self.rollup_dir is not None else None
+            if result is not None:
+                return result
+            source = "raw"
+            if self.data_path is not None and self.data_path.exists():
+                data = load_arrays(self.data_path, _iso(start) if start is not None else None,
+                                   _iso(end) if end is not None else None)
+            else:
+                data = TemperatureArrays.empty()
+            timestamps = data.timestamps
+            columns = {name: data.column(name) for name in COMPONENTS}
+            count = len(data)
+            stats = {name: _public_stats(series_stats(columns[name])) for name in COMPONENTS}
+
+        series = {}
+        for name in COMPONENTS:
+            ts, values = decimate(timestamps, columns[name], points, method)
+            series[name] = [[t, _point_value(v)]
+                            for t, v in zip(np.datetime_as_string(ts, unit='s').tolist(), values)]
+        return {"source": source, "records": count, "series": series, "stats": stats}
+
+    def _query_rollups(self, start, end, points):
+        """时间范围较长时用聚合桶的平均值作为曲线，统计量由桶合并得到"""
+        extent = rollup_extent(self.rollup_dir, self.data_path)
+        if extent is None:
+            return None
+        start = extent[0] if start is None else start
+        end = extent[1] if end is None else end
+        # 和图表生成器相同：每4个点至少一个桶
+        selected = series_buckets(self.rollup_dir, start, end, points // 4)
+        if selected is None:
+            return None
+        tier, buckets = selected
+
+        # 桶比需要的点多时再做一次降采样
+        timestamps = np.array([t for t, _ in buckets], dtype=np.int64).astype('datetime64[s]')
+        series = {}
+        stats = {}
+        for name in COMPONENTS:
+            means = np.array([s[name][1] / s[name][0] if s.get(name) else math.nan for _, s in buckets])
+            ts, values = decimate(timestamps, means, points, "m4")
+            series[name] = [[t, _point_value(v)]
+                            for t, v in zip(np.datetime_as_string(ts, unit='s').tolist(), values)]
+            stats[name] = _public_stats(summarize(buckets, name))
+        records = summarize(buckets, RECORDS_KEY)
+        return {"source": f"rollup-{tier}", "records": records["count"] if records else 0,
+                "series": series, "stats": stats}
+
+    def sensors(self):
+        """注册表中的所有传感器及其最新读数"""
+        latest = self.buffer.latest()
+        sensors = [self.buffer.registry.get(sensor_id) for sensor_id in self.buffer.sensor_ids()]
+        return [dict(sensor.to_dict(), value=latest.get(sensor.id)) for sensor in sensors]
+
+    def close(self):
+        if self._thread is not None:
+            self.httpd.shutdown()
+        self.httpd.server_close()
+        # 通知所有SSE连接结束
+        with self._subscribers_lock:
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(None)
+            except queue.Full:
+                pass
+
+
+class _TelemetryHandler(BaseHTTPRequestHandler):
+    telemetry = None
+
+    def log_message(self, format, *args):
+        # 不在监控输出中打印每个请求
+        pass
+
+    def _cors_headers(self):
+        """只对配置的来源（allowed_origins）发送 Access-Control-Allow-Origin"""
+        origin = self.headers.get("Origin")
+        if origin and origin in self.telemetry.allowed_origins:
+            self.send_header("Access-Control-Allow-Origin", origin)
+            self.send_header("Vary", "Origin")
+
+    def _send(self, status, body, content_type):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self._cors_headers()
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        self._send(status, body, "application/json; charset=utf-8")
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        try:
+            if url.path in ("/", "/index.html", "/temperature_viewer.html"):
+                self._send(200, VIEWER_FILE.read_bytes(), "text/html; charset=utf-8")
+            elif url.path == "/api/info":
+                self._send_json(200, {"live": True, "data_file": str(self.telemetry.data_path) if self.telemetry.data_path else None})
+            elif url.path == "/api/range":
+                self._range(params)
+            elif url.path == "/api/sensors":
+                self._send_json(200, {"host": self.telemetry.buffer.registry.host, "sensors": self.telemetry.sensors()})
+            elif url.path == "/api/stream":
+                self._stream(params)
+            else:
+                self._send_json(404, {"error": "not found"})
+        except ValueError as e:
+            self._send_json(400, {"error": str(e)})
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def _range(self, params):
+        if "minutes" in params:
+            start = to_epoch(datetime.datetime.now()) - float(params["minutes"]) * 60
+            end = None
+        else:
+            start = to_epoch(params["start"]) if params.get("start") else None
+            end = to_epoch(params["end"]) if params.get("end") else None
+        result = self.telemetry.query_range(start, end, int(params.get("points", 1000)),
+                                            params.get("method", "m4"))
+        self._send_json(200, result)
+
+    def _stream(self, params):
+        since = to_epoch(params["since"]) if params.get("since") else None
+        subscriber, backlog = self.telemetry.subscribe(since)
+        try:
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream; charset=utf-8")
+            self.send_header("Cache-Control", "no-cache")
+            self._cors_headers()
+            self.end_headers()
+            for record in backlog:
+                self._event(record)
+            while True:
+                try:
+                    record = subscriber.get(timeout=15)
+                except queue.Empty:
+                    # 保持连接，也用来发现已经关闭的浏览器
+                    self.wfile.write(b": keepalive\n\n")
+                    self.wfile.flush()
+                    continue
+                if record is None:
+                    return
+                self._event(record)
+        finally:
+            self.telemetry.unsubscribe(subscriber)
+
+    def _event(self, record):
+        data = json.dumps(record, ensure_ascii=False, separators=(',', ':'))
+        self.wfile.write(f"data: {data}\n\n".encode('utf-8'))
+        self.wfile.flush()
@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+
+import sys
+import json
+import datetime
+from pathlib import Path
+
+import pytest
+
+# 各模块按脚本方式互相导入（from storage import ...），测试时把项目目录加入搜索路径
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+def make_records(count, start=datetime.datetime(2026, 1, 1), interval=1.0, host=None):
+    """生成 count 条按时间排列的采样记录"""
+    records = []
+    for i in range(count):
+        record = {
+            "timestamp": (start + datetime.timedelta(seconds=i * interval)).isoformat(),
+            "temperatures": {"cpu": 40.0 + i % 10, "gpu": None if i % 7 == 0 else 55.5},
+            "sensors": {},
+            "sampled_at": {},
+        }
+        if host is not None:
+            record["host"] = host
+        records.append(record)
+    return records
+
+
+@pytest.fixture
+def records():
+    return make_records
+
+
+def write_json_array(path, records):
+    Path(path).write_text(json.dumps(records, indent=2, ensure_ascii=False), encoding="utf-8")
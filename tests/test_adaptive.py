@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from adaptive import AdaptiveInterval, DeadbandFilter
+
+
+def test_interval_backs_off_while_stable_and_resets_on_change():
+    controller = AdaptiveInterval(1, 10, backoff=2.0, change_threshold=0.5)
+    # 第一次采样没有上一次的读数，按变化处理
+    assert controller.update({"cpu.0": 40.0}) == 1
+    assert [controller.update({"cpu.0": 40.2}) for _ in range(5)] == [2, 4, 8, 10, 10]
+    assert controller.update({"cpu.0": 41.0}) == 1
+    assert controller.update({"cpu.0": 41.0}) == 2
+    # 新出现的传感器也回到最短间隔
+    assert controller.update({"cpu.0": 41.0, "cpu.1": 38.0}) == 1
+    # 没有读数时保持当前间隔
+    controller.update({"cpu.0": 41.0, "cpu.1": 38.0})
+    assert controller.update({}) == 2
+
+
+def test_hot_readings_keep_min_interval():
+    controller = AdaptiveInterval(2, 30, backoff=3.0, hot_threshold=80.0)
+    assert [controller.update({"gpu.0": 60.0, "gpu.1": 81.0}) for _ in range(3)] == [2, 2, 2]
+    assert controller.update({"gpu.0": 60.0, "gpu.1": 79.9}) == 2  # 下降超过 change_threshold
+    assert controller.update({"gpu.0": 60.0, "gpu.1": 79.9}) == 6
+    assert controller.update({"gpu.0": 60.0, "gpu.1": 79.9}) == 18
+    # 变化小于 change_threshold，但达到了 hot_threshold
+    assert controller.update({"gpu.0": 60.0, "gpu.1": 80.0}) == 2
+
+
+def test_invalid_interval_settings():
+    with pytest.raises(ValueError):
+        AdaptiveInterval(10, 5)
+    with pytest.raises(ValueError):
+        AdaptiveInterval(0, 5)
+    with pytest.raises(ValueError):
+        AdaptiveInterval(1, 5, backoff=0.5)
+
+
+def _record(temperatures, sensors=None):
+    return {"temperatures": temperatures, "sensors": sensors or {}}
+
+
+def test_deadband_keeps_changes_and_heartbeats():
+    deadband = DeadbandFilter(delta=0.5, max_seconds=60)
+    assert deadband.accept(_record({"cpu": 40.0, "gpu": None}), 0)
+    # 与上一次保存的值比较，缓慢的漂移累积超过 delta 后保存
+    assert not deadband.accept(_record({"cpu": 40.3}), 1)
+    assert not deadband.accept(_record({"cpu": 40.5}), 2)
+    assert deadband.accept(_record({"cpu": 40.6}), 3)
+    assert not deadband.accept(_record({"cpu": 40.6}), 62)
+    # 超过 max_seconds 没有保存时保存一条
+    assert deadband.accept(_record({"cpu": 40.6}), 63)
+    assert deadband.stats() == {"accepted": 3, "suppressed": 3}
+
+
+def test_deadband_compares_each_sensor():
+    deadband = DeadbandFilter(delta=0.5, max_seconds=300)
+    assert deadband.accept(_record({"cpu": 40.0}, {"cpu.core_0": 40.0, "cpu.core_1": 50.0}), 0)
+    assert not deadband.accept(_record({"cpu": 40.0}, {"cpu.core_0": 40.0, "cpu.core_1": 50.2}), 1)
+    assert deadband.accept(_record({"cpu": 40.0}, {"cpu.core_0": 40.0, "cpu.core_1": 49.4}), 2)
+    # 只有部分组件的记录只比较其中的读数；新出现的读数总是保存
+    assert not deadband.accept(_record({"gpu": None}, {"cpu.core_1": 49.5}), 3)
+    assert deadband.accept(_record({"gpu": 60.0}), 4)
@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+
+import io
+import re
+import socket
+import select
+import datetime
+import threading
+
+from conftest import make_records
+from aggregator import AgentClient, Collector, HostStores, encode_batch, host_dir_name
+from storage import SegmentedStorage
+
+
+def _timestamps(directory):
+    return [record["timestamp"] for record in SegmentedStorage.read_records(directory)]
+
+
+def test_hosts_get_separate_time_ordered_stores(tmp_path):
+    a = make_records(20, host="a")
+    b = make_records(20, host="b")
+    stores = HostStores(tmp_path)
+    # 两台主机的批次交错到达
+    for start in range(0, 20, 5):
+        stores.append_many(a[start:start + 5] + b[start:start + 5])
+    stores.close()
+
+    for host, records in (("a", a), ("b", b)):
+        assert _timestamps(tmp_path / host) == [r["timestamp"] for r in records]
+        assert (tmp_path / host / "rollups").is_dir()
+
+
+def test_resent_batches_are_dropped(tmp_path):
+    records = make_records(10, host="a")
+    stores = HostStores(tmp_path, rollups=False)
+    stores.append_many(records[:6])
+    stores.append_many(records[3:])  # 重连后重发了未确认的批次
+    assert stores.duplicates == 3
+    stores.close()
+
+    # 重新打开时从已有分段恢复最后的时间
+    stores = HostStores(tmp_path, rollups=False)
+    stores.append_many(records[8:])
+    assert stores.duplicates == 2
+    stores.close()
+    assert _timestamps(tmp_path / "a") == [r["timestamp"] for r in records]
+
+
+def test_lru_closes_idle_hosts(tmp_path):
+    stores = HostStores(tmp_path, rollups=False, max_open=2)
+    for host in ("a", "b", "c", "a"):
+        stores.append_many(make_records(3, host=host))
+    assert len(stores._open) == 2
+    assert stores.duplicates == 3
+    stores.close()
+
+
+def test_host_dir_name_is_safe_and_collision_free():
+    assert host_dir_name("web-01.example") == "web-01.example"
+    assert host_dir_name(None) == "unknown"
+    for host in ("../etc", "..", "a/b"):
+        name = host_dir_name(host)
+        assert re.fullmatch(r'[A-Za-z0-9_][A-Za-z0-9._-]*', name), name
+    assert host_dir_name("a/b") != host_dir_name("a_b") == "a_b"
+    assert host_dir_name("a/b") != host_dir_name("a:b")
+
+
+def _send(sock, data):
+    sock.sendall(data)
+    return sock.makefile('rb')
+
+
+def test_collector_acks_only_after_commit(tmp_path):
+    collector = Collector(tmp_path, "127.0.0.1", 0, batch_seconds=0.01, fsync="never", rollups=False)
+    release = threading.Event()
+    append_many = collector.stores.append_many
+
+    def slow_append(records):
+        release.wait(5)
+        return append_many(records)
+
+    collector.stores.append_many = slow_append
+    collector.start()
+    try:
+        with socket.create_connection(("127.0.0.1", collector.port), timeout=5) as sock:
+            reader = _send(sock, encode_batch(1, make_records(3, host="a")))
+            # 写入线程还没有提交这一批，不能确认
+            assert select.select([sock], [], [], 0.3)[0] == []
+            release.set()
+            assert reader.readline() == b"A 1\n"
+            assert _timestamps(tmp_path / "a") == [r["timestamp"] for r in make_records(3)]
+    finally:
+        release.set()
+        collector.stop()
+
+
+def test_bad_header_rejects_oldest_unacked_batch(tmp_path):
+    collector = Collector(tmp_path, "127.0.0.1", 0, batch_seconds=0.01, fsync="never", rollups=False)
+    collector.start()
+    try:
+        with socket.create_connection(("127.0.0.1", collector.port), timeout=5) as sock:
+            reader = _send(sock, encode_batch(1, make_records(2, host="a")) + b"B garbage\n")
+            assert reader.readline() == b"A 1\n"
+            assert reader.readline() == b"E - bad header\n"
+            assert reader.readline() == b""
+    finally:
+        collector.stop()
+
+    # 采集端把 "E -" 当作最早的未确认批次被拒绝，不会重发
+    client = AgentClient("127.0.0.1:1")
+    client._inflight = {2: make_records(2), 3: make_records(1)}
+    client._reader = io.BytesIO(b"E - bad header\n")
+    client._read_ack()
+    assert list(client._inflight) == [3]
+    assert client.rejected == 2
+
+
+def test_requeue_drops_oldest_and_counts(records):
+    client = AgentClient("127.0.0.1:1", queue_size=5)
+    batch = records(4, host="a")
+    client._inflight[1] = batch
+    newer = records(3, start=datetime.datetime(2026, 1, 2), host="a")
+    for record in newer:
+        client.put(record)
+    client._disconnect()
+    # 最新的3条都保留，未确认的批次只放回最新的2条
+    assert [r["timestamp"] for r in client._queue] == [r["timestamp"] for r in batch[2:] + newer]
+    assert client.dropped == 2
+    assert "agent_records_dropped_total" in client.metrics.render()
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+
+import datetime
+
+import pytest
+
+from alerts import AlertEngine, RateOfChangeRule, ThresholdRule, ZScoreRule, create_rule
+
+START = datetime.datetime(2026, 1, 1)
+
+
+def _record(seconds, temperatures=None, sensors=None):
+    return {"timestamp": (START + datetime.timedelta(seconds=seconds)).isoformat(),
+            "temperatures": temperatures or {}, "sensors": sensors or {}}
+
+
+def _states(events):
+    return [(event["sensor"], event["state"]) for event in events]
+
+
+def test_each_reading_is_checked_once():
+    engine = AlertEngine([ThresholdRule(high=85), ThresholdRule(name="core", sensors="cpu.*", source="sensors",
+                                                               high=85)], [])
+    events = engine.process(_record(0, {"cpu": 90.0}, {"cpu.k10temp.tctl": 90.0, "cpu.k10temp.tccd1": 70.0}))
+    assert sorted((e["rule"], e["sensor"]) for e in events) == [("core", "cpu.k10temp.tctl"), ("threshold", "cpu")]
+
+
+def test_invalid_source_is_rejected():
+    with pytest.raises(ValueError):
+        create_rule({"type": "threshold", "high": 80, "source": "temps"})
+
+
+def test_threshold_rearms_after_hysteresis():
+    rule = ThresholdRule(high=85, hysteresis=5)
+    values = [86, 90, 84, 81, 80, 82, 86]
+    events = [rule.evaluate("cpu", t, value) for t, value in enumerate(values)]
+    assert [e and e["state"] for e in events] == ["firing", None, None, None, "resolved", None, "firing"]
+
+
+def test_low_threshold():
+    rule = ThresholdRule(low=10, hysteresis=2)
+    events = [rule.evaluate("gpu", t, value) for t, value in enumerate([12, 9, 11, 12])]
+    assert [e and e["state"] for e in events] == [None, "firing", None, "resolved"]
+
+
+def test_rate_of_change_uses_window_ends():
+    rule = RateOfChangeRule(max_rate=1.0, window_seconds=10)
+    assert rule.evaluate("cpu", 0, 40.0) is None
+    assert rule.evaluate("cpu", 5, 60.0) is None  # 窗口还没有结束
+    firing = rule.evaluate("cpu", 10, 60.0)
+    assert firing["state"] == "firing" and firing["rate"] == 2.0
+    assert rule.evaluate("cpu", 20, 55.0) is None  # -0.5°C/s：不低于 max_rate 的一半，仍在告警
+    resolved = rule.evaluate("cpu", 30, 56.0)
+    assert resolved["state"] == "resolved"
+
+
+@pytest.mark.parametrize("mode", ["ewma", "rolling"])
+def test_zscore_learns_during_warmup(mode):
+    rule = ZScoreRule(threshold=4, mode=mode, warmup=20, window=50)
+    # 预热期内的跳变只用于学习，不告警
+    values = [40.0 + (i % 2) * 0.2 for i in range(10)] + [70.0] + [40.0 + (i % 2) * 0.2 for i in range(9)]
+    assert [rule.evaluate("cpu", t, value) for t, value in enumerate(values)] == [None] * 20
+
+    t = len(values)
+    for i in range(60):
+        assert rule.evaluate("cpu", t, 40.0 + (i % 2) * 0.2) is None
+        t += 1
+    firing = rule.evaluate("cpu", t, 60.0)
+    assert firing["state"] == "firing" and firing["z"] > 4
+    assert rule.evaluate("cpu", t + 1, 60.0) is None  # 持续异常不重复告警
+    events = [rule.evaluate("cpu", t + 2 + i, 40.0) for i in range(5)]
+    assert _states(e for e in events if e) == [("cpu", "resolved")]
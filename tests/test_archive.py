@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+
+import json
+import datetime
+
+from conftest import make_records
+from archive import ArchiveReader, archive_segment, records_to_columns, REJECTED_SUFFIX
+from data_loader import iter_records
+from storage import SegmentedStorage
+
+
+def _write_segment(directory, records):
+    storage = SegmentedStorage(directory, fsync="never")
+    storage.append_many(records)
+    storage.close()
+    return SegmentedStorage.list_segments(directory)[-1][2]
+
+
+def test_segment_round_trip(tmp_path):
+    records = make_records(100)
+    for i, record in enumerate(records):
+        record["sensors"] = {"nvme0": 30.25} if i % 3 else {}
+        record["sampled_at"] = {"cpu": record["timestamp"] + ".250"}
+    segment = _write_segment(tmp_path, records)
+
+    source_size, archive_size, count = archive_segment(segment)
+    assert count == 100
+    assert archive_size < source_size
+    assert not segment.exists()
+
+    restored = list(iter_records(tmp_path))
+    assert len(restored) == len(records)
+    for original, record in zip(records, restored):
+        assert datetime.datetime.fromisoformat(record["timestamp"]) == \
+            datetime.datetime.fromisoformat(original["timestamp"])
+        expected = {key: value for key, value in original["temperatures"].items() if value is not None}
+        assert record["temperatures"] == expected
+        assert record.get("sensors", {}) == original["sensors"]
+        assert datetime.datetime.fromisoformat(record["sampled_at"]["cpu"]) == \
+            datetime.datetime.fromisoformat(original["sampled_at"]["cpu"])
+
+
+def test_malformed_timestamps_are_quarantined(tmp_path):
+    records = make_records(10)
+    records[3]["timestamp"] = "not a time"
+    records[6]["timestamp"] = None
+    segment = _write_segment(tmp_path, records)
+    with open(segment, 'ab') as f:
+        f.write(b'{"timestamp": \n')  # 损坏的一行
+
+    _, _, count = archive_segment(segment)
+    assert count == 8
+    reader = ArchiveReader(segment.with_suffix(".tca"))
+    assert reader.count == 8
+
+    rejected = segment.with_suffix(REJECTED_SUFFIX).read_bytes().splitlines()
+    assert rejected[0] == b'{"timestamp": '
+    assert [json.loads(line)["timestamp"] for line in rejected[1:]] == [None, "not a time"]
+
+
+def test_host_and_other_fields_round_trip(tmp_path):
+    records = make_records(50, host="node-1")
+    for record in records[30:]:
+        record["host"] = "node-2"
+    records[40]["note"] = {"source": "import"}
+    del records[45]["host"]
+    segment = _write_segment(tmp_path, records)
+    archive_segment(segment)
+
+    reader = ArchiveReader(segment.with_suffix(".tca"))
+    assert len(reader.extras()) == 50
+    restored = list(iter_records(tmp_path))
+    assert [record.get("host") for record in restored] == [record.get("host") for record in records]
+    assert restored[40]["note"] == {"source": "import"}
+    assert "note" not in restored[41]
+
+
+def test_records_to_columns_skips_bad_values():
+    records = make_records(3)
+    records[1]["temperatures"]["cpu"] = "hot"
+    records[2]["sampled_at"] = {"cpu": "later"}
+    ms, columns = records_to_columns(records)
+    assert len(ms) == 3
+    assert columns["temperatures.cpu"][1] != columns["temperatures.cpu"][1]  # NaN
+    assert "sampled_at.cpu" in columns and all(v != v for v in columns["sampled_at.cpu"])
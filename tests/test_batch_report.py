@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+
+import json
+
+from conftest import make_records, write_json_array
+from batch_report import find_data_files, looks_like_data_file
+from column_cache import load_cached_arrays
+
+
+def test_scan_skips_sidecar_files(tmp_path):
+    host = tmp_path / "hosts" / "h1"
+    host.mkdir(parents=True)
+    write_json_array(host / "data.json", make_records(20))
+    (host / "config.json").write_text(json.dumps({"interval_seconds": 5}), encoding="utf-8")
+    (host / "alerts.jsonl").write_text(json.dumps({"time": "2026-01-01T00:00:00", "rule": "cpu_hot"}) + "\n",
+                                       encoding="utf-8")
+    (host / "data.json.spill.jsonl").write_text(json.dumps(make_records(1)[0]) + "\n", encoding="utf-8")
+    (tmp_path / "hosts" / "batch_manifest.json").write_text("{}", encoding="utf-8")
+    (host / "empty.json").write_text("", encoding="utf-8")
+
+    assert find_data_files([str(tmp_path / "hosts")]) == [host / "data.json"]
+    assert find_data_files([str(tmp_path / "hosts" / "**" / "*.json*")]) == [host / "data.json"]
+
+
+def test_jsonl_data_file_is_accepted(tmp_path):
+    path = tmp_path / "data.jsonl"
+    path.write_text("".join(json.dumps(record) + "\n" for record in make_records(3)), encoding="utf-8")
+    assert looks_like_data_file(path)
+
+
+def test_column_cache_is_not_scanned_or_nested(tmp_path):
+    data_path = tmp_path / "hosts" / "h1" / "data.json"
+    data_path.parent.mkdir(parents=True)
+    write_json_array(data_path, make_records(20))
+    assert len(load_cached_arrays(data_path)) == 20
+    cache_dir = data_path.parent / "data.json.cache"
+    assert (cache_dir / "meta.json").exists()
+
+    assert find_data_files([str(tmp_path / "hosts")]) == [data_path]
+    # 直接读取缓存目录中的文件时也不会在里面再生成缓存
+    load_cached_arrays(cache_dir / "meta.json")
+    assert not (cache_dir / "meta.json.cache").exists()
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import json
+import subprocess
+from pathlib import Path
+
+from conftest import make_records, write_json_array
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def _run(code, *args):
+    """在新进程中运行（本进程已经导入了 NumPy），没有图形界面"""
+    env = {key: value for key, value in os.environ.items() if key not in ("DISPLAY", "MPLBACKEND")}
+    result = subprocess.run([sys.executable, "-c", code, *map(str, args)], cwd=ROOT, env=env,
+                            capture_output=True, text=True, timeout=120)
+    assert result.returncode == 0, result.stderr
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def test_import_does_not_load_numpy_or_matplotlib():
+    loaded = _run("import sys, json, chart_generator\n"
+                  "print(json.dumps([m for m in ('numpy', 'matplotlib') if m in sys.modules]))")
+    assert loaded == []
+
+
+def test_export_runs_headless_without_matplotlib(tmp_path):
+    data = tmp_path / "data.json"
+    write_json_array(data, make_records(50))
+    out = tmp_path / "out.csv"
+    loaded = _run("import sys, json, chart_generator\n"
+                  "chart_generator.main(['export', sys.argv[1], '-o', sys.argv[2], '--no-cache'])\n"
+                  "print(json.dumps('matplotlib' in sys.modules))", data, out)
+    assert loaded is False
+    lines = out.read_text(encoding="utf-8").splitlines()
+    assert lines[0] == "timestamp,cpu,gpu"
+    assert lines[1] == "2026-01-01T00:00:00,40.0,"
+    assert len(lines) == 51
+
+
+def test_trend_renders_headless(tmp_path):
+    data = tmp_path / "data.json"
+    write_json_array(data, make_records(500))
+    png = tmp_path / "trend.png"
+    backend = _run("import sys, json, chart_generator\n"
+                   "chart_generator.main(['trend', sys.argv[1], '-o', sys.argv[2], '--no-rollups', '--no-cache'])\n"
+                   "import matplotlib\n"
+                   "print(json.dumps(matplotlib.get_backend()))", data, png)
+    assert backend.lower() == "agg"
+    assert png.stat().st_size > 0
+
+
+def test_summary_from_rollups_does_not_load_numpy(tmp_path):
+    import rollups
+
+    data = tmp_path / "data.json"
+    write_json_array(data, make_records(300, interval=30.0))
+    rollups.rebuild(data)
+    result = _run("import io, sys, json, contextlib, chart_generator\n"
+                  "out = io.StringIO()\n"
+                  "with contextlib.redirect_stdout(out):\n"
+                  "    chart_generator.main(['summary', sys.argv[1], '--json'])\n"
+                  "print(json.dumps({'numpy': 'numpy' in sys.modules, 'summary': json.loads(out.getvalue())}))", data)
+    assert result["numpy"] is False
+    assert result["summary"]
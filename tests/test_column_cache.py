@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+
+import json
+
+from conftest import make_records, write_json_array
+from batch_report import find_data_files
+from column_cache import ColumnCache, cache_dir_for, is_cache_dir, load_cached_arrays
+from storage import SegmentedStorage
+
+
+def _meta(path):
+    return json.loads((cache_dir_for(path) / "meta.json").read_text(encoding="utf-8"))
+
+
+def test_data_under_cache_ancestor_is_cached_and_scanned(tmp_path):
+    data_path = tmp_path / ".cache" / "mon" / "data.json"
+    data_path.parent.mkdir(parents=True)
+    write_json_array(data_path, make_records(20))
+    host_path = tmp_path / "hosts" / "cache" / "data.json"
+    host_path.parent.mkdir(parents=True)
+    write_json_array(host_path, make_records(5))
+
+    assert len(load_cached_arrays(data_path)) == 20
+    assert (data_path.parent / "data.json.cache" / "meta.json").exists()
+    assert not is_cache_dir(tmp_path / ".cache")
+    assert not is_cache_dir(host_path.parent)
+    assert is_cache_dir(data_path.parent / "data.json.cache")
+    assert find_data_files([str(tmp_path)]) == [data_path, host_path]
+
+
+def test_append_refresh_then_rebuild(tmp_path):
+    records = make_records(300)
+    storage = SegmentedStorage(tmp_path / "data", fsync="never")
+    storage.append_many(records[:200])
+    assert len(load_cached_arrays(storage.location)) == 200
+    generation = _meta(storage.location)["generation"]
+
+    # 只追加：解析新记录，继续使用同一代列文件
+    storage.append_many(records[200:])
+    storage.close()
+    data = load_cached_arrays(storage.location)
+    assert len(data) == 300
+    assert _meta(storage.location)["generation"] == generation
+    assert str(data.timestamps[-1]) == records[-1]["timestamp"] + ".000"
+
+    # 已缓存的部分被改写：重新生成
+    segment = SegmentedStorage.list_segments(storage.location)[-1][2]
+    lines = segment.read_bytes().splitlines(keepends=True)
+    segment.write_bytes(b"".join(lines[100:]))
+    data = load_cached_arrays(storage.location)
+    assert len(data) == 200
+    assert _meta(storage.location)["generation"] == generation + 1
+    assert not list(cache_dir_for(storage.location).glob(f"*.{generation}.bin"))
+    assert ColumnCache(storage.location).load()[0].timestamps.shape == (200,)
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+
+import json
+import datetime
+
+import numpy as np
+
+from conftest import make_records, write_json_array
+from data_loader import load_arrays, parse_chunk, iter_records
+
+
+def test_load_arrays_streams_chunks_into_columns(tmp_path):
+    records = make_records(50)
+    path = tmp_path / "data.json"
+    write_json_array(path, records)
+
+    # 块远小于记录数，结果与一次解析相同
+    arrays = load_arrays(path, chunk_records=7)
+    assert len(arrays) == 50
+    assert arrays.timestamps.dtype == np.dtype('datetime64[ms]')
+    assert arrays.column("cpu").dtype == np.float32
+    assert arrays.timestamps[0] == np.datetime64("2026-01-01T00:00:00", 'ms')
+    assert arrays.timestamps[-1] == np.datetime64("2026-01-01T00:00:49", 'ms')
+    assert arrays.column("cpu").tolist() == [40.0 + i % 10 for i in range(50)]
+    # 缺失的GPU读数为NaN
+    gpu = arrays.column("gpu")
+    assert np.isnan(gpu[::7]).all()
+    assert int(np.isnan(gpu).sum()) == 8
+
+
+def test_load_arrays_filters_range_in_json_lines(tmp_path):
+    path = tmp_path / "data.json"
+    path.write_text("".join(json.dumps(record) + "\n" for record in make_records(300)), encoding="utf-8")
+
+    start = datetime.datetime(2026, 1, 1, 0, 1, 40)
+    end = datetime.datetime(2026, 1, 1, 0, 2, 9)
+    arrays = load_arrays(path, start, end, chunk_records=16)
+    assert len(arrays) == 30
+    assert arrays.timestamps[0] == np.datetime64(start, 'ms')
+    assert arrays.timestamps[-1] == np.datetime64(end, 'ms')
+    assert arrays.column("cpu").tolist() == [40.0 + i % 10 for i in range(100, 130)]
+
+
+def test_invalid_records_and_timestamps_are_skipped(tmp_path):
+    records = make_records(6)
+    records[2]["timestamp"] = "not a time"
+    records.insert(4, {"temperatures": {"cpu": 1.0}})
+    records.insert(5, "garbage")
+    path = tmp_path / "data.json"
+    write_json_array(path, records)
+
+    arrays = load_arrays(path)
+    assert len(arrays) == 5
+    assert 42.0 not in arrays.column("cpu").tolist()
+    # iter_records 原样返回所有条目，由 load_arrays 跳过无效的
+    assert len(list(iter_records(path))) == 8
+
+
+def test_parse_chunk_falls_back_per_value():
+    timestamps, columns = parse_chunk(["2026-01-01T00:00:00", "bad", "2026-01-01T00:00:02"],
+                                      {"cpu": [1.0, 2.0, 3.0]})
+    assert timestamps.tolist() == [datetime.datetime(2026, 1, 1), datetime.datetime(2026, 1, 1, 0, 0, 2)]
+    assert columns["cpu"].tolist() == [1.0, 3.0]
@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import pytest
+
+from downsample import decimate
+
+
+@pytest.mark.parametrize("method", ["m4", "lttb"])
+def test_gaps_are_kept_as_nan_separators(method):
+    x = np.arange(1000).astype('datetime64[s]')
+    y = np.sin(np.arange(1000) / 50.0) * 10 + 50
+    y[300:400] = np.nan
+    ts, values = decimate(x, y, 40, method)
+
+    gaps = np.flatnonzero(np.isnan(values))
+    assert len(gaps) == 1
+    # 断开点两边是缺失段前后的原始端点，断开点位于缺失段的开头
+    assert ts[gaps[0] - 1] == x[299] and ts[gaps[0] + 1] == x[400]
+    assert ts[gaps[0]] == x[300]
+    assert np.all(np.diff(ts.astype(np.int64)) > 0)
+
+
+def test_without_gaps_nothing_is_inserted():
+    x = np.arange(100).astype('datetime64[s]')
+    y = np.arange(100, dtype=np.float64)
+    y[-1] = np.nan  # 末尾的缺失值不产生断开点
+    ts, values = decimate(x, y, 8)
+    assert not np.isnan(values).any()
+    assert ts[-1] == x[98]
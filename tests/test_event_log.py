@@ -0,0 +1,23 @@
+# -*- coding: utf-8 -*-
+
+import event_log
+from event_log import setup_event_log
+
+
+def test_reconfigure_replaces_listener(tmp_path):
+    first = tmp_path / "first.log"
+    second = tmp_path / "second.log"
+    log = setup_event_log({"file": str(first)}, name="test_reconfigure")
+    log.info("第一次")
+    old_listener, old_output = event_log._listeners["test_reconfigure"]
+
+    log = setup_event_log({"file": str(second), "format": "json"}, name="test_reconfigure")
+    log.info("第二次")
+    # 旧的写日志线程已经停止，排队的日志已经写出
+    assert old_listener._thread is None
+    assert old_output.stream is None
+    assert "第一次" in first.read_text(encoding="utf-8")
+
+    event_log._stop(*event_log._listeners.pop("test_reconfigure"))
+    text = second.read_text(encoding="utf-8")
+    assert '"event": "第二次"' in text and "第一次" not in text
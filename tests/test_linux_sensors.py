@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+
+import os
+
+import pytest
+
+from linux_sensors import SysfsSensorBackend
+
+
+def _write(path, text):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text + "\n", encoding="utf-8")
+
+
+@pytest.fixture
+def sysfs(tmp_path):
+    """模拟的 /sys：coretemp（两个核心温度，其中一个没有标签）、amdgpu、两个 thermal_zone"""
+    devices = tmp_path / "sys" / "devices"
+    hwmon = tmp_path / "sys" / "class" / "hwmon"
+    thermal = tmp_path / "sys" / "class" / "thermal"
+
+    _write(hwmon / "hwmon0" / "name", "coretemp")
+    (devices / "platform" / "coretemp.0").mkdir(parents=True)
+    os.symlink(devices / "platform" / "coretemp.0", hwmon / "hwmon0" / "device")
+    _write(hwmon / "hwmon0" / "temp1_input", "45000")
+    _write(hwmon / "hwmon0" / "temp1_label", "Package id 0")
+    _write(hwmon / "hwmon0" / "temp2_input", "43500")
+
+    _write(hwmon / "hwmon1" / "name", "amdgpu")
+    (devices / "pci0000:00" / "0000:03:00.0").mkdir(parents=True)
+    os.symlink(devices / "pci0000:00" / "0000:03:00.0", hwmon / "hwmon1" / "device")
+    _write(hwmon / "hwmon1" / "temp1_input", "52125")
+    _write(hwmon / "hwmon1" / "temp1_label", "edge")
+
+    _write(thermal / "thermal_zone0" / "type", "x86_pkg_temp")
+    _write(thermal / "thermal_zone0" / "temp", "44000")
+    _write(thermal / "thermal_zone1" / "type", "acpitz")
+    _write(thermal / "thermal_zone1" / "temp", "30000")
+
+    backend = SysfsSensorBackend(tmp_path)
+    yield tmp_path, backend
+    backend.close()
+
+
+def test_discovers_sensors_with_stable_ids_and_labels(sysfs):
+    _, backend = sysfs
+    sensors = {sensor.id: sensor for sensor in backend.sensors}
+    assert sorted(sensors) == ["cpu.coretemp.coretemp_0.package_id_0", "cpu.coretemp.coretemp_0.temp2",
+                               "cpu.thermal.thermal_zone0", "gpu.amdgpu.0000_03_00_0.edge",
+                               "other.thermal.thermal_zone1"]
+    assert sensors["gpu.amdgpu.0000_03_00_0.edge"].labels == {"device": "0000:03:00.0", "driver": "amdgpu",
+                                                              "sensor": "edge"}
+    assert sensors["cpu.thermal.thermal_zone0"].labels == {"device": "thermal_zone0", "driver": "x86_pkg_temp"}
+    assert sensors["cpu.coretemp.coretemp_0.temp2"].component == "cpu"
+
+
+def test_readings_are_scaled_from_millidegrees(sysfs):
+    _, backend = sysfs
+    # hwmon 优先于 thermal_zone
+    assert backend.cpu_readings() == {"cpu.coretemp.coretemp_0.package_id_0": 45.0,
+                                      "cpu.coretemp.coretemp_0.temp2": 43.5}
+    assert backend.gpu_readings() == {"gpu.amdgpu.0000_03_00_0.edge": 52.12}
+
+
+def test_rereads_through_cached_descriptors(sysfs):
+    root, backend = sysfs
+    fds = [sensor.fd for sensor in backend.sensors]
+    temp = root / "sys" / "class" / "hwmon" / "hwmon1" / "temp1_input"
+    # 驱动在原文件中更新读数（同一个 inode），不需要重新打开
+    with open(temp, "r+", encoding="utf-8") as f:
+        f.write("61000\n")
+    assert backend.gpu_readings() == {"gpu.amdgpu.0000_03_00_0.edge": 61.0}
+    assert [sensor.fd for sensor in backend.sensors] == fds
+
+    # 读取失败（例如显卡休眠时返回的不是数字）时跳过这个传感器
+    with open(temp, "w", encoding="utf-8") as f:
+        f.write("x\n")
+    assert backend.gpu_readings() == {}
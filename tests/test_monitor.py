@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+
+import json
+import time
+import subprocess
+
+import pytest
+
+from conftest import make_records, write_json_array
+
+
+@pytest.fixture
+def make_monitor(tmp_path, monkeypatch):
+    """在临时目录中按给定配置创建 TemperatureMonitor（不启动采样循环）"""
+    import main
+
+    monkeypatch.chdir(tmp_path)
+    created = []
+
+    def make(config):
+        # 采样日志写到文件：写日志线程在测试结束后仍可能输出，不能写到 pytest 捕获的 stdout
+        config = dict({"sensor_backend": "windows", "logging": {"file": str(tmp_path / "events.log")}}, **config)
+        (tmp_path / "config.json").write_text(json.dumps(config), encoding="utf-8")
+        monitor = main.TemperatureMonitor()
+        created.append(monitor)
+        return monitor
+
+    yield make
+    for monitor in created:
+        monitor.executor.shutdown(wait=False)
+        if monitor.telemetry is not None:
+            monitor.telemetry.close()
+        if monitor.storage is not None:
+            monitor.storage.close()
+
+
+def test_agent_mode_does_not_touch_local_storage(tmp_path, make_monitor):
+    write_json_array(tmp_path / "data.json", make_records(5))
+    monitor = make_monitor({"agent": {"enabled": True}, "telemetry": {"enabled": True, "port": 0}})
+
+    assert monitor.storage is None and monitor.rollups is None
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["config.json", "data.json", "events.log"]
+    # 遥测接口只能查询列式缓冲
+    assert monitor.telemetry.query_range(0)["records"] == 0
+
+
+class FailedWriter:
+    def put(self, record):
+        raise RuntimeError("写入线程已停止: OSError('disk failed')")
+
+
+def test_save_data_survives_failed_writer(make_monitor, capsys):
+    monitor = make_monitor({})
+    monitor.writer = FailedWriter()
+    for record in make_records(3):
+        monitor.save_data(record)
+    assert capsys.readouterr().out.count("无法保存数据") == 1
+    assert "records_unsaved_total 3" in monitor.metrics.render()
+
+
+def _probe(value=None, delay=0.0, error=None):
+    def probe():
+        time.sleep(delay)
+        if error is not None:
+            raise error
+        return value
+    return probe
+
+
+def _pick(monitor, methods, timeout):
+    probes = monitor._submit_probes("gpu", methods)
+    started = time.monotonic()
+    result = monitor._pick_result("gpu", probes, started + timeout)
+    return result, time.monotonic() - started
+
+
+def test_pick_result_prefers_higher_priority_within_deadline(make_monitor):
+    monitor = make_monitor({})
+    result, _ = _pick(monitor, [("slow", _probe({"gpu.a": 50.0}, delay=0.2)), ("fast", _probe({"gpu.b": 60.0}))], 2.0)
+    assert result[:2] == ("slow", {"gpu.a": 50.0})
+
+
+def test_pick_result_falls_back_when_higher_priority_misses_deadline(make_monitor):
+    monitor = make_monitor({})
+    result, elapsed = _pick(monitor, [("hung", _probe({"gpu.a": 50.0}, delay=1.0)), ("fast", _probe(61.5))], 0.2)
+    assert result[:2] == ("fast", {"gpu.fast": 61.5})
+    assert elapsed < 0.9
+    assert 'result="timeout"' in monitor.metrics.render()
+
+
+def test_pick_result_does_not_wait_after_higher_priority_fails(make_monitor):
+    monitor = make_monitor({})
+    methods = [("broken", _probe(error=RuntimeError("no wmi"))), ("empty", _probe(None)), ("ok", _probe({"gpu.c": 40.0}))]
+    result, elapsed = _pick(monitor, methods, 5.0)
+    assert result[:2] == ("ok", {"gpu.c": 40.0})
+    assert elapsed < 1.0
+
+
+def test_failed_cached_method_is_reprobed_in_same_tick(make_monitor):
+    monitor = make_monitor({})
+    monitor.get_gpu_methods = lambda: [("cached", _probe(None)), ("other", _probe({"gpu.d": 45.0}))]
+    monitor.gpu_probe_cache.record_success("cached")
+    result = monitor._collect_component("gpu", time.monotonic() + 2.0)
+    assert result[:2] == ("other", {"gpu.d": 45.0})
+    assert monitor.gpu_probe_cache.preferred == "other"
+    assert monitor.gpu_probe_cache.is_backed_off("cached")
+
+
+def test_powershell_probe_returns_each_gpu_sensor(make_monitor, monkeypatch):
+    import main
+
+    monitor = make_monitor({})
+    output = ("/nvidiagpu/0/temperature/0|GPU Core|61.5\n"
+              "/nvidiagpu/0/temperature/2|GPU Hot Spot|72.25\n"
+              "/atigpu/1/temperature/0|GPU Core|\n"
+              "/nvidiagpu/0/temperature/9|GPU Bogus|255\n")
+    monkeypatch.setattr(main.subprocess, "run",
+                        lambda *args, **kwargs: subprocess.CompletedProcess(args, 0, stdout=output, stderr=""))
+    assert monitor.get_gpu_temp_via_powershell() == {"gpu.ohm.nvidiagpu_0_temperature_0": 61.5,
+                                                     "gpu.ohm.nvidiagpu_0_temperature_2": 72.25}
+    assert monitor._sensor_labels["gpu.ohm.nvidiagpu_0_temperature_2"] == {"driver": "ohm", "sensor": "GPU Hot Spot"}
+
+
+def test_hot_threshold_from_temperature_alert_rules(make_monitor):
+    monitor = make_monitor({
+        "alerts": {"enabled": True, "sinks": [], "rules": [
+            {"type": "threshold", "name": "cpu_hot", "sensors": "cpu", "high": 85},
+            {"type": "threshold", "name": "any_hot", "sensors": "*", "high": 95},
+            {"type": "threshold", "name": "core_hot", "sensors": "cpu.*", "high": 70, "source": "sensors"},
+        ]},
+        "adaptive_sampling": {"enabled": True, "min_interval_seconds": 1, "max_interval_seconds": 30,
+                              "threshold_margin": 3},
+    })
+    # 只使用 temperatures 中的阈值规则：最低的 high 减去 threshold_margin
+    assert monitor.adaptive["cpu"].hot_threshold == 82
+    assert monitor.adaptive["gpu"].hot_threshold == 92
+    assert monitor._hot_threshold("cpu", {"hot_threshold": 60}) == 60
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+
+from metrics import MetricsRegistry
+from probe_cache import ProbeCache
+
+METHODS = [("NVIDIA-SMI", None), ("PowerShell", None), ("WMI", None)]
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def _names(methods):
+    return [name for name, _ in methods]
+
+
+def test_preferred_method_is_used_until_it_fails():
+    metrics = MetricsRegistry()
+    cache = ProbeCache(clock=FakeClock(), metrics=metrics)
+    assert _names(cache.select(METHODS)) == ["NVIDIA-SMI", "PowerShell", "WMI"]
+    cache.record_failure("NVIDIA-SMI")
+    cache.record_success("PowerShell")
+    for _ in range(3):
+        assert _names(cache.select(METHODS)) == ["PowerShell"]
+        cache.record_success("PowerShell")
+    assert (cache.hits, cache.misses) == (3, 1)
+
+    cache.record_failure("PowerShell")
+    assert cache.preferred is None
+    # 两个失败的方法都在退避期
+    assert _names(cache.select(METHODS)) == ["WMI"]
+    assert cache.misses == 2
+    text = metrics.render()
+    assert 'tempmon_probe_cache_hits_total{component="gpu"} 3' in text
+    assert 'tempmon_probe_cache_misses_total{component="gpu"} 2' in text
+
+
+def test_backoff_doubles_up_to_max_and_expires():
+    clock = FakeClock()
+    cache = ProbeCache(backoff_base=10, backoff_max=30, clock=clock)
+    delays = []
+    for _ in range(4):
+        cache.record_failure("WMI")
+        delays.append(cache._failures["WMI"][1] - clock.now)
+    assert delays == [10, 20, 30, 30]
+
+    assert cache.is_backed_off("WMI")
+    clock.now += 29.9
+    assert cache.is_backed_off("WMI")
+    clock.now += 0.1
+    assert not cache.is_backed_off("WMI")
+    assert "WMI" in _names(cache.select(METHODS))
+
+    # 成功后清除失败计数，下一次失败重新从 backoff_base 开始
+    cache.record_success("WMI")
+    cache.record_failure("WMI")
+    assert cache._failures["WMI"][1] - clock.now == 10
+
+
+def test_all_methods_backed_off_are_still_tried():
+    cache = ProbeCache(clock=FakeClock())
+    for name, _ in METHODS:
+        cache.record_failure(name)
+    assert _names(cache.select(METHODS)) == ["NVIDIA-SMI", "PowerShell", "WMI"]
+    assert set(cache.stats()["backed_off"]) == {"NVIDIA-SMI", "PowerShell", "WMI"}
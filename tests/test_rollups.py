@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+
+import math
+import datetime
+
+import pytest
+
+from rollups import (RollupWriter, collect_buckets, series_buckets, summarize, read_tier, tier_path, to_epoch,
+                     RECORDS_KEY)
+
+START = datetime.datetime(2026, 1, 1)
+
+
+def _samples(count, interval):
+    """(时间, 温度)，温度随时间变化以便检查各级统计"""
+    return [(START + datetime.timedelta(seconds=i * interval), 30.0 + i % 17) for i in range(count)]
+
+
+def _write(directory, samples):
+    writer = RollupWriter(directory)
+    for timestamp, value in samples:
+        writer.add(timestamp, {"cpu": value})
+    return writer
+
+
+def test_crash_loses_at_most_the_open_minute(tmp_path):
+    samples = _samples(360, 30)
+    writer = _write(tmp_path, samples[:150])
+    # 模拟崩溃：不写出当前桶，最后一行只写了一半
+    for f in writer._files:
+        f.close()
+    with open(tier_path(tmp_path, "1m"), 'ab') as f:
+        f.write(b'{"t":1767226')
+
+    _write(tmp_path, samples[150:]).close()
+
+    # 崩溃前最后一分钟（第74分钟）的2个样本丢失，其余不重复计数
+    total = summarize(collect_buckets(tmp_path), "cpu")
+    assert total["count"] == 358
+    assert total["max"] == 46.0
+    hours = read_tier(tier_path(tmp_path, "1h"))
+    assert [t for t, _ in hours] == [to_epoch(START), to_epoch(START) + 3600]
+    assert hours[0][1]["cpu"][0] == 120
+    assert hours[1][1][RECORDS_KEY][0] == 118
+
+
+def test_collect_buckets_matches_raw_samples(tmp_path):
+    samples = _samples(2 * 24 * 60, 120)
+    _write(tmp_path, samples).close()
+
+    start = to_epoch(START + datetime.timedelta(hours=5, minutes=17))
+    end = to_epoch(START + datetime.timedelta(days=1, hours=20, minutes=42))
+    buckets = collect_buckets(tmp_path, start, end)
+    # 中间的整天/整小时用粗桶，两端用分钟桶补齐
+    assert len(buckets) < 200
+
+    values = [value for timestamp, value in samples if start <= to_epoch(timestamp) < end]
+    summary = summarize(buckets, "cpu")
+    assert summary["count"] == len(values)
+    assert summary["min"] == min(values)
+    assert summary["max"] == max(values)
+    assert summary["mean"] == pytest.approx(sum(values) / len(values))
+    mean = sum(values) / len(values)
+    assert summary["std"] == pytest.approx(math.sqrt(sum((v - mean) ** 2 for v in values) / len(values)))
+
+
+def test_series_buckets_choose_tier(tmp_path):
+    _write(tmp_path, _samples(3 * 24 * 60, 60)).close()
+    start = to_epoch(START)
+
+    tier, buckets = series_buckets(tmp_path, start, start + 2 * 86400, 24)
+    assert tier == "1h"
+    assert len(buckets) == 48
+    tier, _ = series_buckets(tmp_path, start, start + 3 * 86400, 3)
+    assert tier == "1d"
+    # 跨度太短时使用原始数据
+    assert series_buckets(tmp_path, start, start + 30, 10) is None
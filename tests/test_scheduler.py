@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from scheduler import DeadlineScheduler
+
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def _scheduler(intervals, clock):
+    scheduler = DeadlineScheduler(intervals, clock=clock)
+
+    def sleep_until(deadline):
+        # 模拟系统定时器：总是晚 3 毫秒醒来
+        clock.now = max(clock.now, deadline + 0.003)
+        return True
+
+    scheduler._sleep_until = sleep_until
+    return scheduler
+
+
+def test_deadlines_do_not_drift():
+    clock = FakeClock()
+    scheduler = _scheduler({"cpu": 0.1}, clock)
+    # 第一次立即触发，第 k 次的计划时间为 起点 + k*周期
+    for k in range(10000):
+        tick = scheduler.wait()
+        assert tick.deadline == pytest.approx(1000.0 + k * 0.1, abs=1e-6)
+        clock.now += 0.04  # 每次采样的处理时间
+    stats = scheduler.stats()["cpu"]
+    assert stats["ticks"] == 10000 and stats["missed"] == 0
+    assert stats["max_lateness_ms"] == pytest.approx(3.0, abs=0.01)
+
+
+def test_slow_ticks_skip_missed_deadlines():
+    clock = FakeClock()
+    scheduler = _scheduler({"cpu": 1.0, "gpu": 2.0}, clock)
+    assert scheduler.wait().due == ["cpu", "gpu"]
+    clock.now += 2.5  # 处理超过两个周期
+    tick = scheduler.wait()
+    assert tick.due == ["cpu"]
+    assert tick.missed == {"cpu": 1}
+    # 之后仍然对齐到 起点 + k*周期：gpu 的 1002 已经过去，立即触发；cpu 跳到 1003
+    tick = scheduler.wait()
+    assert tick.due == ["gpu"] and tick.missed == {}
+    assert scheduler.next_deadline() == pytest.approx(1003.0)
+    assert scheduler.stats()["cpu"]["missed"] == 1
+
+
+def test_set_interval_realigns_from_last_deadline():
+    clock = FakeClock()
+    scheduler = _scheduler({"cpu": 1.0}, clock)
+    scheduler.wait()
+    scheduler.wait()
+    scheduler.set_interval("cpu", 5.0)
+    assert [scheduler.wait().deadline for _ in range(3)] == pytest.approx([1006.0, 1011.0, 1016.0])
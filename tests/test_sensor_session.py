@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+
+import sys
+import time
+
+import pytest
+
+from sensor_session import StreamingSession, ReplSession, parse_nvidia_smi_line
+
+
+def _python(script):
+    return [sys.executable, "-u", "-c", script]
+
+
+# 把stdin的每一行当作一条Python语句执行的简易解释器
+REPL = _python("import sys\nfor line in sys.stdin:\n    exec(line)")
+
+
+def test_streaming_session_reads_lines():
+    session = StreamingSession(_python("import time\nprint('0, 51')\nprint('junk')\nprint('1, 63')\ntime.sleep(30)"),
+                               parse_nvidia_smi_line)
+    try:
+        readings = session.readings(max_age=5)
+        deadline = time.monotonic() + 5
+        while len(readings) < 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+            readings = session.readings(max_age=5)
+        assert {key: value for key, (value, _) in readings.items()} == {0: 51.0, 1: 63.0}
+    finally:
+        session.close()
+
+
+def test_streaming_session_restarts_after_exit():
+    session = StreamingSession(_python("print('0, 40')"), parse_nvidia_smi_line, restart_delay=0)
+    try:
+        session.readings(max_age=5)
+        session.process.wait(5)
+        assert session.readings(max_age=5)[0][0] == 40.0
+        assert session.spawns == 2
+    finally:
+        session.close()
+
+
+def test_silent_child_only_blocks_first_call():
+    session = StreamingSession(_python("import time\ntime.sleep(30)"), parse_nvidia_smi_line)
+    try:
+        started = time.monotonic()
+        assert session.readings(max_age=0.3) == {}
+        assert time.monotonic() - started >= 0.25
+        started = time.monotonic()
+        for _ in range(5):
+            assert session.readings(max_age=0.3) == {}
+        assert time.monotonic() - started < 0.2
+    finally:
+        session.close()
+
+
+def test_repl_session_sentinel_framing():
+    session = ReplSession(REPL, sentinel_command="print('{sentinel}')", restart_delay=0)
+    try:
+        assert session.query("print('a');\nprint('b')") == ["a", "b"]
+        assert session.query("x = 1") == []
+        assert session.query("print(x + 1)") == ["2"]
+        assert session.spawns == 1
+    finally:
+        session.close()
+
+
+def test_repl_session_restarts_after_timeout():
+    session = ReplSession(REPL, sentinel_command="print('{sentinel}')", restart_delay=0)
+    try:
+        with pytest.raises(TimeoutError):
+            session.query("import time; time.sleep(30)", timeout=0.3)
+        assert session.query("print('ok')") == ["ok"]
+        assert session.spawns == 2
+    finally:
+        session.close()
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import pytest
+
+from stats_engine import series_stats, percentile, histogram, box_stats, PERCENTILES, RESOLUTION
+
+
+def _values(count=20000, seed=1):
+    rng = np.random.default_rng(seed)
+    # 读数精确到0.01°C，带一段高温尾部
+    values = np.concatenate([rng.normal(45.0, 4.0, count), rng.normal(80.0, 2.0, count // 20)])
+    return np.round(values, 2)
+
+
+def test_percentiles_within_half_resolution():
+    values = _values()
+    stats = series_stats(values)
+    for q in PERCENTILES + (1, 50.5, 100):
+        exact = np.percentile(values, q, method="inverted_cdf")
+        assert abs(percentile(stats, q) - exact) <= RESOLUTION / 2 + 1e-9, q
+    assert stats["percentiles"][50] == percentile(stats, 50)
+    assert percentile(stats, 0) == stats["min"]
+    assert percentile(stats, 100) <= stats["max"]
+
+
+def test_moments_skip_nan_and_keep_precision():
+    values = np.full(1000, np.nan)
+    values[::2] = 1e6 + np.arange(500) % 3  # 数值很大而方差很小
+    stats = series_stats(values)
+    assert stats["count"] == 500
+    assert stats["mean"] == pytest.approx(np.nanmean(values), abs=1e-9)
+    assert stats["std"] == pytest.approx(np.nanstd(values), rel=1e-9)
+    assert series_stats([np.nan, np.nan]) is None
+
+
+def test_histogram_matches_numpy():
+    values = _values(seed=2)
+    stats = series_stats(values)
+    counts, edges = histogram(stats, bins=30)
+    expected, expected_edges = np.histogram(values, 30)
+    assert np.allclose(edges, expected_edges)
+    assert counts.sum() == values.size
+    # 每个值最多移动半个分辨率，只有边界附近的值可能落入相邻的桶
+    assert np.abs(counts - expected).sum() <= 0.05 * values.size
+
+    counts, edges = histogram(series_stats([50.0] * 10), bins=4)
+    assert counts.sum() == 10
+    assert edges[0] < 50.0 < edges[-1]
+
+
+def test_box_stats_outliers():
+    values = np.concatenate([np.linspace(40.0, 50.0, 1001), [90.0, 95.0]])
+    stats = series_stats(values)
+    box = box_stats(stats, "cpu")
+    assert box["med"] == pytest.approx(np.median(values), abs=RESOLUTION)
+    assert box["whishi"] == pytest.approx(50.0)
+    assert box["fliers"].tolist() == pytest.approx([90.0, 95.0])
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+
+import datetime
+
+from conftest import make_records, write_json_array
+from storage import (SegmentedStorage, JsonArrayStorage, create_storage, import_json_array, index_path_for,
+                     INDEX_EVERY)
+from rollups import rollup_dir_for
+
+
+def _timestamps(directory):
+    return [record["timestamp"] for record in SegmentedStorage.read_records(directory)]
+
+
+def test_torn_record_is_truncated_on_open(tmp_path):
+    records = make_records(10)
+    storage = SegmentedStorage(tmp_path, fsync="never")
+    storage.append_many(records[:5])
+    storage.close()
+    segment = SegmentedStorage.list_segments(tmp_path)[-1][2]
+    with open(segment, 'ab') as f:
+        f.write(b'{"timestamp": "2026-01-01T00:00:0')  # 崩溃时写了一半
+
+    storage = SegmentedStorage(tmp_path, fsync="never")
+    storage.append_many(records[5:])
+    storage.close()
+    assert _timestamps(tmp_path) == [r["timestamp"] for r in records]
+
+
+def test_torn_index_entry_is_rebuilt(tmp_path):
+    storage = SegmentedStorage(tmp_path, fsync="never")
+    storage.append_many(make_records(INDEX_EVERY * 3))
+    storage.close()
+    segment = SegmentedStorage.list_segments(tmp_path)[-1][2]
+    good = SegmentedStorage.read_segment_index(segment)
+    with open(index_path_for(segment), 'ab') as f:
+        f.write(b'[1767225600.0,12\x00\n')
+
+    assert SegmentedStorage.read_segment_index(segment) == good
+    SegmentedStorage(tmp_path, fsync="never").close()
+    assert SegmentedStorage.read_segment_index(segment) == good
+    assert index_path_for(segment).read_bytes().endswith(b']\n')
+
+
+def test_import_streams_in_batches(tmp_path):
+    class Recorder:
+        def __init__(self):
+            self.batches = []
+
+        def append_many(self, records):
+            self.batches.append(len(records))
+
+    path = tmp_path / "data.json"
+    write_json_array(path, make_records(25))
+    storage = Recorder()
+    assert import_json_array(path, storage, batch_size=10) == 25
+    assert storage.batches == [10, 10, 5]
+
+
+def test_default_backend_migrates_legacy_file(tmp_path):
+    records = make_records(30)
+    legacy = tmp_path / "data.json"
+    write_json_array(legacy, records)
+    config = {"data_file": str(legacy), "storage": {"segment_dir": str(tmp_path / "segments"), "fsync": "never"}}
+
+    storage = create_storage(config)
+    assert isinstance(storage, SegmentedStorage)
+    storage.append_many(make_records(1, start=datetime.datetime(2026, 2, 1)))
+    storage.close()
+    assert len(_timestamps(tmp_path / "segments")) == 31
+    assert rollup_dir_for(tmp_path / "segments").is_dir()
+    assert legacy.exists()
+
+    # 分段目录已经有数据时不再导入
+    create_storage(config).close()
+    assert len(_timestamps(tmp_path / "segments")) == 31
+
+    assert isinstance(create_storage(dict(config, storage={"backend": "json"})), JsonArrayStorage)
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+
+import datetime
+import urllib.request
+
+from rollups import to_epoch
+from sensors import SensorRegistry, ColumnBuffer
+from telemetry_server import TelemetryServer
+
+
+def _server(tmp_path, rows=100, **kwargs):
+    registry = SensorRegistry("test-host")
+    buffer = ColumnBuffer(registry, capacity=rows)
+    registry.register("cpu.coretemp.core_0", "cpu")
+    registry.register("cpu.coretemp.core_1", "cpu")
+    registry.register("gpu.nvidia.0", "gpu", unit="celsius", device_index=0)
+    start = to_epoch(datetime.datetime(2026, 1, 1))
+    for i in range(rows):
+        readings = {"cpu.coretemp.core_0": 40.0 + i % 5, "cpu.coretemp.core_1": 42.0}
+        if i % 2 == 0:
+            readings["gpu.nvidia.0"] = 60.0
+        buffer.append_row(start + i, readings)
+    server = TelemetryServer(tmp_path / "data.json", buffer, port=0, **kwargs)
+    return server, start
+
+
+def test_recent_range_is_served_from_column_buffer(tmp_path):
+    server, start = _server(tmp_path)
+    try:
+        result = server.query_range(start + 10, start + 19, points=1000)
+        assert result["source"] == "recent"
+        assert result["records"] == 10
+        assert result["stats"]["cpu"]["max"] == 44.0
+        assert result["stats"]["gpu"]["count"] == 5
+        # 缓冲没有覆盖的范围不从缓冲返回
+        assert server.query_range(start - 10, start + 5)["source"] != "recent"
+    finally:
+        server.close()
+
+
+def test_stream_backlog_rebuilds_records(tmp_path):
+    server, start = _server(tmp_path)
+    try:
+        _, backlog = server.subscribe(start + 97)
+        assert [record["temperatures"] for record in backlog] == [{"cpu": 43.0, "gpu": 60.0}, {"cpu": 44.0}]
+        assert backlog[0]["timestamp"] == "2026-01-01T00:01:38"
+        assert backlog[1]["sensors"] == {"cpu.coretemp.core_0": 44.0, "cpu.coretemp.core_1": 42.0}
+        sensors = {sensor["id"]: sensor for sensor in server.sensors()}
+        assert sensors["gpu.nvidia.0"]["labels"] == {"device_index": 0, "host": "test-host"}
+        assert sensors["gpu.nvidia.0"]["value"] is None
+    finally:
+        server.close()
+
+
+def test_cors_header_only_for_allowed_origins(tmp_path):
+    server, _ = _server(tmp_path, allowed_origins=["http://localhost:3000"])
+    server.start()
+    try:
+        def headers(origin):
+            request = urllib.request.Request(server.address + "api/sensors", headers={"Origin": origin})
+            with urllib.request.urlopen(request, timeout=5) as response:
+                return response.headers
+
+        # 其他网站的页面不能跨域读取本机数据
+        assert headers("http://evil.example").get("Access-Control-Allow-Origin") is None
+        allowed = headers("http://localhost:3000")
+        assert allowed.get("Access-Control-Allow-Origin") == "http://localhost:3000"
+        assert allowed.get("Vary") == "Origin"
+    finally:
+        server.close()
+
+
+def test_registry_metadata_round_trip(tmp_path):
+    path = tmp_path / "data.json.sensors.json"
+    registry = SensorRegistry("a")
+    registry.register("gpu.nvidia.0", "gpu", unit="celsius", device_index=0)
+    registry.register("cpu.coretemp.core_0", "cpu", source="SYSFS")
+    registry.save(path)
+
+    loaded = SensorRegistry("b")
+    loaded.load(path)
+    assert [sensor.to_dict() for sensor in loaded] == [sensor.to_dict() for sensor in registry]
+    assert loaded.get("cpu.coretemp.core_0").index == 1
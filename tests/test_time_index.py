@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+
+import json
+import datetime
+
+import pytest
+
+from conftest import make_records, write_json_array
+from storage import SegmentedStorage, INDEX_EVERY, index_path_for
+from time_index import iter_range, load_file_index, seek_offset
+
+START = datetime.datetime(2026, 1, 1)
+COUNT = INDEX_EVERY * 5 + 17
+
+RANGES = [
+    (None, None),
+    (None, START + datetime.timedelta(seconds=10)),
+    (START - datetime.timedelta(days=1), START + datetime.timedelta(seconds=3)),
+    # 边界正好落在索引条目上
+    (START + datetime.timedelta(seconds=INDEX_EVERY), START + datetime.timedelta(seconds=INDEX_EVERY * 2)),
+    (START + datetime.timedelta(seconds=777), START + datetime.timedelta(seconds=1000)),
+    (START + datetime.timedelta(seconds=COUNT - 5), None),
+    (START + datetime.timedelta(days=1), None),
+]
+
+
+def _expected(records, start, end):
+    return [record["timestamp"] for record in records
+            if (start is None or record["timestamp"] >= start.isoformat())
+            and (end is None or record["timestamp"] <= end.isoformat())]
+
+
+def _timestamps(path, start, end):
+    return [record["timestamp"] for record in iter_range(path, start, end)]
+
+
+@pytest.mark.parametrize("fmt", ["array", "lines"])
+def test_file_range_matches_full_scan(tmp_path, fmt):
+    records = make_records(COUNT)
+    path = tmp_path / "data.json"
+    if fmt == "array":
+        write_json_array(path, records)
+    else:
+        path.write_text("".join(json.dumps(record) + "\n" for record in records), encoding="utf-8")
+
+    for start, end in RANGES:
+        assert _timestamps(path, start, end) == _expected(records, start, end), (start, end)
+    assert load_file_index(path)[0] == fmt
+    assert index_path_for(path).exists()
+
+
+def test_stale_file_index_is_rebuilt(tmp_path):
+    path = tmp_path / "data.json"
+    records = make_records(COUNT)
+    write_json_array(path, records[:INDEX_EVERY * 2])
+    _, entries = load_file_index(path)
+    assert len(entries) == 2
+
+    # 数据文件变化后索引按大小/修改时间失效
+    write_json_array(path, records)
+    _, entries = load_file_index(path)
+    assert len(entries) == 6
+    start = START + datetime.timedelta(seconds=INDEX_EVERY * 4 + 3)
+    assert _timestamps(path, start, None) == _expected(records, start, None)
+
+
+def test_segment_range_skips_earlier_segments(tmp_path):
+    records = make_records(COUNT)
+    storage = SegmentedStorage(tmp_path, segment_max_bytes=32 * 1024, fsync="never")
+    for i in range(0, COUNT, 50):
+        storage.append_many(records[i:i + 50])
+    storage.close()
+    assert len(SegmentedStorage.list_segments(tmp_path)) > 3
+
+    for start, end in RANGES:
+        assert _timestamps(tmp_path, start, end) == _expected(records, start, end), (start, end)
+
+
+def test_seek_offset():
+    entries = [(10.0, 0), (20.0, 100), (30.0, 200)]
+    assert seek_offset(entries, None) == 0
+    assert seek_offset(entries, 5.0) == 0
+    # 与条目时间相同的记录可能在该条目之前，从上一个条目开始读
+    assert seek_offset(entries, 20.0) == 0
+    assert seek_offset(entries, 25.0) == 100
+    assert seek_offset(entries, 99.0) == 200
+    assert seek_offset([], 25.0, default=7) == 7
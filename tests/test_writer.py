@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+
+import threading
+
+import pytest
+
+from conftest import make_records
+from storage import SegmentedStorage
+from writer import BackgroundWriter
+
+
+class StubStorage:
+    """记录每次 append_many 的批次；gate 未打开时写入阻塞，fail 中的异常依次抛出"""
+
+    def __init__(self, location, fail=()):
+        self.location = location
+        self.batches = []
+        self.fail = list(fail)
+        self.gate = threading.Event()
+        self.gate.set()
+
+    def append_many(self, records):
+        self.gate.wait()
+        if self.fail:
+            raise self.fail.pop(0)
+        self.batches.append(list(records))
+        return len(records)
+
+    def close(self):
+        pass
+
+
+def test_io_errors_are_retried(tmp_path):
+    storage = StubStorage(tmp_path / "data", fail=[OSError("disk full")])
+    writer = BackgroundWriter(storage, batch_size=5, batch_seconds=0.01, retry_seconds=0.01)
+    writer.start()
+    for record in make_records(5):
+        writer.put(record)
+    writer.close()
+    assert writer.failures == 1
+    assert writer.written == 5
+    assert writer.error is None
+
+
+def test_bad_record_stops_writer_and_put_raises(tmp_path):
+    storage = SegmentedStorage(tmp_path / "segments", fsync="never")
+    writer = BackgroundWriter(storage, batch_size=3, batch_seconds=0.01)
+    writer.start()
+    records = make_records(3)
+    records[1]["temperatures"]["cpu"] = {1, 2}  # 无法编码为JSON
+    for record in records:
+        writer.put(record)
+    writer._thread.join(5)
+    assert not writer._thread.is_alive()
+    assert isinstance(writer.error, TypeError)
+    with pytest.raises(RuntimeError):
+        writer.put(make_records(1)[0])
+    writer.close()
+    storage.close()
+    # 能编码的记录保存在溢出文件中，下次启动时补写
+    assert len(writer.spill_path.read_bytes().splitlines()) == 2
+    assert list(SegmentedStorage.read_records(tmp_path / "segments")) == []
+
+
+def test_blocked_put_wakes_when_writer_fails(tmp_path):
+    storage = StubStorage(tmp_path / "data", fail=[TypeError("bad record")])
+    storage.gate.clear()
+    writer = BackgroundWriter(storage, queue_size=2, batch_size=1, batch_seconds=0)
+    writer.start()
+    records = make_records(4)
+    errors = []
+
+    def produce():
+        try:
+            for record in records:
+                writer.put(record)
+        except RuntimeError as e:
+            errors.append(e)
+
+    producer = threading.Thread(target=produce)
+    producer.start()
+    producer.join(0.2)
+    # 写入阻塞、队列已满：采样线程在 put() 中等待（背压）
+    assert producer.is_alive()
+    assert writer.backlog() == 2
+    storage.gate.set()
+    producer.join(5)
+    assert not producer.is_alive()
+    assert errors
+    writer.close()
+
+
+def test_rollup_failure_does_not_stop_writer(tmp_path):
+    class BrokenRollups:
+        def add(self, timestamp, readings):
+            raise ValueError("bad timestamp")
+
+    storage = StubStorage(tmp_path / "data")
+    writer = BackgroundWriter(storage, BrokenRollups(), batch_size=2, batch_seconds=0.01)
+    writer.start()
+    for record in make_records(4):
+        writer.put(record)
+    writer.close()
+    assert writer.written == 4
+    assert writer.rollup_failures == 4
+    assert writer.error is None
+
+
+def test_deadband_only_filters_raw_storage(tmp_path):
+    from adaptive import DeadbandFilter
+
+    class Rollups:
+        def __init__(self):
+            self.added = []
+
+        def add(self, timestamp, readings):
+            self.added.append(timestamp)
+
+    records = make_records(20)
+    for record in records:
+        record["temperatures"] = {"cpu": 50.0}
+    storage = StubStorage(tmp_path / "data")
+    rollups = Rollups()
+    writer = BackgroundWriter(storage, rollups, batch_size=5, batch_seconds=0.01,
+                              deadband=DeadbandFilter(delta=0.5, max_seconds=10))
+    writer.start()
+    for record in records:
+        writer.put(record)
+    writer.close()
+    stored = [record["timestamp"] for batch in storage.batches for record in batch]
+    # 读数不变：每 max_seconds 秒保存一条，聚合收到所有记录
+    assert stored == [records[0]["timestamp"], records[10]["timestamp"]]
+    assert len(rollups.added) == 20
+    assert writer.suppressed == 18
+
+
+def test_on_commit_reports_committed_positions(tmp_path):
+    storage = StubStorage(tmp_path / "data")
+    storage.gate.clear()
+    writer = BackgroundWriter(storage, batch_size=4, batch_seconds=0.01)
+    commits = []
+    writer.on_commit = commits.append
+    writer.start()
+    assert writer.put_many(make_records(4)) == 4
+    assert writer.put_many(make_records(2)) == 6
+    assert writer.committed == 0  # 存储还没有写完
+    storage.gate.set()
+    writer.close()
+    assert commits == [4, 6]
+    assert writer.committed == 6
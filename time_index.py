@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+
+import io
+import json
+import bisect
+from pathlib import Path
+
+from archive import ARCHIVE_SUFFIX, ArchiveReader, archive_overlaps
+from data_loader import iter_json_array, archive_files, to_datetime64
+from rollups import to_epoch
+from storage import SegmentedStorage, INDEX_EVERY, index_path_for, record_epoch, write_index
+
+
+def file_format(path):
+    """data.json 是JSON数组（"array"）还是JSON Lines（"lines"）"""
+    with open(path, 'rb') as f:
+        head = f.read(4096).lstrip()
+    return "array" if head.startswith(b'[') else "lines"
+
+
+def build_file_index(path):
+    """扫描一个数据文件生成索引条目 [(时间, 字节偏移)]，返回 (格式, 条目)"""
+    fmt = file_format(path)
+    if fmt == "lines":
+        return fmt, SegmentedStorage.build_segment_index(path)
+
+    entries = []
+    # latin-1 把每个字节映射为一个字符，字符偏移就是字节偏移；newline='' 保留原始换行符
+    with open(path, 'r', encoding='latin-1', newline='') as f:
+        for i, (offset, record) in enumerate(iter_json_array(f, with_offsets=True)):
+            if i % INDEX_EVERY:
+                continue
+            epoch = record_epoch(record)
+            if epoch is not None:
+                entries.append((epoch, offset))
+    return fmt, entries
+
+
+def load_file_index(path):
+    """读取数据文件的索引；索引不存在或与文件的大小/修改时间不符时重新生成并保存"""
+    path = Path(path)
+    stat = path.stat()
+    index_path = index_path_for(path)
+    try:
+        with open(index_path, 'rb') as f:
+            header = json.loads(f.readline())
+            if header.get("size") == stat.st_size and header.get("mtime_ns") == stat.st_mtime_ns:
+                return header["format"], [tuple(json.loads(line)) for line in f if line.endswith(b'\n')]
+    except (OSError, ValueError, KeyError):
+        pass
+
+    fmt, entries = build_file_index(path)
+    try:
+        write_index(index_path, {"format": fmt, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}, entries)
+    except OSError as e:
+        print(f"无法保存索引 {index_path}: {e}")
+    return fmt, entries
+
+
+def seek_offset(entries, start, default=0):
+    """返回最后一个时间早于 start 的索引条目的偏移，该偏移之前的记录都早于 start"""
+    if start is None or not entries:
+        return default
+    i = bisect.bisect_left([epoch for epoch, _ in entries], start)
+    return entries[i - 1][1] if i > 0 else default
+
+
+def _select(records, start, end):
+    """从按时间排序的记录中选出 start <= 时间 <= end 的部分，超过 end 后立即停止读取"""
+    for record in records:
+        epoch = record_epoch(record)
+        if epoch is None:
+            continue
+        if end is not None and epoch > end:
+            return
+        if start is None or epoch >= start:
+            yield record
+
+
+def _read_lines(path, offset, size=None):
+    """从 offset 开始读取JSON Lines记录；给出 size 时忽略其后尚未写完的部分"""
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        pos = offset
+        for line in f:
+            pos += len(line)
+            if size is not None and (pos > size or not line.endswith(b'\n')):
+                return
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+def _read_array(path, offset):
+    """从 offset（某条记录开头的字节偏移，0表示文件开头）开始读取JSON数组中的记录"""
+    with open(path, 'rb') as raw:
+        raw.seek(offset)
+        f = io.TextIOWrapper(raw, encoding='utf-8')
+        yield from iter_json_array(f, in_array=offset > 0)
+
+
+def _segment_first_epoch(path):
+    """分段索引的第一个条目（分段第一条记录的时间），没有索引时返回 None"""
+    try:
+        with open(index_path_for(path), 'rb') as f:
+            f.readline()
+            line = f.readline()
+        return json.loads(line)[0] if line.endswith(b'\n') else None
+    except (OSError, ValueError):
+        return None
+
+
+def _segment_entries(path, size, is_last):
+    entries = SegmentedStorage.read_segment_index(path, size)
+    if entries is None:
+        # 旧版本写入的分段没有索引，扫描一次后保存（当前分段可能正在写入，由写入端生成）
+        entries = SegmentedStorage.build_segment_index(path, size)
+        if not is_last:
+            write_index(index_path_for(path), {"format": "lines", "every": INDEX_EVERY}, entries)
+    return entries
+
+
+def _iter_segments(directory, start, end):
+    segments = [path for _, _, path in SegmentedStorage.list_segments(directory)]
+    firsts = [_segment_first_epoch(path) for path in segments]
+    for i, path in enumerate(segments):
+        # 下一个分段的第一条记录早于 start 时，这个分段的所有记录都早于 start
+        next_first = next((epoch for epoch in firsts[i + 1:] if epoch is not None), None)
+        if start is not None and next_first is not None and next_first < start:
+            continue
+        if end is not None and firsts[i] is not None and firsts[i] > end:
+            return
+
+        size = path.stat().st_size
+        entries = _segment_entries(path, size, i == len(segments) - 1)
+        if end is not None and entries and entries[0][0] > end:
+            return
+        for record in _select(_read_lines(path, seek_offset(entries, start), size), start, end):
+            yield record
+        if end is not None and next_first is not None and next_first > end:
+            return
+
+
+def iter_range(path, start=None, end=None, include_archives=True):
+    """按稀疏时间索引遍历 [start, end] 内的记录（start/end 为 datetime、ISO字符串或 None）
+
+    用索引直接定位到范围开始前最近的位置，读到第一条晚于 end 的记录为止，
+    读取量只与结果大小（加上最多 INDEX_EVERY 条记录）有关。记录需要按时间顺序写入。
+    归档文件根据头部中的时间范围跳过不相关的文件。
+    """
+    path = Path(path)
+    if include_archives:
+        for archive in archive_files(path):
+            if archive_overlaps(archive, to_datetime64(start), to_datetime64(end)):
+                yield from _select(ArchiveReader(archive).iter_records(),
+                                   to_epoch(start) if start is not None else None,
+                                   to_epoch(end) if end is not None else None)
+    if path.suffix == ARCHIVE_SUFFIX:
+        return
+
+    start = to_epoch(start) if start is not None else None
+    end = to_epoch(end) if end is not None else None
+
+    if path.is_dir():
+        yield from _iter_segments(path, start, end)
+        return
+
+    fmt, entries = load_file_index(path)
+    if fmt == "array":
+        records = _read_array(path, seek_offset(entries, start))
+    else:
+        records = _read_lines(path, seek_offset(entries, start))
+    yield from _select(records, start, end)
@@ -0,0 +1,349 @@
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import time
+import threading
+from collections import deque
+from pathlib import Path
+
+from metrics import MetricsRegistry
+from storage import encode_record, record_epoch
+
+OVERFLOW_POLICIES = ("block", "drop_oldest", "spill")
+
+
+def spill_path_for(location):
+    """溢出文件默认放在数据文件/分段目录旁边：data.json -> data.json.spill.jsonl"""
+    return Path(str(location) + ".spill.jsonl")
+
+
+class BackgroundWriter:
+    """后台写入线程：采样线程只把记录放进有界队列，磁盘I/O在写入线程中完成
+
+    写入线程攒够 batch_size 条记录或第一条记录等待了 batch_seconds 秒后一次提交（group commit），
+    每批只调用一次 storage.append_many，同时更新聚合。设置了 deadband（adaptive.DeadbandFilter）时
+    聚合仍然包含每一条记录，只有通过死区压缩的记录写入存储。队列满时的处理方式（overflow）：
+    - block        采样线程等待队列有空位
+    - drop_oldest  丢弃队列中最旧的记录
+    - spill        写入溢出文件（JSON Lines），队列清空后按原顺序补写到存储；
+                   程序崩溃后留下的溢出文件在下次启动时补写
+    写入存储时出现I/O错误保留这一批记录，retry_seconds 后重试。其他错误（例如记录无法编码）重试也不会成功：
+    写入线程保存队列中的记录到溢出文件后停止，之后 put()/put_many() 抛出 RuntimeError，不会一直等待。
+    close() 会写完队列和溢出文件中的所有记录。
+
+    进入队列的记录按顺序编号：put_many() 返回最后一条记录的序号，committed 为已经写入存储
+    （或被 drop_oldest 丢弃）的记录数。每写完一批调用一次 on_commit(committed)（在写入线程中），
+    写入线程停止时也会调用一次，调用方可以据此在记录写入之后才确认（见 aggregator.Collector）。
+    """
+
+    def __init__(self, storage, rollups=None, queue_size=1000, batch_size=50, batch_seconds=1.0,
+                 overflow="block", spill_path=None, retry_seconds=1.0, deadband=None, metrics=None):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"未知的队列溢出策略: {overflow} (可选: {', '.join(OVERFLOW_POLICIES)})")
+        self.storage = storage
+        self.rollups = rollups
+        self.queue_size = max(int(queue_size), 1)
+        self.batch_size = max(int(batch_size), 1)
+        self.batch_seconds = batch_seconds
+        self.overflow = overflow
+        self.spill_path = Path(spill_path) if spill_path else spill_path_for(storage.location)
+        self.draining_path = Path(str(self.spill_path) + ".draining")
+        self.retry_seconds = retry_seconds
+        self.deadband = deadband
+        self.metrics = metrics if metrics is not None else MetricsRegistry()
+        self._batch_seconds = self.metrics.histogram("write_batch_seconds", "每批写入存储和聚合的耗时")
+        self._written_bytes = self.metrics.counter("write_bytes_total", "写入存储的字节数（json 后端为每次重写的文件大小）")
+        self._written_records = self.metrics.counter("write_records_total", "写入存储的记录数")
+        self._write_failures = self.metrics.counter("write_failures_total", "写入存储失败的次数")
+        self._queue_depth = self.metrics.gauge("writer_queue_depth", "写入队列中的记录数")
+        self._dropped = self.metrics.counter("writer_dropped_total", "队列满时丢弃的记录数")
+        self._spilled = self.metrics.counter("writer_spilled_total", "队列满时写入溢出文件的记录数")
+        self._rollup_failures = self.metrics.counter("rollup_failures_total", "更新聚合失败的记录数")
+        self._suppressed = self.metrics.counter("records_suppressed_total", "死区压缩没有保存的记录数")
+
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._closing = False
+        self._spill_file = None
+        self._thread = None
+        self._enqueued = 0
+        self.on_commit = None
+
+        self.written = 0
+        self.batches = 0
+        self.dropped = 0
+        self.spilled = 0
+        self.failures = 0
+        self.rollup_failures = 0
+        self.suppressed = 0
+        self.max_depth = 0
+        self.committed = 0
+        self.error = None  # 写入线程因无法重试的错误停止时保存该错误
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="storage-writer", daemon=True)
+        self._thread.start()
+
+    def _check_failed(self):
+        if self.error is not None:
+            raise RuntimeError(f"写入线程已停止: {self.error!r}")
+
+    def put(self, record):
+        """由采样线程调用，把一条记录放进写入队列；写入线程已经停止时抛出 RuntimeError"""
+        with self._cond:
+            self._check_failed()
+            full = len(self._queue) >= self.queue_size
+            if self.overflow == "spill" and (full or self._spill_file is not None):
+                # 开始溢出后新记录都写入溢出文件，直到补写完成，保证记录的时间顺序
+                self._spill(record)
+                return
+            if full:
+                if self.overflow == "drop_oldest":
+                    self._queue.popleft()
+                    self.committed += 1
+                    self.dropped += 1
+                    self._dropped.inc()
+                else:
+                    while len(self._queue) >= self.queue_size and not self._closing and self.error is None:
+                        self._cond.wait()
+                    self._check_failed()
+            self._queue.append(record)
+            self._enqueued += 1
+            self.max_depth = max(self.max_depth, len(self._queue))
+            self._queue_depth.set(len(self._queue))
+            self._cond.notify_all()
+
+    def put_many(self, records):
+        """一次放入多条记录（只获取一次锁）；溢出策略与 put() 相同
+
+        返回最后一条记录的序号，committed 达到该序号时这些记录都已写入（写入溢出文件的记录不计入）。
+        """
+        with self._cond:
+            self._check_failed()
+            free = self.queue_size - len(self._queue)
+            if self._spill_file is None and len(records) <= free:
+                self._queue.extend(records)
+                self._enqueued += len(records)
+                self.max_depth = max(self.max_depth, len(self._queue))
+                self._queue_depth.set(len(self._queue))
+                self._cond.notify_all()
+                return self._enqueued
+        for record in records:
+            self.put(record)
+        return self._enqueued
+
+    def backlog(self):
+        """队列中还没有写入的记录数"""
+        return len(self._queue)
+
+    def _spill(self, record):
+        if self._spill_file is None:
+            print(f"写入队列已满，记录暂存到 {self.spill_path}")
+            self._spill_file = open(self.spill_path, 'ab')
+        self._spill_file.write(encode_record(record))
+        self._spill_file.flush()
+        self.spilled += 1
+        self._spilled.inc()
+
+    def _next_batch(self):
+        """等待下一批记录；队列为空且已经关闭时返回 None"""
+        with self._cond:
+            while not self._queue and not self._closing:
+                if self._spill_file is not None:
+                    return []
+                self._cond.wait()
+            # group commit：等到攒够一批或第一条记录等待了 batch_seconds 秒
+            deadline = time.monotonic() + self.batch_seconds
+            while len(self._queue) < self.batch_size and not self._closing:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            if not self._queue:
+                return None
+            batch = [self._queue.popleft() for _ in range(min(self.batch_size, len(self._queue)))]
+            self._queue_depth.set(len(self._queue))
+            self._cond.notify_all()
+            return batch
+
+    def _stored(self, batch):
+        """经过死区压缩后需要写入存储的记录（时间戳无法解析的记录总是保存）"""
+        if self.deadband is None:
+            return batch
+        stored = []
+        for record in batch:
+            epoch = record_epoch(record)
+            if epoch is None or self.deadband.accept(record, epoch):
+                stored.append(record)
+        suppressed = len(batch) - len(stored)
+        self.suppressed += suppressed
+        self._suppressed.inc(suppressed)
+        return stored
+
+    def _commit(self, batch):
+        """写入一批记录并更新聚合；失败时每隔 retry_seconds 重试，正在关闭时改为保存到溢出文件"""
+        started = time.perf_counter()
+        stored = self._stored(batch)
+        while True:
+            try:
+                written = self.storage.append_many(stored) if stored else 0
+                break
+            except Exception as e:
+                self.failures += 1
+                self._write_failures.inc()
+                print(f"保存数据失败: {e}")
+                if not isinstance(e, OSError):
+                    # 不是I/O错误，重试也不会成功：保存这一批后由 _run 停止写入线程
+                    self._spill_on_close(batch)
+                    raise
+                if self._closing:
+                    self._spill_on_close(batch)
+                    return
+                time.sleep(self.retry_seconds)
+        if self.rollups is not None:
+            for record in batch:
+                try:
+                    self.rollups.add(record["timestamp"], {**record["temperatures"], **record.get("sensors", {})})
+                except Exception as e:
+                    # 原始记录已经写入，一条记录更新聚合失败不影响其他记录
+                    self.rollup_failures += 1
+                    self._rollup_failures.inc()
+                    print(f"更新聚合失败: {e}")
+        self.written += len(stored)
+        self.batches += 1
+        self._batch_seconds.observe(time.perf_counter() - started)
+        self._written_records.inc(len(stored))
+        self._written_bytes.inc(written or 0)
+
+    def _spill_on_close(self, batch):
+        """关闭时仍无法写入存储：保存到溢出文件，下次启动时补写；无法编码的记录被丢弃"""
+        with self._cond:
+            try:
+                if self._spill_file is None:
+                    self._spill_file = open(self.spill_path, 'ab')
+                saved = 0
+                for record in batch:
+                    try:
+                        line = encode_record(record)
+                    except (TypeError, ValueError) as e:
+                        print(f"丢弃无法编码的记录: {e}")
+                        continue
+                    self._spill_file.write(line)
+                    saved += 1
+                self._spill_file.flush()
+                print(f"{saved} 条记录已保存到 {self.spill_path}，下次启动时写入")
+            except OSError as e:
+                print(f"无法保存 {len(batch)} 条记录: {e}")
+
+    def _replay(self, path):
+        """按顺序把溢出文件中的记录写入存储，完成后删除文件"""
+        batch = []
+        with open(path, 'rb') as f:
+            for line in f:
+                # 崩溃时可能留下写了一半的最后一行
+                if not line.endswith(b'\n'):
+                    break
+                try:
+                    batch.append(json.loads(line))
+                except ValueError as e:
+                    print(f"跳过溢出文件中损坏的一行: {e}")
+                    continue
+                if len(batch) >= self.batch_size:
+                    self._commit(batch)
+                    batch = []
+        if batch:
+            self._commit(batch)
+        os.remove(path)
+
+    def _drain_spill(self):
+        """队列已经清空：把溢出文件改名后补写，之后的新记录重新进入队列"""
+        with self._cond:
+            if self._spill_file is None:
+                return
+            self._spill_file.close()
+            self._spill_file = None
+            os.replace(self.spill_path, self.draining_path)
+        self._replay(self.draining_path)
+
+    def _recover(self):
+        """补写上次运行留下的溢出文件"""
+        if self.draining_path.exists():
+            print(f"补写上次未写入的记录: {self.draining_path}")
+            self._replay(self.draining_path)
+        with self._cond:
+            # 本次运行已经开始溢出时，旧记录在文件开头，之后随新记录一起补写
+            if self._spill_file is not None or not self.spill_path.exists():
+                return
+            os.replace(self.spill_path, self.draining_path)
+        print(f"补写上次未写入的记录: {self.spill_path}")
+        self._replay(self.draining_path)
+
+    def _run(self):
+        try:
+            self._recover()
+            while True:
+                batch = self._next_batch()
+                if batch is None:
+                    break
+                if batch:
+                    self._commit(batch)
+                    with self._cond:
+                        self.committed += len(batch)
+                    self._notify_commit()
+                else:
+                    self._drain_spill()
+            self._drain_spill()
+        except Exception as e:
+            self._fail(e)
+
+    def _fail(self, error):
+        """写入线程出现无法重试的错误：队列中的记录保存到溢出文件，唤醒等待中的 put()"""
+        print(f"写入线程已停止: {error!r}")
+        with self._cond:
+            self.error = error
+            pending = list(self._queue)
+            self._queue.clear()
+            self._queue_depth.set(0)
+            self._cond.notify_all()
+        if pending:
+            self._spill_on_close(pending)
+        self._notify_commit()
+
+    def _notify_commit(self):
+        if self.on_commit is not None:
+            try:
+                self.on_commit(self.committed)
+            except Exception as e:
+                print(f"写入完成通知失败: {e}")
+
+    def close(self):
+        """写完队列中剩余的记录（以及溢出文件）后停止写入线程"""
+        with self._cond:
+            self._closing = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+        elif self._queue:
+            self._recover()
+            self._commit(list(self._queue))
+            self.committed += len(self._queue)
+            self._queue.clear()
+        with self._cond:
+            if self._spill_file is not None:
+                self._spill_file.close()
+                self._spill_file = None
+
+    def stats(self):
+        return {
+            "written": self.written,
+            "batches": self.batches,
+            "queued": len(self._queue),
+            "max_depth": self.max_depth,
+            "dropped": self.dropped,
+            "spilled": self.spilled,
+            "failures": self.failures,
+            "rollup_failures": self.rollup_failures,
+            "suppressed": self.suppressed,
+            "error": repr(self.error) if self.error is not None else None,
+        }